@@ -0,0 +1,25 @@
+-- ============================================================
+-- MIGRACIÓN: Clima del APPCC a partir de los rollups diarios
+-- La sección de temperatura y humedad de /appcc/exportar usa las
+-- medias diarias de sensor_lectura_dia por cámara. Estos triggers
+-- suben la versión del mes (appcc_version) cuando se recalculan sus
+-- rollups, y la versión 'estatico' cuando cambian sensores o nombres
+-- de cámara, para que la caché del informe no sirva datos viejos.
+-- Ejecutar después de appcc_version_migration.sql y
+-- sensor_lectura_particionado_migration.sql.
+-- ============================================================
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON sensor_lectura_dia;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR UPDATE OR DELETE ON sensor_lectura_dia
+    FOR EACH ROW EXECUTE FUNCTION appcc_version_bump_mes('dia');
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON sensor;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR DELETE OR UPDATE OF id_camara, tipo, activo ON sensor
+    FOR EACH STATEMENT EXECUTE FUNCTION appcc_version_bump_estatico();
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON Camara;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR DELETE OR UPDATE OF nombre, id_franquiciado ON Camara
+    FOR EACH STATEMENT EXECUTE FUNCTION appcc_version_bump_estatico();
@@ -0,0 +1,107 @@
+-- ============================================================
+-- MIGRACIÓN: Versiones de los datos del APPCC
+-- Un contador por mes ('YYYY-MM') que sube cuando cambian filas de ese
+-- mes en las tablas que lee /appcc/datos, y otro ('estatico') para las
+-- tablas que no dependen del mes (zonas, aspectos, proveedores...).
+-- backend/appcc.py usa las versiones como parte de la clave de su caché:
+-- un mes cerrado se sirve de memoria hasta que alguien lo modifique.
+-- Se puede relanzar sin problema.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS appcc_version (
+    ambito    VARCHAR(10) PRIMARY KEY,      -- 'YYYY-MM' o 'estatico'
+    version   BIGINT NOT NULL DEFAULT 1
+);
+
+-- Tablas con fecha: TG_ARGV[0] = columna fecha. Sube la versión del mes
+-- de la fila nueva y de la antigua (por si la fila cambia de mes).
+CREATE OR REPLACE FUNCTION appcc_version_bump_mes()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_col    TEXT := TG_ARGV[0];
+    v_meses  TEXT[] := '{}';
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        v_meses := v_meses || to_char((to_jsonb(OLD) ->> v_col)::date, 'YYYY-MM');
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        v_meses := v_meses || to_char((to_jsonb(NEW) ->> v_col)::date, 'YYYY-MM');
+    END IF;
+
+    INSERT INTO appcc_version AS v (ambito, version)
+    SELECT DISTINCT m, 1 FROM unnest(v_meses) AS m WHERE m IS NOT NULL
+    ON CONFLICT (ambito) DO UPDATE SET version = v.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION appcc_version_bump_estatico()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO appcc_version AS v (ambito, version) VALUES ('estatico', 1)
+    ON CONFLICT (ambito) DO UPDATE SET version = v.version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON appcc_limpieza_observacion;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR UPDATE OR DELETE ON appcc_limpieza_observacion
+    FOR EACH ROW EXECUTE FUNCTION appcc_version_bump_mes('fecha');
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON registro_limpieza_diario;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR UPDATE OR DELETE ON registro_limpieza_diario
+    FOR EACH ROW EXECUTE FUNCTION appcc_version_bump_mes('fecha');
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON appcc_practica_resultado;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR UPDATE OR DELETE ON appcc_practica_resultado
+    FOR EACH ROW EXECUTE FUNCTION appcc_version_bump_mes('semana_inicio');
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON appcc_plaga_registro;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR UPDATE OR DELETE ON appcc_plaga_registro
+    FOR EACH ROW EXECUTE FUNCTION appcc_version_bump_mes('mes');
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON lote_final;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR UPDATE OR DELETE ON lote_final
+    FOR EACH ROW EXECUTE FUNCTION appcc_version_bump_mes('fecha_produccion');
+
+-- Tablas sin fecha: cualquier cambio invalida todos los meses
+DROP TRIGGER IF EXISTS trg_appcc_version ON appcc_zona_limpieza;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR UPDATE OR DELETE ON appcc_zona_limpieza
+    FOR EACH STATEMENT EXECUTE FUNCTION appcc_version_bump_estatico();
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON appcc_aspecto_practica;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR UPDATE OR DELETE ON appcc_aspecto_practica
+    FOR EACH STATEMENT EXECUTE FUNCTION appcc_version_bump_estatico();
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON appcc_zona_plaga;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR UPDATE OR DELETE ON appcc_zona_plaga
+    FOR EACH STATEMENT EXECUTE FUNCTION appcc_version_bump_estatico();
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON operario;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR UPDATE OR DELETE ON operario
+    FOR EACH STATEMENT EXECUTE FUNCTION appcc_version_bump_estatico();
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON proveedor;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR UPDATE OR DELETE ON proveedor
+    FOR EACH STATEMENT EXECUTE FUNCTION appcc_version_bump_estatico();
+
+-- Trazabilidad muestra datos de los lotes de origen (no el flag activo)
+DROP TRIGGER IF EXISTS trg_appcc_version ON Lote_Alimento;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR DELETE OR UPDATE OF tipo_alimento, descripcion ON Lote_Alimento
+    FOR EACH STATEMENT EXECUTE FUNCTION appcc_version_bump_estatico();
+
+DROP TRIGGER IF EXISTS trg_appcc_version ON Lote_Huevo;
+CREATE TRIGGER trg_appcc_version
+    AFTER INSERT OR DELETE OR UPDATE OF origen ON Lote_Huevo
+    FOR EACH STATEMENT EXECUTE FUNCTION appcc_version_bump_estatico();
@@ -0,0 +1,41 @@
+-- ============================================================
+-- MIGRACIÓN: Avisos de cambios en cámaras entre workers
+-- backend/camaras_live.py recalcula el estado en vivo de las cámaras
+-- cuando le avisan. Con varios workers (uvicorn --workers N) el aviso en
+-- memoria solo llega al worker que hizo el cambio; estos triggers hacen
+-- NOTIFY camaras_live y cada worker tiene un LISTEN abierto.
+-- Triggers por sentencia: un volcado de sensores o una entrada a cámara
+-- es un solo aviso, y PostgreSQL junta los repetidos de una transacción.
+-- Ejecutar después de sensor_ultima_lectura_migration.sql. Se puede relanzar.
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION camaras_live_notify()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('camaras_live', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Temperatura / humedad actuales (lo mantiene el volcado de sensor_buffer)
+DROP TRIGGER IF EXISTS trg_camaras_live ON sensor_ultima_lectura;
+CREATE TRIGGER trg_camaras_live
+    AFTER INSERT OR UPDATE OR DELETE ON sensor_ultima_lectura
+    FOR EACH STATEMENT EXECUTE FUNCTION camaras_live_notify();
+
+-- Pallets que entran / salen de una cámara
+DROP TRIGGER IF EXISTS trg_camaras_live ON Pallet;
+CREATE TRIGGER trg_camaras_live
+    AFTER INSERT OR UPDATE OF estado, id_camara, fecha_salida_prevista OR DELETE ON Pallet
+    FOR EACH STATEMENT EXECUTE FUNCTION camaras_live_notify();
+
+-- Altas, bajas y cambios de cámaras y sensores
+DROP TRIGGER IF EXISTS trg_camaras_live ON camara;
+CREATE TRIGGER trg_camaras_live
+    AFTER INSERT OR UPDATE OR DELETE ON camara
+    FOR EACH STATEMENT EXECUTE FUNCTION camaras_live_notify();
+
+DROP TRIGGER IF EXISTS trg_camaras_live ON sensor;
+CREATE TRIGGER trg_camaras_live
+    AFTER INSERT OR UPDATE OF id_camara, tipo, activo OR DELETE ON sensor
+    FOR EACH STATEMENT EXECUTE FUNCTION camaras_live_notify();
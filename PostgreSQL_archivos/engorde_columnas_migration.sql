@@ -0,0 +1,35 @@
+-- ============================================================
+-- MIGRACIÓN: Claves de engorde.metadata como columnas propias
+-- id_sesion_procesado, fecha_entrada y fecha_salida_prevista se
+-- guardaban solo dentro del JSON de metadata, y las consultas de
+-- procesado tenían que hacer metadata::jsonb->>... fila a fila.
+-- log_engorde_event las rellena al insertar (metadata se mantiene
+-- igual). Se puede relanzar sin problema.
+-- ============================================================
+
+ALTER TABLE engorde
+    ADD COLUMN IF NOT EXISTS id_sesion_procesado    INTEGER,
+    ADD COLUMN IF NOT EXISTS fecha_entrada          DATE,
+    ADD COLUMN IF NOT EXISTS fecha_salida_prevista  DATE;
+
+-- Relleno de las filas existentes a partir del JSON
+UPDATE engorde
+SET id_sesion_procesado   = NULLIF(metadata::jsonb->>'id_sesion_procesado', '')::int,
+    fecha_entrada         = NULLIF(metadata::jsonb->>'fecha_entrada', '')::date,
+    fecha_salida_prevista = NULLIF(metadata::jsonb->>'fecha_salida_prevista', '')::date
+WHERE metadata IS NOT NULL
+  AND id_sesion_procesado IS NULL
+  AND fecha_entrada IS NULL
+  AND fecha_salida_prevista IS NULL
+  AND (metadata::jsonb ? 'id_sesion_procesado'
+       OR metadata::jsonb ? 'fecha_entrada'
+       OR metadata::jsonb ? 'fecha_salida_prevista');
+
+-- Pallets cribados por sesión (procesado/*)
+CREATE INDEX IF NOT EXISTS idx_engorde_sesion_procesado
+    ON engorde (id_sesion_procesado, tipo_evento)
+    WHERE id_sesion_procesado IS NOT NULL;
+
+-- Último evento de un tipo para un pallet (p.ej. su ENTRADA_CAMARA)
+CREATE INDEX IF NOT EXISTS idx_engorde_pallet_evento
+    ON engorde (id_pallet, tipo_evento, timestamp DESC);
@@ -0,0 +1,13 @@
+-- ============================================================
+-- MIGRACIÓN: Clave única de los eventos de engorde
+-- engorde es un log de eventos: id_pallet se repite en cada evento del
+-- pallet y no sirve como cursor de paginación (GET /engorde en
+-- backend/backend.py saltaría filas en los cortes de página). id_evento
+-- numera cada evento en orden de inserción; las filas existentes se
+-- numeran al añadir la columna.
+-- Se puede relanzar sin problema.
+-- ============================================================
+
+ALTER TABLE engorde ADD COLUMN IF NOT EXISTS id_evento BIGSERIAL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_engorde_id_evento ON engorde (id_evento);
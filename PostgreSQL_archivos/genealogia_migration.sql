@@ -0,0 +1,56 @@
+-- ============================================================
+-- MIGRACIÓN: Genealogía de lotes (backend/genealogia.py)
+-- - pallet_lotes guarda cuándo se asignó cada lote, para saber a qué
+--   ciclo del pallet pertenece (los pallets se reutilizan). Las filas
+--   anteriores quedan con fecha NULL y se tratan como "cualquier ciclo".
+-- - vista_ciclo_pallet: un ciclo por pallet (MONTADO → ... → CRIBADO)
+--   con su cámara, fechas, sesión de procesado y lotes de los eventos.
+-- Ejecutar después de engorde_columnas_migration.sql.
+-- ============================================================
+
+ALTER TABLE pallet_lotes
+    ADD COLUMN IF NOT EXISTS fecha_asignacion TIMESTAMP DEFAULT NOW();
+
+CREATE INDEX IF NOT EXISTS idx_pallet_lotes_pallet ON pallet_lotes (id_pallet);
+CREATE INDEX IF NOT EXISTS idx_pallet_lotes_alimento ON pallet_lotes (id_lote_alimento)
+    WHERE id_lote_alimento IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_pallet_lotes_huevo ON pallet_lotes (id_lote_huevo)
+    WHERE id_lote_huevo IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_engorde_lote_alimento ON engorde (id_lote_alimento)
+    WHERE id_lote_alimento IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_engorde_lote_huevo ON engorde (id_lote_huevo)
+    WHERE id_lote_huevo IS NOT NULL;
+
+-- Ciclo = eventos de un pallet desde el CRIBADO anterior (exclusive) hasta
+-- el siguiente CRIBADO (inclusive). Filtrar siempre por id_pallet: el filtro
+-- se aplica antes de la ventana y usa el índice de engorde.
+CREATE OR REPLACE VIEW vista_ciclo_pallet AS
+WITH ev AS (
+    SELECT
+        e.id_pallet, e.tipo_evento, e.timestamp, e.id_camara,
+        e.id_lote_alimento, e.id_lote_huevo, e.id_sesion_procesado,
+        e.fecha_entrada,
+        COALESCE(SUM((e.tipo_evento = 'CRIBADO')::int) OVER (
+            PARTITION BY e.id_pallet ORDER BY e.timestamp
+            ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+        ), 0) AS ciclo
+    FROM engorde e
+    WHERE e.id_pallet IS NOT NULL
+)
+SELECT
+    id_pallet,
+    ciclo,
+    MIN(timestamp) AS inicio,
+    MAX(timestamp) FILTER (WHERE tipo_evento = 'CRIBADO') AS fin,
+    MAX(id_sesion_procesado) FILTER (WHERE tipo_evento = 'CRIBADO') AS id_sesion_procesado,
+    (ARRAY_AGG(id_camara ORDER BY timestamp DESC)
+        FILTER (WHERE tipo_evento = 'ENTRADA_CAMARA'))[1] AS id_camara,
+    MAX(fecha_entrada) AS fecha_entrada,
+    MAX(timestamp) FILTER (WHERE tipo_evento = 'SALIDA_CAMARA') AS fecha_salida,
+    ARRAY_AGG(DISTINCT id_lote_alimento)
+        FILTER (WHERE id_lote_alimento IS NOT NULL) AS lotes_alimento_eventos,
+    ARRAY_AGG(DISTINCT id_lote_huevo)
+        FILTER (WHERE id_lote_huevo IS NOT NULL) AS lotes_huevo_eventos
+FROM ev
+GROUP BY id_pallet, ciclo;
@@ -0,0 +1,57 @@
+-- ============================================================
+-- MIGRACIÓN: Versión de la genealogía hacia atrás
+-- Un contador que sube con las correcciones a mano que pueden cambiar la
+-- genealogía de cualquier lote final: UPDATE/DELETE en engorde o en
+-- lote_final y cambios en los datos descriptivos de los lotes de origen.
+-- backend/genealogia.py lo usa como parte de la clave de su caché, así
+-- que todos los workers dejan de servir respuestas viejas a la vez.
+-- Lo que pasa en las líneas de cribado (CRIBADO nuevo, lote_final nuevo)
+-- NO sube el contador: una sola fila para todas las líneas las serializaba
+-- y se cruzaba con los bloqueos de procesado_sesion (deadlock con
+-- terminar_sesion_procesado). Eso lo cubre la huella por lote de
+-- genealogia.py (xmin de lote_final y de su procesado_sesion, que se
+-- actualiza en cada cribado).
+-- (Las consultas hacia delante, las de las retiradas, no se cachean.)
+-- Ejecutar después de genealogia_migration.sql. Se puede relanzar.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS genealogia_version (
+    id        BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),   -- una sola fila
+    version   BIGINT NOT NULL DEFAULT 1
+);
+
+INSERT INTO genealogia_version (id, version) VALUES (TRUE, 1)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION genealogia_version_bump()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE genealogia_version SET version = version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Versiones anteriores de esta migración también lo subían en cada
+-- CRIBADO y en cada INSERT en lote_final
+DROP TRIGGER IF EXISTS trg_genealogia_version_cribado ON engorde;
+
+-- Correcciones a mano sobre engorde (UPDATE/DELETE), sean del tipo que sean
+DROP TRIGGER IF EXISTS trg_genealogia_version_cambios ON engorde;
+CREATE TRIGGER trg_genealogia_version_cambios
+    AFTER UPDATE OR DELETE ON engorde
+    FOR EACH STATEMENT EXECUTE FUNCTION genealogia_version_bump();
+
+DROP TRIGGER IF EXISTS trg_genealogia_version ON lote_final;
+CREATE TRIGGER trg_genealogia_version
+    AFTER UPDATE OR DELETE ON lote_final
+    FOR EACH STATEMENT EXECUTE FUNCTION genealogia_version_bump();
+
+DROP TRIGGER IF EXISTS trg_genealogia_version ON Lote_Alimento;
+CREATE TRIGGER trg_genealogia_version
+    AFTER UPDATE OF codigo_qr, descripcion, fecha_llegada OR DELETE ON Lote_Alimento
+    FOR EACH STATEMENT EXECUTE FUNCTION genealogia_version_bump();
+
+DROP TRIGGER IF EXISTS trg_genealogia_version ON Lote_Huevo;
+CREATE TRIGGER trg_genealogia_version
+    AFTER UPDATE OF codigo_qr, origen, fecha_registro OR DELETE ON Lote_Huevo
+    FOR EACH STATEMENT EXECUTE FUNCTION genealogia_version_bump();
@@ -0,0 +1,27 @@
+-- ============================================================
+-- MIGRACIÓN: Bandeja de salida de correos de incidencias
+-- POST /incidencias guarda aquí la incidencia y responde al momento;
+-- el hilo de backend/Incidencias/outbox.py envía los correos
+-- pendientes, reintenta con espera creciente y marca 'error' cuando
+-- se agotan los intentos. Se puede relanzar sin problema.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS incidencia_outbox (
+    id                SERIAL PRIMARY KEY,
+    nombre_usuario    VARCHAR(100),
+    email_usuario     VARCHAR(255),
+    titulo            TEXT NOT NULL,
+    descripcion       TEXT NOT NULL,
+    destinatario      VARCHAR(255),          -- NULL = EMAIL_RESPONSABLE al enviar
+    estado            VARCHAR(10) NOT NULL DEFAULT 'pendiente'
+                      CHECK (estado IN ('pendiente','enviado','error')),
+    intentos          INTEGER NOT NULL DEFAULT 0,
+    proximo_intento   TIMESTAMP NOT NULL DEFAULT NOW(),
+    ultimo_error      TEXT,
+    creado            TIMESTAMP NOT NULL DEFAULT NOW(),
+    enviado           TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_incidencia_outbox_pendiente
+    ON incidencia_outbox (proximo_intento)
+    WHERE estado = 'pendiente';
@@ -0,0 +1,24 @@
+-- ============================================================
+-- MIGRACIÓN: Secuencia diaria de códigos de lote final
+-- Un contador por día (IN-YYYYMMDD-NN) que se incrementa con
+-- INSERT ... ON CONFLICT ... RETURNING: dos líneas de cribado que
+-- cierran big bag a la vez no pueden sacar el mismo código, y no hace
+-- falta recorrer lote_final con LIKE. Admite reservar bloques de
+-- códigos para imprimir etiquetas y más de 99 lotes al día.
+-- Se puede relanzar sin problema.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS lote_final_secuencia (
+    fecha   DATE PRIMARY KEY,
+    ultimo  INTEGER NOT NULL
+);
+
+-- Arranca cada día desde el último código ya usado
+INSERT INTO lote_final_secuencia (fecha, ultimo)
+SELECT to_date(split_part(codigo_lote, '-', 2), 'YYYYMMDD'),
+       MAX(split_part(codigo_lote, '-', 3)::int)
+FROM lote_final
+WHERE codigo_lote ~ '^IN-[0-9]{8}-[0-9]+$'
+GROUP BY 1
+ON CONFLICT (fecha) DO UPDATE
+    SET ultimo = GREATEST(lote_final_secuencia.ultimo, EXCLUDED.ultimo);
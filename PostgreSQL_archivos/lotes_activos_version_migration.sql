@@ -0,0 +1,34 @@
+-- ============================================================
+-- MIGRACIÓN: Versión de los lotes activos
+-- Un contador que sube cada vez que cambia qué lotes de alimento o
+-- huevo están activos. Cada worker del backend guarda en memoria la
+-- lista de lotes activos (backend/lotes_activos.py) y solo la vuelve
+-- a leer cuando esta versión cambia.
+-- Se puede relanzar sin problema.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS lotes_activos_version (
+    id        BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),   -- una sola fila
+    version   BIGINT NOT NULL DEFAULT 1
+);
+
+INSERT INTO lotes_activos_version (id, version) VALUES (TRUE, 1)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION lotes_activos_version_bump()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE lotes_activos_version SET version = version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_lotes_activos_version ON Lote_Alimento;
+CREATE TRIGGER trg_lotes_activos_version
+    AFTER INSERT OR DELETE OR UPDATE OF activo ON Lote_Alimento
+    FOR EACH STATEMENT EXECUTE FUNCTION lotes_activos_version_bump();
+
+DROP TRIGGER IF EXISTS trg_lotes_activos_version ON Lote_Huevo;
+CREATE TRIGGER trg_lotes_activos_version
+    AFTER INSERT OR DELETE OR UPDATE OF activo ON Lote_Huevo
+    FOR EACH STATEMENT EXECUTE FUNCTION lotes_activos_version_bump();
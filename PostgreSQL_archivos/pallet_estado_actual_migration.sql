@@ -0,0 +1,97 @@
+-- ============================================================
+-- MIGRACIÓN: Estado actual de cada pallet (proyección de engorde)
+-- Una fila por pallet con su estado, cámara, últimos lotes y fechas
+-- de entrada / salida prevista, para no reconstruirlo en cada scan
+-- con ORDER BY timestamp DESC LIMIT 1 sobre engorde.
+-- La mantiene log_engorde_event en la misma transacción que el
+-- evento. Para regenerarla desde engorde:
+--   python -m backend.pallet_estado
+-- Ejecutar después de engorde_columnas_migration.sql. Se puede relanzar
+-- (la reconstrucción final corrige las filas existentes).
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS pallet_estado_actual (
+    id_pallet               INTEGER PRIMARY KEY,
+    estado                  VARCHAR(20),
+    id_camara               INTEGER,
+    id_lote_alimento        INTEGER,
+    id_lote_huevo           INTEGER,
+    fecha_entrada           DATE,
+    fecha_salida_prevista   DATE,
+    ultimo_evento           VARCHAR(50),
+    fecha_ultimo_evento     TIMESTAMP
+);
+
+-- Rehace la proyección reproduciendo engorde (de un pallet o de todos).
+-- Mismas reglas que backend/pallet_estado.py al aplicar un evento:
+--   - estado: el último estado_nuevo informado
+--   - id_camara: la del último cambio de estado si fue a 'en_camara'
+--   - lotes y fechas: el último valor no nulo desde el último MONTADO
+--     (estado_nuevo 'preparado'), que abre un ciclo nuevo
+CREATE OR REPLACE FUNCTION reconstruir_pallet_estado_actual(p_id_pallet INTEGER DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    filas INTEGER;
+BEGIN
+    DELETE FROM pallet_estado_actual
+    WHERE p_id_pallet IS NULL OR id_pallet = p_id_pallet;
+
+    INSERT INTO pallet_estado_actual (
+        id_pallet, estado, id_camara, id_lote_alimento, id_lote_huevo,
+        fecha_entrada, fecha_salida_prevista, ultimo_evento, fecha_ultimo_evento
+    )
+    SELECT
+        id_pallet,
+        estado,
+        CASE WHEN estado = 'en_camara' THEN camara_estado END,
+        id_lote_alimento, id_lote_huevo,
+        fecha_entrada, fecha_salida_prevista,
+        ultimo_evento, fecha_ultimo_evento
+    FROM (
+        SELECT
+            id_pallet,
+            (ARRAY_AGG(estado_nuevo ORDER BY timestamp DESC)
+                FILTER (WHERE estado_nuevo IS NOT NULL))[1] AS estado,
+            (ARRAY_AGG(id_camara ORDER BY timestamp DESC)
+                FILTER (WHERE estado_nuevo IS NOT NULL))[1] AS camara_estado,
+            (ARRAY_AGG(id_lote_alimento ORDER BY timestamp DESC)
+                FILTER (WHERE id_lote_alimento IS NOT NULL))[1] AS id_lote_alimento,
+            (ARRAY_AGG(id_lote_huevo ORDER BY timestamp DESC)
+                FILTER (WHERE id_lote_huevo IS NOT NULL))[1] AS id_lote_huevo,
+            (ARRAY_AGG(fecha_entrada ORDER BY timestamp DESC)
+                FILTER (WHERE fecha_entrada IS NOT NULL))[1] AS fecha_entrada,
+            (ARRAY_AGG(fecha_salida_prevista ORDER BY timestamp DESC)
+                FILTER (WHERE fecha_salida_prevista IS NOT NULL))[1] AS fecha_salida_prevista,
+            (ARRAY_AGG(tipo_evento ORDER BY timestamp DESC))[1] AS ultimo_evento,
+            MAX(timestamp) AS fecha_ultimo_evento
+        FROM (
+            -- Los lotes y fechas solo se toman del ciclo actual
+            SELECT
+                id_pallet, estado_nuevo, id_camara, tipo_evento, timestamp,
+                CASE WHEN en_ciclo THEN id_lote_alimento END AS id_lote_alimento,
+                CASE WHEN en_ciclo THEN id_lote_huevo END AS id_lote_huevo,
+                CASE WHEN en_ciclo THEN fecha_entrada END AS fecha_entrada,
+                CASE WHEN en_ciclo THEN fecha_salida_prevista END AS fecha_salida_prevista
+            FROM (
+                SELECT
+                    eng.*,
+                    eng.timestamp >= COALESCE(
+                        MAX(eng.timestamp) FILTER (WHERE eng.estado_nuevo = 'preparado')
+                            OVER (PARTITION BY eng.id_pallet),
+                        '-infinity'
+                    ) AS en_ciclo
+                FROM engorde eng
+                WHERE eng.id_pallet IS NOT NULL
+                  AND (p_id_pallet IS NULL OR eng.id_pallet = p_id_pallet)
+            ) ciclo
+        ) eng
+        GROUP BY id_pallet
+    ) e;
+
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN filas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Relleno inicial
+SELECT reconstruir_pallet_estado_actual();
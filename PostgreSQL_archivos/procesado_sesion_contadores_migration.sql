@@ -0,0 +1,32 @@
+-- ============================================================
+-- MIGRACIÓN: Contadores de las sesiones de procesado/cribado
+-- procesado_sesion lleva el número de pallets cribados, big bags y
+-- kg acumulados, actualizados por los endpoints /procesado/* en cada
+-- operación, en lugar de recontar engorde y lote_final cada vez.
+-- Ejecutar después de engorde_columnas_migration.sql.
+-- ============================================================
+
+ALTER TABLE procesado_sesion
+    ADD COLUMN IF NOT EXISTS pallets_cribados  INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS big_bags          INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS kg_total          NUMERIC(12,2) NOT NULL DEFAULT 0;
+
+-- Relleno de las sesiones existentes
+UPDATE procesado_sesion ps
+SET pallets_cribados = COALESCE(c.n, 0),
+    big_bags = COALESCE(l.n, 0),
+    kg_total = COALESCE(l.kg, 0)
+FROM procesado_sesion s
+LEFT JOIN (
+    SELECT id_sesion_procesado, COUNT(*) AS n
+    FROM engorde
+    WHERE tipo_evento = 'CRIBADO' AND id_sesion_procesado IS NOT NULL
+    GROUP BY id_sesion_procesado
+) c ON c.id_sesion_procesado = s.id
+LEFT JOIN (
+    SELECT id_sesion_procesado, COUNT(*) AS n, SUM(peso) AS kg
+    FROM lote_final
+    WHERE id_sesion_procesado IS NOT NULL
+    GROUP BY id_sesion_procesado
+) l ON l.id_sesion_procesado = s.id
+WHERE ps.id = s.id;
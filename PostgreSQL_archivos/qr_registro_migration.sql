@@ -0,0 +1,76 @@
+-- ============================================================
+-- MIGRACIÓN: Registro unificado de códigos QR
+-- Una fila por QR con su tipo (camara | pallet | lote_alimento |
+-- lote_huevo) y el id de la entidad, para que /trazabilidad/scan y el
+-- registro de QR resuelvan un código con una sola búsqueda por índice.
+-- Lo mantienen los triggers de abajo; se puede relanzar sin problema.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS qr_registro (
+    codigo_qr   VARCHAR(100) PRIMARY KEY,
+    tipo        VARCHAR(20) NOT NULL
+                CHECK (tipo IN ('camara','pallet','lote_alimento','lote_huevo')),
+    id_entidad  INTEGER NOT NULL
+);
+
+-- Trigger genérico: TG_ARGV[0] = tipo, TG_ARGV[1] = columna id de la tabla
+CREATE OR REPLACE FUNCTION qr_registro_sync()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_tipo TEXT := TG_ARGV[0];
+    v_col  TEXT := TG_ARGV[1];
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.codigo_qr IS NOT NULL THEN
+        DELETE FROM qr_registro
+        WHERE codigo_qr = OLD.codigo_qr
+          AND tipo = v_tipo
+          AND id_entidad = (to_jsonb(OLD) ->> v_col)::int;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.codigo_qr IS NOT NULL THEN
+        INSERT INTO qr_registro (codigo_qr, tipo, id_entidad)
+        VALUES (NEW.codigo_qr, v_tipo, (to_jsonb(NEW) ->> v_col)::int)
+        ON CONFLICT (codigo_qr) DO NOTHING;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_qr_registro ON Camara;
+CREATE TRIGGER trg_qr_registro
+    AFTER INSERT OR DELETE OR UPDATE OF codigo_qr ON Camara
+    FOR EACH ROW EXECUTE FUNCTION qr_registro_sync('camara', 'id_camara');
+
+DROP TRIGGER IF EXISTS trg_qr_registro ON Pallet;
+CREATE TRIGGER trg_qr_registro
+    AFTER INSERT OR DELETE OR UPDATE OF codigo_qr ON Pallet
+    FOR EACH ROW EXECUTE FUNCTION qr_registro_sync('pallet', 'id_pallet');
+
+DROP TRIGGER IF EXISTS trg_qr_registro ON Lote_Alimento;
+CREATE TRIGGER trg_qr_registro
+    AFTER INSERT OR DELETE OR UPDATE OF codigo_qr ON Lote_Alimento
+    FOR EACH ROW EXECUTE FUNCTION qr_registro_sync('lote_alimento', 'id_lote_alimento');
+
+DROP TRIGGER IF EXISTS trg_qr_registro ON Lote_Huevo;
+CREATE TRIGGER trg_qr_registro
+    AFTER INSERT OR DELETE OR UPDATE OF codigo_qr ON Lote_Huevo
+    FOR EACH ROW EXECUTE FUNCTION qr_registro_sync('lote_huevo', 'id_lote_huevo');
+
+-- Relleno inicial. Mismo orden de prioridad que tenía el scan
+-- (cámara, pallet, alimento, huevo) si un código estuviera repetido.
+INSERT INTO qr_registro (codigo_qr, tipo, id_entidad)
+SELECT codigo_qr, 'camara', id_camara FROM Camara WHERE codigo_qr IS NOT NULL
+ON CONFLICT (codigo_qr) DO NOTHING;
+
+INSERT INTO qr_registro (codigo_qr, tipo, id_entidad)
+SELECT codigo_qr, 'pallet', id_pallet FROM Pallet WHERE codigo_qr IS NOT NULL
+ON CONFLICT (codigo_qr) DO NOTHING;
+
+INSERT INTO qr_registro (codigo_qr, tipo, id_entidad)
+SELECT codigo_qr, 'lote_alimento', id_lote_alimento FROM Lote_Alimento WHERE codigo_qr IS NOT NULL
+ON CONFLICT (codigo_qr) DO NOTHING;
+
+INSERT INTO qr_registro (codigo_qr, tipo, id_entidad)
+SELECT codigo_qr, 'lote_huevo', id_lote_huevo FROM Lote_Huevo WHERE codigo_qr IS NOT NULL
+ON CONFLICT (codigo_qr) DO NOTHING;
@@ -0,0 +1,134 @@
+-- ============================================================
+-- MIGRACIÓN: sensor_lectura particionada por mes + rollups
+-- Ejecutar UNA sola vez, después de sensor_ultima_lectura_migration.sql
+--
+-- - sensor_lectura pasa a ser una tabla particionada por rango de
+--   fecha_lectura (una partición por mes: sensor_lectura_YYYYMM).
+-- - sensor_lectura_hora / sensor_lectura_dia guardan agregados
+--   (n, suma, mínimo, máximo) por sensor y hora/día.
+-- - Las particiones futuras, los rollups y la purga de datos en bruto
+--   los mantiene backend/sensor_mantenimiento.py.
+-- ============================================================
+
+BEGIN;
+
+-- 1. Apartar la tabla actual (conservamos su secuencia de ids)
+ALTER TABLE sensor_lectura RENAME TO sensor_lectura_old;
+ALTER INDEX IF EXISTS idx_lectura_sensor_fecha RENAME TO idx_lectura_sensor_fecha_old;
+ALTER SEQUENCE sensor_lectura_id_lectura_seq OWNED BY NONE;
+
+-- 2. Tabla particionada. La clave de partición debe formar parte de la PK
+--    y no puede ser NULL.
+CREATE TABLE sensor_lectura (
+    id_lectura      BIGINT NOT NULL DEFAULT nextval('sensor_lectura_id_lectura_seq'),
+    id_sensor       INTEGER NOT NULL REFERENCES sensor(id_sensor),
+    valor           NUMERIC(6,2) NOT NULL,
+    fecha_lectura   TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id_lectura, fecha_lectura)
+) PARTITION BY RANGE (fecha_lectura);
+
+ALTER SEQUENCE sensor_lectura_id_lectura_seq OWNED BY sensor_lectura.id_lectura;
+
+CREATE INDEX idx_lectura_sensor_fecha ON sensor_lectura (id_sensor, fecha_lectura DESC);
+
+-- 3. Crea (si no existe) la partición del mes que contiene `mes`
+CREATE OR REPLACE FUNCTION crear_particion_sensor_lectura(mes DATE)
+RETURNS TEXT AS $$
+DECLARE
+    inicio DATE := date_trunc('month', mes)::date;
+    fin    DATE := (date_trunc('month', mes) + INTERVAL '1 month')::date;
+    nombre TEXT := 'sensor_lectura_' || to_char(inicio, 'YYYYMM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF sensor_lectura FOR VALUES FROM (%L) TO (%L)',
+        nombre, inicio, fin
+    );
+    RETURN nombre;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Particiones desde la lectura más antigua hasta dos meses vista
+SELECT crear_particion_sensor_lectura(m::date)
+FROM generate_series(
+    date_trunc('month', COALESCE((SELECT MIN(fecha_lectura) FROM sensor_lectura_old), NOW())),
+    date_trunc('month', NOW()) + INTERVAL '2 months',
+    INTERVAL '1 month'
+) AS m;
+
+-- Lecturas con fecha fuera de rango (p.ej. reloj del ESP32 sin sincronizar)
+CREATE TABLE IF NOT EXISTS sensor_lectura_default PARTITION OF sensor_lectura DEFAULT;
+
+-- 4. Copiar el histórico
+INSERT INTO sensor_lectura (id_lectura, id_sensor, valor, fecha_lectura)
+SELECT id_lectura, id_sensor, valor, COALESCE(fecha_lectura, NOW())
+FROM sensor_lectura_old;
+
+-- 5. Rollups por hora y por día
+CREATE TABLE IF NOT EXISTS sensor_lectura_hora (
+    id_sensor   INTEGER NOT NULL REFERENCES sensor(id_sensor) ON DELETE CASCADE,
+    hora        TIMESTAMP NOT NULL,
+    n           INTEGER NOT NULL,
+    suma        NUMERIC(14,2) NOT NULL,
+    minimo      NUMERIC(6,2) NOT NULL,
+    maximo      NUMERIC(6,2) NOT NULL,
+    PRIMARY KEY (id_sensor, hora)
+);
+
+CREATE TABLE IF NOT EXISTS sensor_lectura_dia (
+    id_sensor   INTEGER NOT NULL REFERENCES sensor(id_sensor) ON DELETE CASCADE,
+    dia         DATE NOT NULL,
+    n           INTEGER NOT NULL,
+    suma        NUMERIC(16,2) NOT NULL,
+    minimo      NUMERIC(6,2) NOT NULL,
+    maximo      NUMERIC(6,2) NOT NULL,
+    PRIMARY KEY (id_sensor, dia)
+);
+
+CREATE INDEX IF NOT EXISTS idx_lectura_hora_hora ON sensor_lectura_hora (hora);
+CREATE INDEX IF NOT EXISTS idx_lectura_dia_dia ON sensor_lectura_dia (dia);
+
+-- Recalcula los rollups de las lecturas en [desde, hasta). Los días se
+-- recalculan completos a partir de sensor_lectura_hora.
+CREATE OR REPLACE FUNCTION refrescar_rollups_sensor(
+    desde TIMESTAMP,
+    hasta TIMESTAMP DEFAULT 'infinity'
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO sensor_lectura_hora (id_sensor, hora, n, suma, minimo, maximo)
+    SELECT id_sensor, date_trunc('hour', fecha_lectura),
+           COUNT(*), SUM(valor), MIN(valor), MAX(valor)
+    FROM sensor_lectura
+    WHERE fecha_lectura >= date_trunc('hour', desde)
+      AND fecha_lectura < hasta
+    GROUP BY 1, 2
+    ON CONFLICT (id_sensor, hora) DO UPDATE
+        SET n = EXCLUDED.n,
+            suma = EXCLUDED.suma,
+            minimo = EXCLUDED.minimo,
+            maximo = EXCLUDED.maximo;
+
+    INSERT INTO sensor_lectura_dia (id_sensor, dia, n, suma, minimo, maximo)
+    SELECT id_sensor, hora::date,
+           SUM(n), SUM(suma), MIN(minimo), MAX(maximo)
+    FROM sensor_lectura_hora
+    WHERE hora >= date_trunc('day', desde)
+      AND hora < hasta
+    GROUP BY 1, 2
+    ON CONFLICT (id_sensor, dia) DO UPDATE
+        SET n = EXCLUDED.n,
+            suma = EXCLUDED.suma,
+            minimo = EXCLUDED.minimo,
+            maximo = EXCLUDED.maximo;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Relleno inicial con todo el histórico
+SELECT refrescar_rollups_sensor(
+    COALESCE((SELECT MIN(fecha_lectura) FROM sensor_lectura), NOW())::timestamp
+);
+
+COMMIT;
+
+-- Tras comprobar que los datos se han copiado bien:
+-- DROP TABLE sensor_lectura_old;
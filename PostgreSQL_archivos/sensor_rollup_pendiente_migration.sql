@@ -0,0 +1,118 @@
+-- ============================================================
+-- MIGRACIÓN: Rollups de sensores por horas tocadas + particiones
+-- Ejecutar después de sensor_lectura_particionado_migration.sql.
+-- Se puede relanzar sin problema.
+--
+-- - sensor_rollup_pendiente: (sensor, hora) con lecturas nuevas que aún
+--   no están en sensor_lectura_hora / sensor_lectura_dia. La rellena el
+--   INSERT de backend/sensor_buffer.py en la misma sentencia que escribe
+--   las lecturas, así las tardías o reenviadas (batch del ESP32) también
+--   llegan a los rollups, sea cual sea su fecha.
+-- - refrescar_rollups_pendientes(): recalcula esas horas y sus días
+--   completos y vacía la cola. La llama backend/sensor_mantenimiento.py.
+-- - crear_particion_sensor_lectura(): si la partición DEFAULT tiene
+--   lecturas del mes (p.ej. un reloj adelantado), las mueve a la partición
+--   nueva en vez de fallar.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS sensor_rollup_pendiente (
+    id_sensor   INTEGER NOT NULL,
+    hora        TIMESTAMP NOT NULL,
+    PRIMARY KEY (id_sensor, hora)
+);
+
+CREATE OR REPLACE FUNCTION refrescar_rollups_pendientes()
+RETURNS INTEGER AS $$
+DECLARE
+    v_sensores  INTEGER[];
+    v_horas     TIMESTAMP[];
+BEGIN
+    -- Lo que se marque mientras tanto queda para la siguiente pasada
+    WITH p AS (
+        DELETE FROM sensor_rollup_pendiente RETURNING id_sensor, hora
+    )
+    SELECT array_agg(id_sensor), array_agg(hora) INTO v_sensores, v_horas FROM p;
+
+    IF v_horas IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    INSERT INTO sensor_lectura_hora (id_sensor, hora, n, suma, minimo, maximo)
+    SELECT p.id_sensor, p.hora,
+           COUNT(*), SUM(l.valor), MIN(l.valor), MAX(l.valor)
+    FROM unnest(v_sensores, v_horas) AS p(id_sensor, hora)
+    JOIN sensor_lectura l
+      ON l.id_sensor = p.id_sensor
+     AND l.fecha_lectura >= p.hora
+     AND l.fecha_lectura < p.hora + INTERVAL '1 hour'
+    GROUP BY 1, 2
+    ON CONFLICT (id_sensor, hora) DO UPDATE
+        SET n = EXCLUDED.n,
+            suma = EXCLUDED.suma,
+            minimo = EXCLUDED.minimo,
+            maximo = EXCLUDED.maximo;
+
+    -- Los días afectados se recalculan enteros desde sensor_lectura_hora
+    INSERT INTO sensor_lectura_dia (id_sensor, dia, n, suma, minimo, maximo)
+    SELECT h.id_sensor, d.dia,
+           SUM(h.n), SUM(h.suma), MIN(h.minimo), MAX(h.maximo)
+    FROM (
+        SELECT DISTINCT id_sensor, hora::date AS dia
+        FROM unnest(v_sensores, v_horas) AS p(id_sensor, hora)
+    ) d
+    JOIN sensor_lectura_hora h
+      ON h.id_sensor = d.id_sensor
+     AND h.hora >= d.dia
+     AND h.hora < d.dia + 1
+    GROUP BY 1, 2
+    ON CONFLICT (id_sensor, dia) DO UPDATE
+        SET n = EXCLUDED.n,
+            suma = EXCLUDED.suma,
+            minimo = EXCLUDED.minimo,
+            maximo = EXCLUDED.maximo;
+
+    RETURN array_length(v_horas, 1);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION crear_particion_sensor_lectura(mes DATE)
+RETURNS TEXT AS $$
+DECLARE
+    inicio  DATE := date_trunc('month', mes)::date;
+    fin     DATE := (date_trunc('month', mes) + INTERVAL '1 month')::date;
+    nombre  TEXT := 'sensor_lectura_' || to_char(inicio, 'YYYYMM');
+    v_filas sensor_lectura_default[];
+BEGIN
+    IF to_regclass(nombre) IS NOT NULL THEN
+        RETURN nombre;
+    END IF;
+
+    -- Con lecturas del mes en DEFAULT, PARTITION OF fallaría: se sacan,
+    -- se crea la partición y se vuelven a insertar (ya caen en la nueva)
+    WITH movidas AS (
+        DELETE FROM sensor_lectura_default
+        WHERE fecha_lectura >= inicio AND fecha_lectura < fin
+        RETURNING id_lectura, id_sensor, valor, fecha_lectura
+    )
+    SELECT array_agg(ROW(m.id_lectura, m.id_sensor, m.valor, m.fecha_lectura)::sensor_lectura_default)
+    INTO v_filas
+    FROM movidas m;
+
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF sensor_lectura FOR VALUES FROM (%L) TO (%L)',
+        nombre, inicio, fin
+    );
+
+    IF v_filas IS NOT NULL THEN
+        INSERT INTO sensor_lectura (id_lectura, id_sensor, valor, fecha_lectura)
+        SELECT id_lectura, id_sensor, valor, fecha_lectura FROM unnest(v_filas);
+    END IF;
+    RETURN nombre;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Lecturas tardías que se quedaron fuera de los rollups con el margen
+-- fijo anterior (SENSOR_ROLLUP_LOOKBACK_HOURS): recálculo completo
+SELECT refrescar_rollups_sensor(
+    COALESCE((SELECT MIN(fecha_lectura) FROM sensor_lectura), NOW())::timestamp
+);
@@ -0,0 +1,74 @@
+-- ============================================================
+-- MIGRACIÓN: Refresco de rollups pendientes por rango de fechas
+-- Ejecutar después de sensor_rollup_pendiente_migration.sql.
+-- Se puede relanzar sin problema.
+--
+-- refrescar_rollups_pendientes(desde, hasta) solo recalcula las horas
+-- pendientes de [desde, hasta). El informe APPCC (backend/appcc.py) la
+-- llama con los meses que pide; sin argumentos se comporta como antes
+-- (toda la cola), que es lo que hace el mantenimiento periódico.
+-- ============================================================
+
+-- Sin esto quedarían las dos versiones y la llamada sin argumentos
+-- sería ambigua
+DROP FUNCTION IF EXISTS refrescar_rollups_pendientes();
+
+CREATE OR REPLACE FUNCTION refrescar_rollups_pendientes(
+    desde TIMESTAMP DEFAULT NULL,
+    hasta TIMESTAMP DEFAULT NULL
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_sensores  INTEGER[];
+    v_horas     TIMESTAMP[];
+BEGIN
+    -- Lo que se marque mientras tanto queda para la siguiente pasada
+    WITH p AS (
+        DELETE FROM sensor_rollup_pendiente
+        WHERE (desde IS NULL OR hora >= desde)
+          AND (hasta IS NULL OR hora < hasta)
+        RETURNING id_sensor, hora
+    )
+    SELECT array_agg(id_sensor), array_agg(hora) INTO v_sensores, v_horas FROM p;
+
+    IF v_horas IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    INSERT INTO sensor_lectura_hora (id_sensor, hora, n, suma, minimo, maximo)
+    SELECT p.id_sensor, p.hora,
+           COUNT(*), SUM(l.valor), MIN(l.valor), MAX(l.valor)
+    FROM unnest(v_sensores, v_horas) AS p(id_sensor, hora)
+    JOIN sensor_lectura l
+      ON l.id_sensor = p.id_sensor
+     AND l.fecha_lectura >= p.hora
+     AND l.fecha_lectura < p.hora + INTERVAL '1 hour'
+    GROUP BY 1, 2
+    ON CONFLICT (id_sensor, hora) DO UPDATE
+        SET n = EXCLUDED.n,
+            suma = EXCLUDED.suma,
+            minimo = EXCLUDED.minimo,
+            maximo = EXCLUDED.maximo;
+
+    -- Los días afectados se recalculan enteros desde sensor_lectura_hora
+    INSERT INTO sensor_lectura_dia (id_sensor, dia, n, suma, minimo, maximo)
+    SELECT h.id_sensor, d.dia,
+           SUM(h.n), SUM(h.suma), MIN(h.minimo), MAX(h.maximo)
+    FROM (
+        SELECT DISTINCT id_sensor, hora::date AS dia
+        FROM unnest(v_sensores, v_horas) AS p(id_sensor, hora)
+    ) d
+    JOIN sensor_lectura_hora h
+      ON h.id_sensor = d.id_sensor
+     AND h.hora >= d.dia
+     AND h.hora < d.dia + 1
+    GROUP BY 1, 2
+    ON CONFLICT (id_sensor, dia) DO UPDATE
+        SET n = EXCLUDED.n,
+            suma = EXCLUDED.suma,
+            minimo = EXCLUDED.minimo,
+            maximo = EXCLUDED.maximo;
+
+    RETURN array_length(v_horas, 1);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,25 @@
+-- ============================================================
+-- MIGRACIÓN: Última lectura por sensor
+-- El dashboard lee de aquí temperatura/humedad actuales en vez de
+-- ordenar todo el histórico de sensor_lectura en cada petición.
+-- POST /dashboard/sensores/lectura la mantiene al insertar.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS sensor_ultima_lectura (
+    id_sensor       INTEGER PRIMARY KEY REFERENCES sensor(id_sensor) ON DELETE CASCADE,
+    valor           NUMERIC(6,2) NOT NULL,
+    fecha_lectura   TIMESTAMP NOT NULL
+);
+
+-- Relleno inicial con el histórico existente (se puede relanzar sin problema)
+INSERT INTO sensor_ultima_lectura (id_sensor, valor, fecha_lectura)
+SELECT DISTINCT ON (id_sensor) id_sensor, valor, fecha_lectura
+FROM sensor_lectura
+WHERE fecha_lectura IS NOT NULL
+ORDER BY id_sensor, fecha_lectura DESC
+ON CONFLICT (id_sensor) DO UPDATE
+    SET valor = EXCLUDED.valor,
+        fecha_lectura = EXCLUDED.fecha_lectura
+    WHERE sensor_ultima_lectura.fecha_lectura <= EXCLUDED.fecha_lectura;
+
+CREATE INDEX IF NOT EXISTS idx_sensor_camara_tipo ON sensor(id_camara, tipo) WHERE activo = true;
@@ -8,4 +8,12 @@ class Settings:
     EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
     EMAIL_RESPONSABLE = os.getenv("EMAIL_RESPONSABLE")
 
-settings = Settings()
\ No newline at end of file
+    # Servidor SMTP. Para probar en local con un servidor de pruebas
+    # (p.ej. `python -m aiosmtpd -n -l localhost:1025`):
+    # SMTP_HOST=localhost SMTP_PORT=1025 SMTP_SSL=false y sin EMAIL_PASSWORD
+    SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+    SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+    SMTP_SSL = os.getenv("SMTP_SSL", "true").lower() in ("1", "true", "yes")
+    SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+
+settings = Settings()
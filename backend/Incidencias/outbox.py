@@ -0,0 +1,321 @@
+# backend/Incidencias/outbox.py
+#
+# Envío de los correos de incidencias en segundo plano.
+# POST /incidencias solo inserta la incidencia en incidencia_outbox (ver
+# PostgreSQL_archivos/incidencia_outbox_migration.sql) y responde; este hilo
+# envía los pendientes:
+#   - reutiliza una conexión SMTP mientras haya trabajo (se cierra tras
+#     SMTP_IDLE_TIMEOUT segundos sin uso)
+#   - si un envío falla reintenta con espera exponencial hasta
+#     INCIDENCIAS_MAX_INTENTOS y después marca la fila como 'error'
+#   - con INCIDENCIAS_DIGEST_MIN > 0, si se acumulan al menos ese número de
+#     incidencias pendientes se mandan juntas en un único correo resumen
+#
+# Las filas se reservan con SKIP LOCKED y un plazo (INCIDENCIAS_LEASE), así
+# varios workers de uvicorn no mandan el mismo correo dos veces y si el
+# proceso muere a mitad de envío la fila vuelve a quedar pendiente.
+#
+# Una pasada a mano (p.ej. contra un servidor SMTP local de pruebas, ver
+# config.py):
+#   python -m backend.Incidencias.outbox
+
+import os
+import time
+import html
+import smtplib
+import threading
+import logging
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from backend.Incidencias.config import settings
+from backend.database import get_connection
+
+logger = logging.getLogger(__name__)
+
+INCIDENCIAS_OUTBOX_INTERVAL = float(os.getenv("INCIDENCIAS_OUTBOX_INTERVAL", "30"))  # segundos entre pasadas
+INCIDENCIAS_LOTE = int(os.getenv("INCIDENCIAS_LOTE", "50"))                         # filas por pasada
+INCIDENCIAS_MAX_INTENTOS = int(os.getenv("INCIDENCIAS_MAX_INTENTOS", "8"))
+INCIDENCIAS_BACKOFF_BASE = float(os.getenv("INCIDENCIAS_BACKOFF_BASE", "30"))      # 30s, 60s, 120s...
+INCIDENCIAS_BACKOFF_MAX = float(os.getenv("INCIDENCIAS_BACKOFF_MAX", "3600"))
+INCIDENCIAS_LEASE = float(os.getenv("INCIDENCIAS_LEASE", "300"))                   # plazo de una fila reservada
+INCIDENCIAS_DIGEST_MIN = int(os.getenv("INCIDENCIAS_DIGEST_MIN", "0"))             # 0 = sin resumen
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+
+
+# ============================================================
+# COLA
+# ============================================================
+
+def encolar_incidencia(cur, nombre_usuario, email_usuario, titulo, descripcion, destinatario=None):
+    """Inserta la incidencia en la bandeja de salida. El commit lo hace quien llama."""
+    cur.execute("""
+        INSERT INTO incidencia_outbox
+            (nombre_usuario, email_usuario, titulo, descripcion, destinatario)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id
+    """, [nombre_usuario, email_usuario, titulo, descripcion, destinatario])
+    return cur.fetchone()[0]
+
+
+def _reservar(cur, limite):
+    cur.execute("""
+        UPDATE incidencia_outbox
+        SET proximo_intento = NOW() + make_interval(secs => %s)
+        WHERE id IN (
+            SELECT id FROM incidencia_outbox
+            WHERE estado = 'pendiente' AND proximo_intento <= NOW()
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, nombre_usuario, email_usuario, titulo, descripcion,
+                  destinatario, creado
+    """, [INCIDENCIAS_LEASE, limite])
+    cols = [d[0] for d in cur.description]
+    return sorted((dict(zip(cols, r)) for r in cur.fetchall()), key=lambda f: f["id"])
+
+
+def _marcar_enviadas(cur, ids):
+    cur.execute("""
+        UPDATE incidencia_outbox
+        SET estado = 'enviado', enviado = NOW(), intentos = intentos + 1, ultimo_error = NULL
+        WHERE id = ANY(%s)
+    """, [ids])
+
+
+def _marcar_fallidas(cur, ids, error):
+    # En el SET, `intentos` es el valor anterior a este intento
+    cur.execute("""
+        UPDATE incidencia_outbox
+        SET intentos = intentos + 1,
+            ultimo_error = %(error)s,
+            estado = CASE WHEN intentos + 1 >= %(max)s THEN 'error' ELSE 'pendiente' END,
+            proximo_intento = NOW() + make_interval(
+                secs => LEAST(%(base)s * power(2, intentos), %(tope)s)
+            )
+        WHERE id = ANY(%(ids)s)
+    """, {
+        "error": error[:1000], "max": INCIDENCIAS_MAX_INTENTOS,
+        "base": INCIDENCIAS_BACKOFF_BASE, "tope": INCIDENCIAS_BACKOFF_MAX, "ids": ids
+    })
+
+
+# ============================================================
+# CORREOS
+# ============================================================
+
+def _tabla_incidencia(fila):
+    e = {k: html.escape(str(v or "")) for k, v in fila.items()}
+    fecha = fila["creado"].strftime("%d/%m/%Y %H:%M")
+    return f"""
+        <table style="border-collapse: collapse; width: 100%; max-width: 600px; margin-bottom: 20px;">
+            <tr style="background:#f8f8f8;">
+                <td style="padding:10px; font-weight:bold; width:150px;">Reportado por</td>
+                <td style="padding:10px;">{e['nombre_usuario']} ({e['email_usuario']})</td>
+            </tr>
+            <tr>
+                <td style="padding:10px; font-weight:bold;">Fecha</td>
+                <td style="padding:10px;">{fecha}</td>
+            </tr>
+            <tr style="background:#f8f8f8;">
+                <td style="padding:10px; font-weight:bold;">Título</td>
+                <td style="padding:10px;">{e['titulo']}</td>
+            </tr>
+            <tr>
+                <td style="padding:10px; font-weight:bold; vertical-align:top;">Descripción</td>
+                <td style="padding:10px;">{e['descripcion']}</td>
+            </tr>
+        </table>
+    """
+
+
+def _html(cabecera, tablas):
+    return f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; padding: 20px;">
+        <h2 style="color: #e74c3c;">{cabecera}</h2>
+        {''.join(tablas)}
+        <p style="color:#888; font-size:12px; margin-top:20px;">
+            Este mensaje fue generado automáticamente por el sistema de gestión InsectEat.
+        </p>
+    </body>
+    </html>
+    """
+
+
+def construir_mensaje(filas, destinatario):
+    """Un correo para una incidencia, o un resumen si son varias."""
+    msg = MIMEMultipart("alternative")
+    if len(filas) == 1:
+        msg["Subject"] = f"🚨 Nueva incidencia: {filas[0]['titulo']}"
+        cuerpo = _html("🚨 Nueva Incidencia Reportada", [_tabla_incidencia(filas[0])])
+    else:
+        msg["Subject"] = f"🚨 {len(filas)} nuevas incidencias"
+        cuerpo = _html(f"🚨 {len(filas)} Incidencias Reportadas", [_tabla_incidencia(f) for f in filas])
+    msg["From"] = settings.EMAIL_FROM
+    msg["To"] = destinatario
+    msg.attach(MIMEText(cuerpo, "html"))
+    return msg
+
+
+class ConexionSMTP:
+    """
+    Conexión SMTP reutilizable entre envíos. Se abre al primer envío, se
+    cierra si lleva `idle_timeout` segundos sin usarse y se reabre una vez
+    si el servidor la ha cortado.
+    """
+
+    def __init__(self, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._ultimo_uso = 0.0
+
+    def _conectar(self):
+        if settings.SMTP_SSL:
+            server = smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT)
+            server.ehlo()
+            if server.has_extn("starttls"):
+                server.starttls()
+                server.ehlo()
+        if settings.EMAIL_PASSWORD:
+            server.login(settings.EMAIL_FROM, settings.EMAIL_PASSWORD)
+        return server
+
+    def enviar(self, msg, destinatario):
+        if self._server and time.monotonic() - self._ultimo_uso > self.idle_timeout:
+            self.cerrar()
+
+        reutilizada = self._server is not None
+        if not reutilizada:
+            self._server = self._conectar()
+        try:
+            self._server.sendmail(settings.EMAIL_FROM, destinatario, msg.as_string())
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self.cerrar()
+            if not reutilizada:
+                raise
+            # El servidor cerró la conexión que teníamos abierta: una nueva
+            self._server = self._conectar()
+            self._server.sendmail(settings.EMAIL_FROM, destinatario, msg.as_string())
+        except Exception:
+            self.cerrar()
+            raise
+        self._ultimo_uso = time.monotonic()
+
+    def cerrar_si_inactiva(self):
+        if self._server and time.monotonic() - self._ultimo_uso > self.idle_timeout:
+            self.cerrar()
+
+    def cerrar(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+        self._server = None
+
+
+def _agrupar(filas, digest_min):
+    """Lista de (destinatario, filas) con un correo por elemento."""
+    por_destino = {}
+    for f in filas:
+        por_destino.setdefault(f["destinatario"] or settings.EMAIL_RESPONSABLE, []).append(f)
+
+    correos = []
+    for destinatario, grupo in por_destino.items():
+        if digest_min > 0 and len(grupo) >= digest_min:
+            correos.append((destinatario, grupo))
+        else:
+            correos.extend((destinatario, [f]) for f in grupo)
+    return correos
+
+
+def enviar_pendientes(conexion, limite=INCIDENCIAS_LOTE, digest_min=INCIDENCIAS_DIGEST_MIN):
+    """
+    Una pasada: reserva hasta `limite` incidencias pendientes y las envía.
+    Devuelve (enviadas, fallidas) en número de incidencias.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        filas = _reservar(cur, limite)
+        conn.commit()
+
+        enviadas = fallidas = 0
+        for destinatario, grupo in _agrupar(filas, digest_min):
+            ids = [f["id"] for f in grupo]
+            try:
+                conexion.enviar(construir_mensaje(grupo, destinatario), destinatario)
+            except Exception as e:
+                logger.warning(f"No se pudo enviar el correo de incidencias {ids}: {repr(e)}")
+                _marcar_fallidas(cur, ids, repr(e))
+                fallidas += len(ids)
+            else:
+                _marcar_enviadas(cur, ids)
+                enviadas += len(ids)
+            conn.commit()
+        return enviadas, fallidas
+    finally:
+        cur.close()
+        conn.close()
+
+
+class EnvioIncidencias:
+    """Hilo que vacía la bandeja de salida cada `interval` segundos o al despertarlo."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.conexion = ConexionSMTP()
+        self._stop = threading.Event()
+        self._pendiente = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="incidencias-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._pendiente.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.conexion.cerrar()
+
+    def despertar(self):
+        """Hay una incidencia nueva: enviar sin esperar a la siguiente pasada."""
+        self._pendiente.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._pendiente.clear()
+            try:
+                enviadas, fallidas = enviar_pendientes(self.conexion)
+                if enviadas + fallidas >= INCIDENCIAS_LOTE:
+                    continue    # puede quedar más cola
+            except Exception as e:
+                logger.error(f"Error en el envío de incidencias: {repr(e)}")
+            self.conexion.cerrar_si_inactiva()
+            self._pendiente.wait(self.interval)
+
+
+envio_incidencias = EnvioIncidencias(INCIDENCIAS_OUTBOX_INTERVAL)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    conexion = ConexionSMTP()
+    try:
+        enviadas, fallidas = enviar_pendientes(conexion)
+    finally:
+        conexion.cerrar()
+    print(f"Incidencias enviadas: {enviadas}, fallidas: {fallidas}")
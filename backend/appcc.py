@@ -1,11 +1,16 @@
+import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from backend.auth.auth import get_current_user
+from backend.cache import TTLCache
 from backend.database import get_connection
+from backend.sensor_mantenimiento import refrescar_rollups_rango
 from datetime import date, timedelta
 import calendar
 import io
+from copy import deepcopy
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/appcc", tags=["appcc"])
@@ -44,136 +49,362 @@ def get_semanas_mes(year: int, month: int):
     return semanas
 
 
-@router.get("/datos/{year}/{month}")
-def get_datos_appcc(year: int, month: int, user=Depends(get_current_user)):
-    if user["rol"] != "admin":
-        raise HTTPException(403, "Solo administradores pueden generar el APPCC")
+# ============================================================
+# DATOS DEL MES
+# ============================================================
+# Cada sección es una consulta independiente; se lanzan a la vez, cada una
+# con su propia conexión del pool. Las secciones fijas (zonas, aspectos,
+# proveedores...) se leen una vez y las mensuales con una sola consulta
+# por rango de meses, así un informe de varios meses cuesta lo mismo en
+# consultas que uno solo.
+# Los datos y el .docx se guardan en memoria con la versión del mes y la de
+# las tablas fijas (appcc_version, ver
+# PostgreSQL_archivos/appcc_version_migration.sql) como parte de la clave:
+# mientras nadie toque filas de ese mes, abrir o exportar un mes cerrado no
+# vuelve a consultar ni a generar nada.
+
+APPCC_WORKERS = int(os.getenv("APPCC_WORKERS", "4"))                # conexiones por informe
+APPCC_CACHE_TTL = float(os.getenv("APPCC_CACHE_TTL", "86400"))
+
+_executor = ThreadPoolExecutor(max_workers=APPCC_WORKERS, thread_name_prefix="appcc")
+_cache_datos = TTLCache(maxsize=48, ttl=APPCC_CACHE_TTL)
+_cache_docx = TTLCache(maxsize=24, ttl=APPCC_CACHE_TTL)
+
+MESES_ES = ["", "enero", "febrero", "marzo", "abril", "mayo", "junio",
+            "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+
+
+def _mes_de(fecha):
+    return date(fecha.year, fecha.month, 1)
+
+
+def _mes_siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def meses_rango(desde, hasta):
+    """Primeros de mes de `desde` a `hasta`, ambos incluidos."""
+    meses = []
+    mes = _mes_de(desde)
+    while mes <= hasta:
+        meses.append(mes)
+        mes = _mes_siguiente(mes)
+    return meses
+
+
+# --- Secciones fijas: fn(cur) ---
+
+def _seccion_zonas(cur):
+    # --- SECCIÓN 1: Zonas de limpieza con responsable ---
+    cur.execute("""
+        SELECT z.id, z.nombre, z.detergente, z.dosis,
+               z.forma_aplicacion, z.tiempo_exposicion,
+               o.nombre as responsable, z.orden
+        FROM appcc_zona_limpieza z
+        LEFT JOIN operario o ON o.id_operario = z.id_responsable
+        ORDER BY z.orden
+    """)
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+
+def _seccion_aspectos(cur):
+    # --- SECCIÓN 3: Aspectos de buenas prácticas ---
+    cur.execute("""
+        SELECT numero, descripcion FROM appcc_aspecto_practica ORDER BY numero
+    """)
+    return [{"numero": r[0], "descripcion": r[1]} for r in cur.fetchall()]
+
+
+def _seccion_zonas_plaga(cur):
+    # --- SECCIÓN 4: Control de plagas ---
+    cur.execute("SELECT id, nombre, orden FROM appcc_zona_plaga ORDER BY orden")
+    return [{"id": r[0], "nombre": r[1]} for r in cur.fetchall()]
+
+
+def _seccion_proveedores(cur):
+    # --- SECCIÓN 5: Proveedores ---
+    cur.execute("""
+        SELECT nombre, tipo_producto FROM proveedor ORDER BY nombre
+    """)
+    return [{"nombre": r[0], "producto": r[1] or ""} for r in cur.fetchall()]
+
+
+# --- Secciones mensuales: fn(cur, meses) -> {mes: valor} con todos los meses ---
+
+def _rango(meses):
+    return meses[0], _mes_siguiente(meses[-1])
+
+
+def _seccion_observaciones(cur, meses):
+    # Observaciones puntuales del mes
+    cur.execute("""
+        SELECT id_zona, fecha, observacion
+        FROM appcc_limpieza_observacion
+        WHERE fecha >= %s AND fecha < %s
+    """, _rango(meses))
+    por_mes = {m: {} for m in meses}
+    for id_zona, fecha, obs in cur.fetchall():
+        por_mes[_mes_de(fecha)][f"{id_zona}_{fecha}"] = obs
+    return por_mes
+
+
+def _seccion_higiene(cur, meses):
+    # --- SECCIÓN 2: Higiene personal (registro_limpieza_diario) ---
+    cur.execute("""
+        SELECT o.nombre, r.fecha
+        FROM registro_limpieza_diario r
+        JOIN operario o ON o.id_operario = r.id_operario
+        WHERE r.fecha >= %s AND r.fecha < %s
+        ORDER BY o.nombre, r.fecha
+    """, _rango(meses))
+    por_mes = {m: {} for m in meses}
+    for nombre, fecha in cur.fetchall():
+        por_mes[_mes_de(fecha)].setdefault(nombre, set()).add(str(fecha))
+    return {m: {k: list(v) for k, v in higiene.items()} for m, higiene in por_mes.items()}
+
+
+def _seccion_resultados_practica(cur, meses):
+    cur.execute("""
+        SELECT semana_inicio, id_aspecto, correcto, observacion
+        FROM appcc_practica_resultado
+        WHERE semana_inicio >= %s AND semana_inicio < %s
+    """, _rango(meses))
+    por_mes = {m: {} for m in meses}
+    for semana, id_asp, correcto, obs in cur.fetchall():
+        por_mes[_mes_de(semana)][f"{semana}_{id_asp}"] = {"correcto": correcto, "observacion": obs}
+    return por_mes
+
+
+def _seccion_plaga_data(cur, meses):
+    cur.execute("""
+        SELECT mes, id_zona, interaccion_trampas, reposicion_producto, observaciones
+        FROM appcc_plaga_registro
+        WHERE mes >= %s AND mes < %s
+    """, _rango(meses))
+    por_mes = {m: {} for m in meses}
+    for mes, id_zona, interaccion, reposicion, obs in cur.fetchall():
+        por_mes[_mes_de(mes)][id_zona] = {
+            "interaccion": interaccion,
+            "reposicion": reposicion,
+            "observaciones": obs or ""
+        }
+    return por_mes
+
+
+def _seccion_trazabilidad(cur, meses):
+    # --- SECCIÓN 6: Trazabilidad (lotes finales producidos en el mes) ---
+    cur.execute("""
+        SELECT
+            lf.codigo_lote, lf.tipo_producto, lf.fecha_produccion,
+            lf.destino, lf.etiquetado_ok, lf.observaciones,
+            la.tipo_alimento, la.descripcion AS sustrato_desc,
+            lh.origen AS partida_larvas
+        FROM lote_final lf
+        LEFT JOIN lote_alimento la ON la.id_lote_alimento = lf.id_lote_alimento
+        LEFT JOIN lote_huevo lh ON lh.id_lote_huevo = lf.id_lote_huevo
+        WHERE lf.fecha_produccion >= %s AND lf.fecha_produccion < %s
+        ORDER BY lf.fecha_produccion
+    """, _rango(meses))
+    cols = [d[0] for d in cur.description]
+    por_mes = {m: [] for m in meses}
+    for row in cur.fetchall():
+        fila = dict(zip(cols, row))
+        por_mes[_mes_de(fila["fecha_produccion"])].append(fila)
+    return por_mes
+
+
+def _seccion_clima(cur, meses):
+    # --- Temperatura y humedad: medias diarias por cámara ---
+    # Sale de los rollups diarios (sensor_lectura_dia), no del histórico en
+    # bruto; claves_appcc los pone al día antes (_refrescar_clima). Una
+    # cámara sale en un mes si tiene algún sensor activo o lecturas ese
+    # mes; los días sin lecturas quedan fuera de `dias` y se marcan en el
+    # documento.
+    desde, hasta = _rango(meses)
+    cur.execute("""
+        SELECT s.tipo, c.id_camara, c.nombre, BOOL_OR(s.activo), d.dia,
+               SUM(d.suma) / NULLIF(SUM(d.n), 0) AS media,
+               MIN(d.minimo), MAX(d.maximo), SUM(d.n)
+        FROM sensor s
+        JOIN camara c ON c.id_camara = s.id_camara
+        LEFT JOIN sensor_lectura_dia d
+               ON d.id_sensor = s.id_sensor
+              AND d.dia >= %(desde)s AND d.dia < %(hasta)s
+        WHERE s.tipo IN ('temperatura', 'humedad')
+          AND c.id_franquiciado IS NULL
+        GROUP BY s.tipo, c.id_camara, c.nombre, d.dia
+        ORDER BY s.tipo, c.nombre, c.id_camara, d.dia
+    """, {"desde": desde, "hasta": hasta})
+
+    camaras = {}    # (tipo, id_camara) -> {"nombre", "activa", "dias": {mes: {dia: lectura}}}
+    for tipo, id_camara, nombre, activo, dia, media, minimo, maximo, n in cur.fetchall():
+        camara = camaras.setdefault((tipo, id_camara), {"nombre": nombre, "activa": False, "dias": {}})
+        camara["activa"] = camara["activa"] or bool(activo)
+        if dia is not None and media is not None:
+            camara["dias"].setdefault(_mes_de(dia), {})[str(dia.day)] = {
+                "media": round(float(media), 1),
+                "minimo": float(minimo),
+                "maximo": float(maximo),
+                "lecturas": int(n),
+            }
 
+    por_mes = {}
+    for mes in meses:
+        clima = {"temperatura": [], "humedad": []}
+        for (tipo, id_camara), camara in camaras.items():
+            dias = camara["dias"].get(mes, {})
+            if camara["activa"] or dias:
+                clima[tipo].append({"id_camara": id_camara, "nombre": camara["nombre"], "dias": dias})
+        por_mes[mes] = clima
+    return por_mes
+
+
+def _nombre_admin(cur, id_operario):
+    cur.execute("""
+        SELECT nombre FROM operario WHERE id_operario = %s
+    """, (id_operario,))
+    row = cur.fetchone()
+    return row[0] if row else ""
+
+
+SECCIONES_FIJAS = {
+    "zonas_limpieza": _seccion_zonas,
+    "aspectos_practica": _seccion_aspectos,
+    "zonas_plaga": _seccion_zonas_plaga,
+    "proveedores": _seccion_proveedores,
+}
+
+SECCIONES_MES = {
+    "observaciones_limpieza": _seccion_observaciones,
+    "higiene_personal": _seccion_higiene,
+    "resultados_practica": _seccion_resultados_practica,
+    "plaga_data": _seccion_plaga_data,
+    "trazabilidad": _seccion_trazabilidad,
+    "clima": _seccion_clima,
+}
+
+
+def _con_conexion(fn, *args):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        # --- SECCIÓN 1: Zonas de limpieza con responsable ---
-        cur.execute("""
-            SELECT z.id, z.nombre, z.detergente, z.dosis,
-                   z.forma_aplicacion, z.tiempo_exposicion,
-                   o.nombre as responsable, z.orden
-            FROM appcc_zona_limpieza z
-            LEFT JOIN operario o ON o.id_operario = z.id_responsable
-            ORDER BY z.orden
-        """)
-        cols = [d[0] for d in cur.description]
-        zonas = [dict(zip(cols, row)) for row in cur.fetchall()]
-
-        # Observaciones puntuales del mes
-        cur.execute("""
-            SELECT id_zona, fecha, observacion
-            FROM appcc_limpieza_observacion
-            WHERE DATE_TRUNC('month', fecha) = %s
-        """, (date(year, month, 1),))
-        obs_rows = cur.fetchall()
-        observaciones = {}
-        for id_zona, fecha, obs in obs_rows:
-            observaciones[(id_zona, str(fecha))] = obs
-
-        # --- SECCIÓN 2: Higiene personal (registro_limpieza_diario) ---
-        cur.execute("""
-            SELECT o.nombre, r.fecha
-            FROM registro_limpieza_diario r
-            JOIN operario o ON o.id_operario = r.id_operario
-            WHERE DATE_TRUNC('month', r.fecha) = %s
-            ORDER BY o.nombre, r.fecha
-        """, (date(year, month, 1),))
-        higiene_rows = cur.fetchall()
-        higiene = {}
-        for nombre, fecha in higiene_rows:
-            higiene.setdefault(nombre, set()).add(str(fecha))
-
-        # --- SECCIÓN 3: Aspectos de buenas prácticas ---
-        cur.execute("""
-            SELECT numero, descripcion FROM appcc_aspecto_practica ORDER BY numero
-        """)
-        aspectos = [{"numero": r[0], "descripcion": r[1]} for r in cur.fetchall()]
-
-        cur.execute("""
-            SELECT semana_inicio, id_aspecto, correcto, observacion
-            FROM appcc_practica_resultado
-            WHERE DATE_TRUNC('month', semana_inicio) = %s
-        """, (date(year, month, 1),))
-        resultados_practica = {}
-        for semana, id_asp, correcto, obs in cur.fetchall():
-            resultados_practica[(str(semana), id_asp)] = {
-                "correcto": correcto, "observacion": obs
-            }
+        return fn(cur, *args)
+    finally:
+        cur.close()
+        conn.close()
 
-        # --- SECCIÓN 4: Control de plagas ---
-        cur.execute("SELECT id, nombre, orden FROM appcc_zona_plaga ORDER BY orden")
-        zonas_plaga = [{"id": r[0], "nombre": r[1]} for r in cur.fetchall()]
-
-        cur.execute("""
-            SELECT id_zona, interaccion_trampas, reposicion_producto, observaciones
-            FROM appcc_plaga_registro
-            WHERE mes = %s
-        """, (date(year, month, 1),))
-        plaga_data = {}
-        for id_zona, interaccion, reposicion, obs in cur.fetchall():
-            plaga_data[id_zona] = {
-                "interaccion": interaccion,
-                "reposicion": reposicion,
-                "observaciones": obs or ""
-            }
 
-        # --- SECCIÓN 5: Proveedores ---
-        cur.execute("""
-            SELECT nombre FROM operario WHERE id_operario = %s
-        """, (user["id_operario"],))
-        row = cur.fetchone()
-        nombre_admin = row[0] if row else ""
-
-        cur.execute("""
-            SELECT nombre, tipo_producto FROM proveedor ORDER BY nombre
-        """)
-        proveedores = [{"nombre": r[0], "producto": r[1] or ""} for r in cur.fetchall()]
-
-        # --- SECCIÓN 6: Trazabilidad (lotes finales producidos en el mes) ---
-        cur.execute("""
-            SELECT
-                lf.codigo_lote, lf.tipo_producto, lf.fecha_produccion,
-                lf.destino, lf.etiquetado_ok, lf.observaciones,
-                la.tipo_alimento, la.descripcion AS sustrato_desc,
-                lh.origen AS partida_larvas
-            FROM lote_final lf
-            LEFT JOIN lote_alimento la ON la.id_lote_alimento = lf.id_lote_alimento
-            LEFT JOIN lote_huevo lh ON lh.id_lote_huevo = lf.id_lote_huevo
-            WHERE DATE_TRUNC('month', lf.fecha_produccion) = %s
-            ORDER BY lf.fecha_produccion
-        """, (date(year, month, 1),))
-        cols = [d[0] for d in cur.description]
-        trazabilidad = [dict(zip(cols, row)) for row in cur.fetchall()]
-
-        meses_es = ["", "enero", "febrero", "marzo", "abril", "mayo", "junio",
-                    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
-
-        return {
+def _versiones(cur, meses):
+    """{mes: (versión del mes, versión de las tablas fijas)}; 0 si nunca han cambiado."""
+    ambitos = {mes: f"{mes.year:04d}-{mes.month:02d}" for mes in meses}
+    cur.execute("""
+        SELECT ambito, version FROM appcc_version WHERE ambito = ANY(%s)
+    """, (list(ambitos.values()) + ["estatico"],))
+    versiones = dict(cur.fetchall())
+    estatico = versiones.get("estatico", 0)
+    return {mes: (versiones.get(ambito, 0), estatico) for mes, ambito in ambitos.items()}
+
+
+def _refrescar_clima(meses):
+    """
+    Pasa a sensor_lectura_dia las lecturas de los meses pedidos que aún no
+    están en los rollups (tardías o recién llegadas) para que el informe no
+    marque como "sin lecturas" días que sí las tienen. Solo esas horas, no
+    toda la cola; si el mantenimiento está en marcha se deja a él. Va antes
+    de leer las versiones: si cambia algún día, el trigger de
+    appcc_clima_migration.sql sube la del mes.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        refrescar_rollups_rango(cur, *_rango(meses))
+        conn.commit()
+    except Exception as e:
+        # El informe sale igual, con los rollups como estén
+        conn.rollback()
+        logger.warning(f"No se pudieron refrescar los rollups de sensores: {repr(e)}")
+    finally:
+        cur.close()
+        conn.close()
+
+
+def claves_appcc(meses, id_operario):
+    """Identifica el contenido de cada informe: mes, admin y versiones de los datos."""
+    _refrescar_clima(meses)
+    versiones = _con_conexion(_versiones, meses)
+    return {mes: (mes.year, mes.month, id_operario) + versiones[mes] for mes in meses}
+
+
+def clave_appcc(year: int, month: int, id_operario):
+    mes = date(year, month, 1)
+    return claves_appcc([mes], id_operario)[mes]
+
+
+def _consultar_meses(meses, id_operario):
+    """Lanza en paralelo las secciones fijas y las mensuales de todo el rango."""
+    futuros = {k: _executor.submit(_con_conexion, fn) for k, fn in SECCIONES_FIJAS.items()}
+    futuros.update({k: _executor.submit(_con_conexion, fn, meses) for k, fn in SECCIONES_MES.items()})
+    futuros["nombre_admin"] = _executor.submit(_con_conexion, _nombre_admin, id_operario)
+    secciones = {k: f.result() for k, f in futuros.items()}
+
+    datos = {}
+    for mes in meses:
+        year, month = mes.year, mes.month
+        datos[mes] = {
             "year": year,
             "month": month,
-            "mes_nombre": meses_es[month].upper(),
-            "nombre_admin": nombre_admin,
+            "mes_nombre": MESES_ES[month].upper(),
+            "nombre_admin": secciones["nombre_admin"],
             "dias_laborables": [str(d) for d in get_dias_laborables(year, month)],
             "semanas": [(str(s[0]), str(s[1])) for s in get_semanas_mes(year, month)],
-            "zonas_limpieza": zonas,
-            "observaciones_limpieza": {f"{k[0]}_{k[1]}": v for k, v in observaciones.items()},
-            "higiene_personal": {k: list(v) for k, v in higiene.items()},
-            "aspectos_practica": aspectos,
-            "resultados_practica": {f"{k[0]}_{k[1]}": v for k, v in resultados_practica.items()},
-            "zonas_plaga": zonas_plaga,
-            "plaga_data": plaga_data,
-            "proveedores": proveedores,
-            "trazabilidad": trazabilidad,
+            **{k: secciones[k] for k in SECCIONES_FIJAS},
+            **{k: secciones[k][mes] for k in SECCIONES_MES},
         }
+    return datos
 
-    finally:
-        cur.close()
-        conn.close()
+
+def cargar_datos_meses(meses, id_operario):
+    """
+    Devuelve [(datos, clave)] de cada mes de `meses` (consecutivos). Los
+    meses que no están en caché se consultan juntos: una consulta por
+    sección para todo el tramo.
+    """
+    claves = claves_appcc(meses, id_operario)
+    resultado = {mes: _cache_datos.get(claves[mes]) for mes in meses}
+
+    faltan = [mes for mes in meses if resultado[mes] is None]
+    if faltan:
+        nuevos = _consultar_meses(meses_rango(faltan[0], faltan[-1]), id_operario)
+        for mes in faltan:
+            resultado[mes] = nuevos[mes]
+            _cache_datos.set(claves[mes], nuevos[mes])
+    return [(resultado[mes], claves[mes]) for mes in meses]
+
+
+def cargar_datos_appcc(year: int, month: int, id_operario):
+    """
+    Devuelve (datos, clave). `clave` identifica el contenido de los datos
+    (ver claves_appcc) y sirve también para cachear el .docx.
+    """
+    return cargar_datos_meses([date(year, month, 1)], id_operario)[0]
+
+
+def docx_cacheado(clave):
+    return _cache_docx.get(clave)
+
+
+def cachear_docx(clave, docx_bytes):
+    _cache_docx.set(clave, docx_bytes)
+
+
+@router.get("/datos/{year}/{month}")
+def get_datos_appcc(year: int, month: int, user=Depends(get_current_user)):
+    if user["rol"] != "admin":
+        raise HTTPException(403, "Solo administradores pueden generar el APPCC")
+
+    datos, _ = cargar_datos_appcc(year, month, user["id_operario"])
+    return datos
 
 
 @router.get("/exportar/{year}/{month}")
@@ -182,8 +413,11 @@ def exportar_appcc(year: int, month: int, user=Depends(get_current_user)):
         raise HTTPException(403, "Solo administradores pueden exportar el APPCC")
 
     # Reutilizamos la lógica de datos
-    datos = get_datos_appcc(year, month, user)
-    docx_bytes = generar_docx(datos)
+    datos, clave = cargar_datos_appcc(year, month, user["id_operario"])
+    docx_bytes = docx_cacheado(clave)
+    if docx_bytes is None:
+        docx_bytes = generar_docx(datos)
+        cachear_docx(clave, docx_bytes)
 
     filename = f"APPCC_{datos['mes_nombre']}_{year}.docx"
     return StreamingResponse(
@@ -193,7 +427,49 @@ def exportar_appcc(year: int, month: int, user=Depends(get_current_user)):
     )
 
 
-def generar_docx(datos: dict) -> bytes:
+# Títulos de primer nivel de generar_docx, en orden (para el progreso de los trabajos)
+SECCIONES_DOCX = [
+    "LIMPIEZA Y DESINFECCIÓN",
+    "PARTES DE ALMACENAMIENTO",
+    "CONTROL DE MATERIAS PRIMAS",
+    "CONTROL DE TEMPERATURA Y HUMEDAD",
+    "CONTROL DE HIGIENE PERSONAL",
+    "CONTROL DE BUENAS PRÁCTICAS DE MANIPULACIÓN",
+    "CONTROL DE PLAGAS",
+    "CONTROL DE PROVEEDORES",
+    "CONTROL DE TRANSFORMACIÓN DEL PRODUCTO",
+    "CONTROL DE ALMACENAMIENTO",
+    "CONTROL DE IDENTIFICACIÓN Y TRAZABILIDAD",
+]
+
+
+def _elementos_body(doc):
+    body = doc.element.body
+    return [el for el in body if el is not body.sectPr]
+
+
+def _anadir_al_body(doc, elementos):
+    """Inserta elementos al final del documento (antes del sectPr final)."""
+    sect_pr = doc.element.body.sectPr
+    for el in elementos:
+        if sect_pr is not None:
+            sect_pr.addprevious(el)
+        else:
+            doc.element.body.append(el)
+
+
+def generar_docx(datos: dict, progreso=None, rapido=True) -> bytes:
+    """
+    Genera el .docx del mes. `progreso(titulo)` se llama al empezar cada
+    sección de SECCIONES_DOCX.
+
+    Con rapido=True las partes repetitivas no se construyen celda a celda:
+    la hoja de limpieza del primer día se clona para el resto de días
+    cambiando solo los textos (fecha y observaciones), y las tablas de clima
+    leen la rejilla de celdas una vez en lugar de recalcularla en cada
+    acceso. El XML resultante es el mismo que con rapido=False (ver
+    backend/scripts/bench_appcc_docx.py).
+    """
     from docx import Document
     from docx.shared import Pt, Cm, RGBColor
     from docx.enum.text import WD_ALIGN_PARAGRAPH
@@ -227,6 +503,8 @@ def generar_docx(datos: dict) -> bytes:
         tcPr.append(shd)
 
     def heading(text, level=1):
+        if progreso and level == 1:
+            progreso(text)
         p = doc.add_paragraph()
         p.alignment = WD_ALIGN_PARAGRAPH.CENTER
         run = p.add_run(text)
@@ -243,10 +521,24 @@ def generar_docx(datos: dict) -> bytes:
     zonas = datos["zonas_limpieza"]
     obs_map = datos["observaciones_limpieza"]
 
+    # Bloque (fecha, tabla, firma, vacío) del primer día, para clonarlo
+    bloque_limpieza = None
+
     for dia_str in dias:
         dia = date.fromisoformat(dia_str)
         dia_num = dia.day
 
+        if bloque_limpieza is not None:
+            fecha_p, tbl, *resto = [deepcopy(el) for el in bloque_limpieza]
+            fecha_p.r_lst[0].text = f"Fecha: {dia_num}    Mes: {mes_nombre}    Año: {year}"
+            for tr, zona in zip(tbl.tr_lst[1:], zonas):
+                obs_val = obs_map.get(f"{zona['id']}_{dia_str}", "")
+                tr.tc_lst[6].p_lst[0].r_lst[0].text = str(obs_val)
+            _anadir_al_body(doc, [fecha_p, tbl, *resto])
+            continue
+
+        antes = len(_elementos_body(doc))
+
         p = doc.add_paragraph()
         p.add_run(f"Fecha: {dia_num}    Mes: {mes_nombre}    Año: {year}").bold = True
 
@@ -292,6 +584,9 @@ def generar_docx(datos: dict) -> bytes:
         doc.add_paragraph(f"Firma responsable: _________________________")
         doc.add_paragraph("")
 
+        if rapido:
+            bloque_limpieza = _elementos_body(doc)[antes:]
+
 
 
     # =========================================================
@@ -458,48 +753,28 @@ def generar_docx(datos: dict) -> bytes:
     # =========================================================
     # SECCIÓN: CONTROL DE TEMPERATURA Y HUMEDAD
     # =========================================================
-    import random
-
-    def generar_temp(n):
-        """Más 26 que 25, más 25 que 27"""
-        pool = [26] * 5 + [25] * 3 + [27] * 2
-        return [random.choice(pool) for _ in range(n)]
-
-    def generar_hum_sala(n):
-        """Salas climatizadas: más 66 que 65, más 65 que 67"""
-        pool = [66] * 5 + [65] * 3 + [67] * 2
-        return [random.choice(pool) for _ in range(n)]
-
-    def generar_hum_almacen(n):
-        """Almacenes: más 12 que 13, más 13 que 14"""
-        pool = [12] * 5 + [13] * 3 + [14] * 2
-        return [random.choice(pool) for _ in range(n)]
-
-
     year = datos["year"]
     month = datos["month"]
 
     _, num_dias_mes = calendar.monthrange(year, month)
     todos_dias = list(range(1, num_dias_mes + 1))
 
-    # Días laborables como set para saber cuáles rellenar
-    dias_lab_set = {date.fromisoformat(d).day for d in datos["dias_laborables"]}
-
-    # Salas y sus generadores
-    salas_temp = ["Sala climatizada 1", "Sala climatizada 2", "Almacén 1"]
-    salas_hum_sala = ["Sala climatizada 1", "Sala climatizada 2"]
-    salas_hum_alm = ["Almacén 1"]
-
-    def build_tabla_clima(doc, titulo_seccion, salas, generadores_por_sala, unidad):
+    def build_tabla_clima(doc, titulo_seccion, camaras, unidad):
+        """Una fila por cámara con la media diaria; los días sin lecturas van marcados."""
 
         p = doc.add_paragraph()
         r = p.add_run(titulo_seccion)
         r.bold = True
         r.font.size = Pt(10)
 
+        if not camaras:
+            doc.add_paragraph("(Sin sensores registrados)")
+            doc.add_paragraph()
+            return
+
         num_cols = 1 + num_dias_mes
 
-        tabla = doc.add_table(rows=2 + len(salas), cols=num_cols)
+        tabla = doc.add_table(rows=2 + len(camaras), cols=num_cols)
         tabla.style = "Table Grid"
         tabla.autofit = False
 
@@ -546,8 +821,21 @@ def generar_docx(datos: dict) -> bytes:
 
         col_dia = int(ancho_dias / num_dias_mes)
 
+        # Rejilla de celdas calculada una sola vez (tabla.cell() la recalcula
+        # entera en cada llamada)
+        if rapido:
+            filas = [row.cells for row in tabla.rows]
+            celda_en = lambda r, c: filas[r][c]
+        else:
+            celda_en = tabla.cell
+
         # Asignar ancho a TODAS las celdas
-        for row in tabla.rows:
+        for r, row in enumerate(tabla.rows):
+            if rapido:
+                for i, cell in enumerate(filas[r]):
+                    cell.width = col_sala if i == 0 else col_dia
+                continue
+
             row.cells[0].width = col_sala
 
             for i in range(1, num_cols):
@@ -557,16 +845,16 @@ def generar_docx(datos: dict) -> bytes:
         # Cabecera
         # ==================================================
 
-        set_cell_bg(tabla.cell(0,0),"D9D9D9")
+        set_cell_bg(celda_en(0,0),"D9D9D9")
 
-        p = tabla.cell(0,0).paragraphs[0]
+        p = celda_en(0,0).paragraphs[0]
         p.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
         rr = p.add_run("MES/AÑO")
         rr.bold = True
         rr.font.size = Pt(7)
 
-        cab = tabla.cell(0,1).merge(tabla.cell(0,num_cols-1))
+        cab = celda_en(0,1).merge(celda_en(0,num_cols-1))
 
         set_cell_bg(cab,"D9D9D9")
 
@@ -581,9 +869,9 @@ def generar_docx(datos: dict) -> bytes:
         # Días
         # ==================================================
 
-        set_cell_bg(tabla.cell(1,0),"D9D9D9")
+        set_cell_bg(celda_en(1,0),"D9D9D9")
 
-        p = tabla.cell(1,0).paragraphs[0]
+        p = celda_en(1,0).paragraphs[0]
         p.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
         rr = p.add_run("DÍA")
@@ -592,7 +880,7 @@ def generar_docx(datos: dict) -> bytes:
 
         for i,dia in enumerate(todos_dias):
 
-            c = tabla.cell(1,i+1)
+            c = celda_en(1,i+1)
 
             set_cell_bg(c,"D9D9D9")
 
@@ -607,27 +895,34 @@ def generar_docx(datos: dict) -> bytes:
         # Datos
         # ==================================================
 
-        for fila,sala in enumerate(salas,start=2):
+        sin_datos = False
+
+        for fila,camara in enumerate(camaras,start=2):
 
-            c = tabla.cell(fila,0)
+            c = celda_en(fila,0)
 
             set_cell_bg(c,"F2F2F2")
 
             p = c.paragraphs[0]
 
-            rr = p.add_run(sala)
+            rr = p.add_run(camara["nombre"])
             rr.font.size = Pt(6)
 
-            valores = generadores_por_sala[fila-2](num_dias_mes)
+            for i,dia in enumerate(todos_dias):
 
-            for i,v in enumerate(valores):
-
-                celda = tabla.cell(fila,i+1)
+                celda = celda_en(fila,i+1)
 
                 p = celda.paragraphs[0]
                 p.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
-                rr = p.add_run(f"{v}{unidad}")
+                lectura = camara["dias"].get(str(dia))
+                if lectura is None:
+                    # Día sin lecturas: se marca en lugar de dejarlo en blanco
+                    set_cell_bg(celda,"FCE4D6")
+                    rr = p.add_run("—")
+                    sin_datos = True
+                else:
+                    rr = p.add_run(f"{lectura['media']:.0f}{unidad}")
                 rr.font.size = Pt(6)
 
         # ==================================================
@@ -637,6 +932,13 @@ def generar_docx(datos: dict) -> bytes:
         for row in tabla.rows:
             row.height = Cm(0.75)
 
+        if sin_datos:
+            nota = doc.add_paragraph().add_run(
+                "—: día sin lecturas registradas por el sensor de la cámara."
+            )
+            nota.italic = True
+            nota.font.size = Pt(7)
+
         doc.add_paragraph(
             "Lecturas realizadas por: Mª José Pérez Peñarrubia. "
         )
@@ -663,19 +965,9 @@ def generar_docx(datos: dict) -> bytes:
 
     heading(f"CONTROL DE TEMPERATURA Y HUMEDAD — {mes_nombre} {year}")
 
-    build_tabla_clima(
-        doc, "TEMPERATURA",
-        ["Sala climatizada 1", "Sala climatizada 2", "Almacén 1"],
-        [generar_temp, generar_temp, generar_temp],
-        "ºC"
-    )
+    build_tabla_clima(doc, "TEMPERATURA", datos["clima"]["temperatura"], "ºC")
 
-    build_tabla_clima(
-        doc, "HUMEDAD",
-        ["Sala climatizada 1", "Sala climatizada 2", "Almacén 1"],
-        [generar_hum_sala, generar_hum_sala, generar_hum_almacen],
-        "%"
-    )
+    build_tabla_clima(doc, "HUMEDAD", datos["clima"]["humedad"], "%")
     
     # Volver a orientación vertical
     back_section = doc.add_section()
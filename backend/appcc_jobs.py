@@ -0,0 +1,283 @@
+# backend/appcc_jobs.py
+#
+# Generación del APPCC en segundo plano. Generar el .docx de un mes tarda
+# varios segundos; en vez de hacerlo dentro de la petición:
+#   POST /appcc/jobs {year, month}     → 202 con el id del trabajo
+#   GET  /appcc/jobs/{id}              → estado y progreso por sección
+#   GET  /appcc/jobs/{id}/docx         → descarga cuando está terminado
+#
+# Los datos se leen en el backend (con la caché de appcc.py) y el documento
+# se genera en un pool de procesos, así no ocupa ni el GIL ni los hilos que
+# atienden al resto de endpoints. Estado y resultado se guardan en disco
+# (APPCC_JOBS_DIR): cualquier worker de uvicorn puede responder al sondeo.
+# El id sale de la clave de contenido del informe, de modo que pedir dos
+# veces el mismo mes sin cambios devuelve el mismo trabajo.
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+
+from backend.auth.auth import get_current_user
+from backend import appcc
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/appcc/jobs", tags=["appcc"])
+
+APPCC_JOBS_DIR = os.getenv("APPCC_JOBS_DIR", os.path.join(tempfile.gettempdir(), "appcc_jobs"))
+APPCC_JOB_PROCESSES = int(os.getenv("APPCC_JOB_PROCESSES", "2"))
+APPCC_JOBS_TTL = float(os.getenv("APPCC_JOBS_TTL", "86400"))        # segundos que se guardan los resultados
+APPCC_JOB_TIMEOUT = float(os.getenv("APPCC_JOB_TIMEOUT", "600"))    # sin avances en este tiempo = abandonado
+
+ESTADOS_FINALES = ("terminado", "error")
+
+_lock = threading.Lock()
+_procesos = None
+# Hilos que preparan los datos y esperan al proceso de cada trabajo
+_lanzador = ThreadPoolExecutor(max_workers=APPCC_JOB_PROCESSES * 2, thread_name_prefix="appcc-job")
+
+
+class AppccJobIn(BaseModel):
+    year: int
+    month: int
+
+
+# ============================================================
+# ALMACÉN EN DISCO
+# ============================================================
+
+def _ruta(job_id, extension):
+    return os.path.join(APPCC_JOBS_DIR, f"{job_id}.{extension}")
+
+
+def _escribir_estado(job_id, **cambios):
+    """Actualiza el .json del trabajo de forma atómica (tmp + rename)."""
+    estado = leer_estado(job_id) or {}
+    estado.update(cambios)
+    estado["actualizado"] = datetime.now().isoformat(timespec="seconds")
+    tmp = _ruta(job_id, f"{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f, ensure_ascii=False)
+    os.replace(tmp, _ruta(job_id, "json"))
+    return estado
+
+
+def leer_estado(job_id):
+    try:
+        with open(_ruta(job_id, "json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _purgar():
+    """Borra estados y documentos más antiguos que APPCC_JOBS_TTL."""
+    limite = time.time() - APPCC_JOBS_TTL
+    for nombre in os.listdir(APPCC_JOBS_DIR):
+        ruta = os.path.join(APPCC_JOBS_DIR, nombre)
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+        except OSError:
+            pass
+
+
+def _abandonado(estado):
+    actualizado = datetime.fromisoformat(estado["actualizado"])
+    return (datetime.now() - actualizado).total_seconds() > APPCC_JOB_TIMEOUT
+
+
+# ============================================================
+# EJECUCIÓN
+# ============================================================
+
+def pool_procesos():
+    global _procesos
+    with _lock:
+        if _procesos is None:
+            # spawn: el hijo no hereda el pool de conexiones ni los hilos del backend
+            _procesos = ProcessPoolExecutor(
+                max_workers=APPCC_JOB_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _procesos
+
+
+def _descartar_pool(roto):
+    """
+    Un pool con un hijo muerto (OOM, segfault en lxml...) queda roto para
+    siempre: se olvida para que pool_procesos() cree otro. Si otro hilo ya
+    lo ha sustituido, no se toca el nuevo.
+    """
+    global _procesos
+    with _lock:
+        if _procesos is roto:
+            _procesos = None
+    roto.shutdown(wait=False, cancel_futures=True)
+
+
+class TareaEnProceso:
+    """
+    fn(*args) lanzada en el pool de procesos. result() espera el resultado;
+    si el pool se rompe mientras tanto (aunque sea por otra tarea), lo
+    recrea y reintenta una vez antes de dar el error.
+    """
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+        self._pool = None
+        self._futuro = None
+        self._enviar()
+
+    def _enviar(self):
+        self._pool = pool_procesos()
+        try:
+            self._futuro = self._pool.submit(self.fn, *self.args)
+        except BrokenProcessPool:
+            _descartar_pool(self._pool)
+            self._futuro = None
+
+    def result(self):
+        for intento in range(2):
+            if self._futuro is None:
+                self._enviar()
+            try:
+                if self._futuro is None:
+                    raise BrokenProcessPool("No se pudo lanzar la tarea en el pool de procesos")
+                return self._futuro.result()
+            except BrokenProcessPool:
+                _descartar_pool(self._pool)
+                self._futuro = None
+                if intento:
+                    raise
+                logger.warning(f"Pool de procesos roto, se recrea y se reintenta {self.fn.__name__}")
+
+
+def _generar_en_proceso(job_id, datos):
+    """Se ejecuta en el proceso hijo: genera el .docx e informa del progreso."""
+    hechas = [0]
+
+    def progreso(titulo):
+        _escribir_estado(
+            job_id, estado="generando", seccion=titulo,
+            secciones_hechas=hechas[0], progreso=round(hechas[0] / len(appcc.SECCIONES_DOCX), 2)
+        )
+        hechas[0] += 1
+
+    docx_bytes = appcc.generar_docx(datos, progreso=progreso)
+
+    tmp = _ruta(job_id, f"{os.getpid()}.docx.tmp")
+    with open(tmp, "wb") as f:
+        f.write(docx_bytes)
+    os.replace(tmp, _ruta(job_id, "docx"))
+    _escribir_estado(
+        job_id, estado="terminado", seccion=None,
+        secciones_hechas=len(appcc.SECCIONES_DOCX), progreso=1.0, bytes=len(docx_bytes)
+    )
+
+
+def _ejecutar(job_id, year, month, id_operario):
+    try:
+        _escribir_estado(job_id, estado="datos")
+        datos, _ = appcc.cargar_datos_appcc(year, month, id_operario)
+        TareaEnProceso(_generar_en_proceso, job_id, datos).result()
+    except Exception as e:
+        logger.error(f"Trabajo APPCC {job_id} fallido: {repr(e)}")
+        _escribir_estado(job_id, estado="error", error=str(e))
+
+
+def enviar_trabajo(year, month, id_operario):
+    """Crea (o reutiliza) el trabajo del mes y devuelve su estado."""
+    os.makedirs(APPCC_JOBS_DIR, exist_ok=True)
+    _purgar()
+
+    clave = appcc.clave_appcc(year, month, id_operario)
+    job_id = hashlib.sha1(repr(clave).encode()).hexdigest()[:20]
+
+    with _lock:
+        estado = leer_estado(job_id)
+        if estado and (
+            (estado["estado"] == "terminado" and os.path.exists(_ruta(job_id, "docx")))
+            or (estado["estado"] not in ESTADOS_FINALES and not _abandonado(estado))
+        ):
+            return estado
+
+        estado = _escribir_estado(
+            job_id, id=job_id, year=year, month=month, estado="pendiente",
+            seccion=None, secciones_hechas=0, total_secciones=len(appcc.SECCIONES_DOCX),
+            progreso=0.0, error=None, creado=datetime.now().isoformat(timespec="seconds")
+        )
+    _lanzador.submit(_ejecutar, job_id, year, month, id_operario)
+    return estado
+
+
+def cerrar():
+    """Para el pool de procesos (al apagar el backend)."""
+    global _procesos
+    with _lock:
+        if _procesos is not None:
+            _procesos.shutdown(wait=False, cancel_futures=True)
+            _procesos = None
+
+
+# ============================================================
+# ENDPOINTS
+# ============================================================
+
+def _solo_admin(user):
+    if user["rol"] != "admin":
+        raise HTTPException(403, "Solo administradores pueden exportar el APPCC")
+
+
+def _estado_out(estado):
+    estado = dict(estado)
+    if estado["estado"] == "terminado":
+        estado["descarga"] = f"/appcc/jobs/{estado['id']}/docx"
+    return estado
+
+
+@router.post("", status_code=202)
+def crear_trabajo_appcc(body: AppccJobIn, user=Depends(get_current_user)):
+    """Encola la generación del .docx del mes; devuelve el trabajo para sondear."""
+    _solo_admin(user)
+    if not 1 <= body.month <= 12:
+        raise HTTPException(400, "Mes no válido")
+    return _estado_out(enviar_trabajo(body.year, body.month, user["id_operario"]))
+
+
+@router.get("/{job_id}")
+def get_trabajo_appcc(job_id: str, user=Depends(get_current_user)):
+    _solo_admin(user)
+    estado = leer_estado(job_id) if job_id.isalnum() else None
+    if not estado:
+        raise HTTPException(404, "Trabajo no encontrado")
+    return _estado_out(estado)
+
+
+@router.get("/{job_id}/docx")
+def descargar_trabajo_appcc(job_id: str, user=Depends(get_current_user)):
+    _solo_admin(user)
+    estado = leer_estado(job_id) if job_id.isalnum() else None
+    if not estado:
+        raise HTTPException(404, "Trabajo no encontrado")
+    if estado["estado"] != "terminado" or not os.path.exists(_ruta(job_id, "docx")):
+        raise HTTPException(409, f"El trabajo no está terminado ({estado['estado']})")
+
+    mes_nombre = appcc.MESES_ES[estado["month"]].upper()
+    return FileResponse(
+        _ruta(job_id, "docx"),
+        media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        filename=f"APPCC_{mes_nombre}_{estado['year']}.docx"
+    )
@@ -0,0 +1,92 @@
+# backend/appcc_rango.py
+#
+# Exportación del APPCC de varios meses de una vez (auditorías anuales):
+#   GET /appcc/rango/exportar?desde=2025-01&hasta=2025-12
+#   GET /appcc/rango/exportar/2025
+# Devuelve un ZIP con un .docx por mes. Los datos salen de
+# appcc.cargar_datos_meses (secciones fijas una vez, una consulta por
+# sección mensual para todo el rango) y los documentos se generan en
+# paralelo en el pool de procesos de appcc_jobs. El ZIP se va enviando mes
+# a mes, en orden, según terminan los documentos.
+
+import os
+import zipfile
+from datetime import date, datetime
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from backend.auth.auth import get_current_user
+from backend import appcc
+from backend.appcc_jobs import TareaEnProceso
+from backend.exportar import SalidaPorTrozos
+
+router = APIRouter(prefix="/appcc/rango", tags=["appcc"])
+
+APPCC_RANGO_MAX_MESES = int(os.getenv("APPCC_RANGO_MAX_MESES", "24"))
+
+
+def _docx_meses(datos_claves):
+    """
+    Genera (nombre, bytes) de cada mes, en orden. Los que están en la caché
+    de appcc no se regeneran; el resto se reparten en el pool de procesos.
+    """
+    pendientes = []
+    for datos, clave in datos_claves:
+        docx_bytes = appcc.docx_cacheado(clave)
+        tarea = None if docx_bytes is not None else TareaEnProceso(appcc.generar_docx, datos)
+        pendientes.append((datos, clave, docx_bytes, tarea))
+
+    for datos, clave, docx_bytes, tarea in pendientes:
+        if tarea is not None:
+            docx_bytes = tarea.result()
+            appcc.cachear_docx(clave, docx_bytes)
+        yield f"APPCC_{datos['month']:02d}_{datos['mes_nombre']}_{datos['year']}.docx", docx_bytes
+
+
+def zip_meses(datos_claves):
+    """Generador de bytes del ZIP; los .docx ya van comprimidos y se guardan sin recomprimir."""
+    sink = SalidaPorTrozos()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as z:
+        for nombre, docx_bytes in _docx_meses(datos_claves):
+            z.writestr(nombre, docx_bytes)
+            yield sink.sacar()
+    yield sink.sacar()
+
+
+def _parse_mes(texto, campo):
+    try:
+        return datetime.strptime(texto, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(400, f"'{campo}' debe tener el formato AAAA-MM")
+
+
+def _exportar(meses, user):
+    if user["rol"] != "admin":
+        raise HTTPException(403, "Solo administradores pueden exportar el APPCC")
+    if not meses:
+        raise HTTPException(400, "'desde' debe ser anterior o igual a 'hasta'")
+    if len(meses) > APPCC_RANGO_MAX_MESES:
+        raise HTTPException(400, f"Como máximo {APPCC_RANGO_MAX_MESES} meses por exportación")
+
+    datos_claves = appcc.cargar_datos_meses(meses, user["id_operario"])
+
+    nombre = f"APPCC_{meses[0]:%Y-%m}_{meses[-1]:%Y-%m}.zip"
+    return StreamingResponse(
+        zip_meses(datos_claves),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={nombre}"}
+    )
+
+
+@router.get("/exportar")
+def exportar_appcc_rango(desde: str, hasta: str, user=Depends(get_current_user)):
+    """ZIP con el APPCC de cada mes entre `desde` y `hasta` (AAAA-MM, ambos incluidos)."""
+    meses = appcc.meses_rango(_parse_mes(desde, "desde"), _parse_mes(hasta, "hasta"))
+    return _exportar(meses, user)
+
+
+@router.get("/exportar/{year}")
+def exportar_appcc_anual(year: int, user=Depends(get_current_user)):
+    """ZIP con los doce meses del año."""
+    return _exportar(appcc.meses_rango(date(year, 1, 1), date(year, 12, 1)), user)
@@ -1,18 +1,23 @@
 # backend/auth/auth.py
 
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from passlib.context import CryptContext
 
 from backend.database import get_connection
 from backend.auth.jwt import create_access_token, decode_token
+from backend.cache import TTLCache
 
 import psycopg2
 from psycopg2 import sql, IntegrityError
 
 
 import os
+import asyncio
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -24,6 +29,25 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# Caché de usuarios autenticados (id -> fila de usuarios). AUTH_USER_CACHE_TTL
+# es el tiempo máximo (s) que un cambio hecho fuera de esta API tarda en verse.
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "1024"))
+
+_user_cache = TTLCache(maxsize=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL)
+
+# bcrypt (coste 12) es CPU pura: lo limitamos a un pool propio de pocos hilos
+# para que un pico de logins no se coma el threadpool del resto de endpoints.
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+# Logins simultáneos admitidos; el resto espera en cola sin ocupar hilos.
+AUTH_LOGIN_CONCURRENCY = int(os.getenv("AUTH_LOGIN_CONCURRENCY", "4"))
+# Vida (s) de los tokens de stream: EventSource no puede mandar la cabecera
+# Authorization, así que el token va en la URL y debe caducar enseguida.
+AUTH_STREAM_TOKEN_TTL = int(os.getenv("AUTH_STREAM_TOKEN_TTL", "60"))
+
+_hash_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
+_login_semaphore = asyncio.Semaphore(AUTH_LOGIN_CONCURRENCY)
+
 
 # ================================
 # MODELOS
@@ -55,15 +79,32 @@ class ProfileUpdate(BaseModel):
 # HELPERS
 # ================================
 
-def verify_password(plain_password: str, hashed_password: str):
+def _verify_password(plain_password: str, hashed_password: str):
     # Truncar a 72 caracteres (no bytes) y mantener como string
     truncated = plain_password[:72]
     return pwd_context.verify(truncated, hashed_password)
 
-def hash_password(password: str):
+def _hash_password(password: str):
     truncated = password[:72]  # También aquí, string no bytes
     return pwd_context.hash(truncated)
 
+def verify_password(plain_password: str, hashed_password: str):
+    return _hash_executor.submit(_verify_password, plain_password, hashed_password).result()
+
+def hash_password(password: str):
+    return _hash_executor.submit(_hash_password, password).result()
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    """Igual que verify_password pero sin bloquear el event loop."""
+    return await asyncio.wrap_future(
+        _hash_executor.submit(_verify_password, plain_password, hashed_password)
+    )
+
+
+def invalidate_user(user_id: int):
+    """Olvida el usuario cacheado para que la siguiente petición lo relea de BD."""
+    _user_cache.invalidate(user_id)
+
 
 # ================================
 # REGISTER
@@ -128,6 +169,7 @@ def register_user(data: RegisterRequest):
 
         user_id = cur.fetchone()[0]
         conn.commit()
+        invalidate_user(user_id)
 
         return {
             "message": "Usuario creado correctamente",
@@ -149,59 +191,52 @@ def register_user(data: RegisterRequest):
 # LOGIN
 # ================================
 
-@router.post("/login")
-def login(data: LoginRequest):
-
+def _get_usuario_login(email: str):
     conn = get_connection()
     try:
         cur = conn.cursor()
-
-        email = data.email.strip().lower()
-
-        print(f">>> EMAIL recibido: '{email}'")
-        print(f">>> PASSWORD recibido: '{data.password}'")
-        print(f">>> PASSWORD longitud: {len(data.password)}")
-        print(f">>> PASSWORD bytes: {data.password.encode('utf-8')}")
-
         cur.execute("""
             SELECT id, password_hash, rol, username, email, id_operario
             FROM usuarios
             WHERE LOWER(email) = %s
         """, (email,))
+        return cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
 
-        user = cur.fetchone()
+
+@router.post("/login")
+async def login(data: LoginRequest):
+
+    email = data.email.strip().lower()
+
+    # Los logins que superen AUTH_LOGIN_CONCURRENCY esperan aquí su turno
+    async with _login_semaphore:
+        user = await run_in_threadpool(_get_usuario_login, email)
 
         if not user:
-            print(">>> USUARIO NO ENCONTRADO")
             raise HTTPException(status_code=401, detail="Usuario no encontrado")
-        
-        print(f">>> HASH EN BD: {user[1]}")
-        resultado = verify_password(data.password, user[1])
-        print(f">>> RESULTADO VERIFY: {resultado}")
 
-        if not verify_password(data.password, user[1]):
+        if not await verify_password_async(data.password, user[1]):
             raise HTTPException(status_code=401, detail="Contraseña incorrecta")
 
-        token = create_access_token({
-            "user_id": user[0],
-            "rol": user[2],
-            "id_operario": user[5],
-        })
-
-        return {
-            "access_token": token,
-            "token_type": "bearer",
-            "user": {
-                "id": user[0],
-                "username": user[3],
-                "email": user[4],
-                "rol": user[2],
-            },
-        }
+    token = create_access_token({
+        "user_id": user[0],
+        "rol": user[2],
+        "id_operario": user[5],
+    })
 
-    finally:
-        cur.close()
-        conn.close()
+    return {
+        "access_token": token,
+        "token_type": "bearer",
+        "user": {
+            "id": user[0],
+            "username": user[3],
+            "email": user[4],
+            "rol": user[2],
+        },
+    }
 
 
 # ================================
@@ -211,14 +246,31 @@ def login(data: LoginRequest):
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
-    token = credentials.credentials
+    payload = decode_token(credentials.credentials)
+    # Los tokens de stream solo valen para los endpoints de stream
+    if payload.get("scope"):
+        raise HTTPException(401, "Token inválido")
+    return _usuario_de_payload(payload)
+
+
+def get_current_user_stream(token: str = Query(...)):
+    """Como get_current_user, pero con un token de stream en ?token= (ver /auth/stream-token)."""
     payload = decode_token(token)
+    if payload.get("scope") != "stream":
+        raise HTTPException(401, "Token inválido")
+    return _usuario_de_payload(payload)
+
 
+def _usuario_de_payload(payload):
     user_id = payload.get("user_id")
 
     if not user_id:
         raise HTTPException(401, "Token inválido")
 
+    cached = _user_cache.get(user_id)
+    if cached is not None:
+        return dict(cached)
+
     conn = get_connection()
     try:
         cur = conn.cursor()
@@ -234,13 +286,15 @@ def get_current_user(
         if not user:
             raise HTTPException(401, "Usuario no válido")
 
-        return {
+        user_dict = {
             "id": user[0],
             "email": user[1],
             "username": user[2],
             "rol": user[3],
             "id_operario": user[4]
         }
+        _user_cache.set(user_id, user_dict)
+        return dict(user_dict)
 
     finally:
         cur.close()
@@ -256,6 +310,24 @@ def me(user=Depends(get_current_user)):
     return user
 
 
+# ================================
+# STREAM TOKEN
+# ================================
+
+@router.post("/stream-token")
+def stream_token(user=Depends(get_current_user)):
+    """
+    Token de vida corta para abrir un EventSource (p.ej.
+    /dashboard/camaras/stream?token=...). Solo sirve para conectar: el
+    stream ya abierto no caduca con él.
+    """
+    token = create_access_token(
+        {"user_id": user["id"], "scope": "stream"},
+        expires_delta=timedelta(seconds=AUTH_STREAM_TOKEN_TTL)
+    )
+    return {"token": token, "expires_in": AUTH_STREAM_TOKEN_TTL}
+
+
 # ================================
 # UPDATE PASSWORD
 # ================================
@@ -293,6 +365,7 @@ def update_password(
         )
 
         conn.commit()
+        invalidate_user(user["id"])
 
         return {"message": "Contraseña actualizada correctamente"}
 
@@ -321,6 +394,7 @@ def update_profile(
         )
 
         conn.commit()
+        invalidate_user(user["id"])
 
         return {"message": "Perfil actualizado correctamente"}
 
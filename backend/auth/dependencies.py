@@ -7,9 +7,13 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
         payload = decode_token(token)
-        return payload
     except:
         raise HTTPException(401, "Token inválido")
+    # Los tokens con scope (p.ej. los de /auth/stream-token) solo valen
+    # para su endpoint, no como token de sesión
+    if payload.get("scope"):
+        raise HTTPException(401, "Token inválido")
+    return payload
 
 def require_admin(user = Depends(get_current_user)):
     if user["rol"] != "admin":
@@ -1,22 +1,54 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from pydantic import BaseModel
 import psycopg2
 from psycopg2 import IntegrityError
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
 from datetime import date, datetime, timedelta
+from contextlib import asynccontextmanager
 
 from backend.auth.auth import get_current_user, router as auth_router
-from backend.database import get_connection  # Importamos la función de conexión a la BD
+from backend.database import get_connection, pool, pool_stats  # Importamos la función de conexión a la BD
+from backend.sensor_buffer import sensor_buffer
+from backend.sensor_mantenimiento import mantenimiento_sensores
+from backend.camaras_live import camaras_publisher
+from backend.Incidencias.outbox import envio_incidencias
 from backend.auth.auth import require_admin
+from backend.paginacion import paginar, cabeceras_paginacion, CABECERAS_PAGINACION
 
 from backend.trazabilidad_backend import router as traz_router
+from backend.genealogia import router as genealogia_router
 from backend.Incidencias.incidencias import router as incidencias_router
 from backend.limpieza.limpieza import router as limpieza_router
 from backend.dashboard import router as dashboard_router
 from backend.appcc import router as appcc_router
+from backend.appcc_jobs import router as appcc_jobs_router
+from backend.appcc_rango import router as appcc_rango_router
+from backend import appcc_jobs
+from backend.exportar import router as exportar_router
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Calentamos el pool al arrancar; si la BD no responde el backend arranca
+    # igual y las conexiones se abrirán bajo demanda.
+    try:
+        pool.open()
+    except Exception as e:
+        logger.warning(f"No se pudo precalentar el pool de BD: {e}")
+    sensor_buffer.start()
+    mantenimiento_sensores.start()
+    await camaras_publisher.start()
+    envio_incidencias.start()
+    yield
+    appcc_jobs.cerrar()
+    envio_incidencias.stop()
+    await camaras_publisher.stop()
+    mantenimiento_sensores.stop()
+    sensor_buffer.stop()
+    pool.close()
 
-app = FastAPI(title="INSECT SOFTWARE")
+
+app = FastAPI(title="INSECT SOFTWARE", lifespan=lifespan)
 
 
 app.add_middleware(
@@ -31,16 +63,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Permitir GET, POST, PUT, DELETE, OPTIONS
     allow_headers=["*"],
+    expose_headers=CABECERAS_PAGINACION,  # cursor de paginación de los listados
 )
 
 
 app.include_router(auth_router)
 app.include_router(traz_router, prefix="/trazabilidad")
+app.include_router(genealogia_router)
 app.include_router(incidencias_router)
 
 app.include_router(limpieza_router)
 app.include_router(dashboard_router)
 app.include_router(appcc_router)
+app.include_router(appcc_jobs_router)
+app.include_router(appcc_rango_router)
+app.include_router(exportar_router)
 
 
 
@@ -90,6 +127,18 @@ async def log_requests(request: Request, call_next):
     return response
 
 
+@app.get("/health/db")
+def health_db():
+    """Métricas del pool de conexiones (en uso, ociosas, tiempos de espera)."""
+    return pool_stats()
+
+
+@app.get("/health/sensores")
+def health_sensores():
+    """Estado del buffer de escritura de lecturas de sensores."""
+    return sensor_buffer.stats()
+
+
 
 
 # ================================
@@ -106,14 +155,15 @@ class ClienteOut(ClienteIn):
     id_cliente: int
 
 @app.get("/cliente")
-def get_clientes():
+def get_clientes(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM Cliente")
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    try:
+        data, siguiente, total = paginar(cur, "Cliente", "id_cliente", request.query_params, limit, after, count)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     return data
 
 @app.put("/cliente/{id_cliente}")
@@ -188,14 +238,15 @@ class PedidoOut(PedidoIn):
     id_pedido: int
 
 @app.get("/pedido")
-def get_pedidos():
+def get_pedidos(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM Pedido")
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    try:
+        data, siguiente, total = paginar(cur, "Pedido", "id_pedido", request.query_params, limit, after, count)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     return data
 
 
@@ -267,22 +318,18 @@ class TareaEdit(BaseModel):
 
 
 @app.get("/tarea")
-def get_tareas(user = Depends(get_current_user)):
+def get_tareas(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False, user = Depends(get_current_user)):
     conn = get_connection()
     cur = conn.cursor()
-    
-    if user["rol"] == "user":
-        cur.execute("""
-            SELECT * FROM Tarea
-            WHERE id_operario = %s
-        """, [user["id_operario"]])
-    else:
-        cur.execute("SELECT * FROM Tarea")
 
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    # Los usuarios normales solo ven sus tareas
+    fijos = {"id_operario": user["id_operario"]} if user["rol"] == "user" else None
+    try:
+        data, siguiente, total = paginar(cur, "Tarea", "id_tarea", request.query_params, limit, after, count, fijos)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     return data
 
 
@@ -439,12 +486,15 @@ class EventoOut(EventoIn):
     id_evento: int
 
 @app.get("/evento")
-def get_eventos():
+def get_eventos(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM Evento")
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
+    try:
+        data, siguiente, total = paginar(cur, "Evento", "id_evento", request.query_params, limit, after, count)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     # Normalize date/datetime fields to ISO strings to avoid client-side parsing issues
     for item in data:
         for k, v in list(item.items()):
@@ -455,8 +505,6 @@ def get_eventos():
             except Exception:
                 # leave as-is on error
                 pass
-    cur.close()
-    conn.close()
     return data
 
 @app.post("/evento")
@@ -517,14 +565,15 @@ class ProveedorOut(ProveedorIn):
     id_proveedor: int
 
 @app.get("/proveedor")
-def get_proveedores():
+def get_proveedores(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM Proveedor")
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    try:
+        data, siguiente, total = paginar(cur, "Proveedor", "id_proveedor", request.query_params, limit, after, count)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     return data
 
 @app.post("/proveedor")
@@ -671,14 +720,15 @@ class CamaraOut(CamaraIn):
     id_camara: int
 
 @app.get("/camara")
-def get_camaras():
+def get_camaras(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM Camara")
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    try:
+        data, siguiente, total = paginar(cur, "Camara", "id_camara", request.query_params, limit, after, count)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     return data
 
 @app.post("/camara")
@@ -728,14 +778,15 @@ class LoteAlimentoOut(LoteAlimentoIn):
     id_lote_alimento: int
 
 @app.get("/lote_alimento")
-def get_lotes_alimento():
+def get_lotes_alimento(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM Lote_Alimento ORDER BY id_lote_alimento")
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    try:
+        data, siguiente, total = paginar(cur, "Lote_Alimento", "id_lote_alimento", request.query_params, limit, after, count)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     return data
 
 @app.post("/lote_alimento")
@@ -790,14 +841,15 @@ class RegistroOut(RegistroIn):
     id_registro: int
 
 @app.get("/registro")
-def get_registros():
+def get_registros(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM Registro ORDER BY id_registro")
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    try:
+        data, siguiente, total = paginar(cur, "Registro", "id_registro", request.query_params, limit, after, count)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     return data
 
 @app.post("/registro")
@@ -848,14 +900,15 @@ class SensorOut(SensorIn):
     id_sensor: int
 
 @app.get("/sensores")
-def get_sensores():
+def get_sensores(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM Sensores ORDER BY id_sensor")
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    try:
+        data, siguiente, total = paginar(cur, "Sensores", "id_sensor", request.query_params, limit, after, count)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     return data
 
 @app.post("/sensores")
@@ -964,14 +1017,17 @@ class EngordeOut(EngordeIn):
 
 
 @app.get("/engorde")
-def get_engorde():
+def get_engorde(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM Engorde ORDER BY id_pallet")
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    try:
+        # Log de eventos: id_pallet se repite, se pagina por id_evento
+        # (PostgreSQL_archivos/engorde_id_evento_migration.sql)
+        data, siguiente, total = paginar(cur, "Engorde", "id_evento", request.query_params, limit, after, count)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     return data
 
 @app.post("/engorde")
@@ -1025,14 +1081,15 @@ class VoladeroOut(VoladeroIn):
     id_voladero: int
 
 @app.get("/voladero")
-def get_voladero():
+def get_voladero(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM Voladero ORDER BY id_voladero")
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    try:
+        data, siguiente, total = paginar(cur, "Voladero", "id_voladero", request.query_params, limit, after, count)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     return data
 
 @app.post("/voladero")
@@ -1087,14 +1144,15 @@ class IncubaciónOut(IncubacionIn):
     id_lote_madre: int
 
 @app.get("/incubacion")
-def get_incubacion():
+def get_incubacion(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM Incubacion ORDER BY id_lote_madre")
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    try:
+        data, siguiente, total = paginar(cur, "Incubacion", "id_lote_madre", request.query_params, limit, after, count)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     return data
 
 @app.post("/incubacion")
@@ -1152,14 +1210,15 @@ class ProductoOut(ProductoIn):
     id_bigbag: int
 
 @app.get("/productos")
-def get_productos():
+def get_productos(request: Request, response: Response, limit: Optional[int] = None, after: Optional[int] = None, count: bool = False):
     conn = get_connection()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM Productos ORDER BY id_bigbag")
-    cols = [d[0].lower() for d in cur.description]
-    data = [dict(zip(cols, row)) for row in cur.fetchall()]
-    cur.close()
-    conn.close()
+    try:
+        data, siguiente, total = paginar(cur, "Productos", "id_bigbag", request.query_params, limit, after, count)
+    finally:
+        cur.close()
+        conn.close()
+    cabeceras_paginacion(response, siguiente, total)
     return data
 
 @app.post("/productos")
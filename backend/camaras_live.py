@@ -0,0 +1,273 @@
+# backend/camaras_live.py
+#
+# Estado en vivo de las cámaras para el dashboard (Server-Sent Events).
+# Un único publicador recalcula el resumen de cámaras cuando llega una
+# lectura de sensor o un pallet entra/sale de una cámara, y reparte solo
+# las cámaras que han cambiado a todos los clientes conectados: N tablets
+# mirando el dashboard cuestan una consulta, no N.
+# Los cambios hechos en otros workers llegan por LISTEN camaras_live (ver
+# PostgreSQL_archivos/camaras_live_notify_migration.sql).
+
+import asyncio
+import logging
+import select
+import threading
+
+from fastapi.concurrency import run_in_threadpool
+
+from backend.database import get_connection, get_dedicated_connection
+from backend.sensor_buffer import sensor_buffer
+
+logger = logging.getLogger(__name__)
+
+CAMARAS_LIVE_DEBOUNCE = 1.0     # segundos agrupando avisos antes de recalcular
+CAMARAS_LIVE_QUEUE_SIZE = 100   # eventos pendientes por cliente antes de reenviar snapshot
+CAMARAS_LIVE_CANAL = "camaras_live"
+CAMARAS_LIVE_REINTENTO = 5.0    # segundos antes de reabrir el LISTEN si se cae la conexión
+
+
+# Temperatura, humedad y fecha de la última lectura por cámara, a partir de
+# sensor_ultima_lectura (una fila por sensor) en lugar del histórico completo.
+SQL_CLIMA_ACTUAL = """
+    SELECT
+        s.id_camara,
+        (ARRAY_AGG(u.valor ORDER BY u.fecha_lectura DESC)
+            FILTER (WHERE s.tipo = 'temperatura'))[1] AS temperatura,
+        (ARRAY_AGG(u.valor ORDER BY u.fecha_lectura DESC)
+            FILTER (WHERE s.tipo = 'humedad'))[1] AS humedad,
+        MAX(u.fecha_lectura) AS ultima_lectura
+    FROM sensor s
+    JOIN sensor_ultima_lectura u ON u.id_sensor = s.id_sensor
+    WHERE s.activo = true
+    GROUP BY s.id_camara
+"""
+
+
+def consultar_camaras(cur, admin: bool):
+    """
+    Resumen por cámara (pallets dentro/vencidos + clima actual). Incluye
+    es_franquiciado para separar propias y de franquiciados; los usuarios
+    no admin solo reciben las propias.
+    """
+    cur.execute(f"""
+        WITH clima AS ({SQL_CLIMA_ACTUAL})
+        SELECT
+            c.id_camara,
+            c.nombre,
+            c.capacidad_max,
+            COUNT(p.id_pallet) FILTER (WHERE p.estado = 'en_camara') AS pallets_dentro,
+            COUNT(p.id_pallet) FILTER (
+                WHERE p.estado = 'en_camara'
+                AND p.fecha_salida_prevista < CURRENT_DATE
+            ) AS pallets_vencidos,
+            cl.temperatura,
+            cl.humedad,
+            cl.ultima_lectura,
+            (c.id_franquiciado IS NOT NULL) AS es_franquiciado
+        FROM camara c
+        LEFT JOIN pallet p ON p.id_camara = c.id_camara
+        LEFT JOIN clima cl ON cl.id_camara = c.id_camara
+        WHERE c.id_franquiciado IS NULL OR %(admin)s
+        GROUP BY c.id_camara, c.nombre, c.capacidad_max,
+                 cl.temperatura, cl.humedad, cl.ultima_lectura
+        ORDER BY c.nombre
+    """, {"admin": admin})
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+
+def agrupar_camaras(camaras, admin: bool):
+    """Da la forma de GET /dashboard/camaras: {"propias": [...], "franquiciados": [...]}."""
+    propias = []
+    franquiciados = []
+    for camara in camaras:
+        camara = dict(camara)
+        if camara.pop("es_franquiciado"):
+            franquiciados.append(camara)
+        else:
+            propias.append(camara)
+
+    resultado = {"propias": propias}
+    if admin:
+        resultado["franquiciados"] = franquiciados
+    return resultado
+
+
+def _cargar_camaras():
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        return consultar_camaras(cur, admin=True)
+    finally:
+        cur.close()
+        conn.close()
+
+
+class _Suscriptor:
+    __slots__ = ("cola", "admin")
+
+    def __init__(self, admin):
+        self.cola = asyncio.Queue(maxsize=CAMARAS_LIVE_QUEUE_SIZE)
+        self.admin = admin
+
+
+class CamarasPublisher:
+
+    def __init__(self, debounce):
+        self.debounce = debounce
+        self._suscriptores = set()
+        self._snapshot = None        # id_camara -> fila; None = desactualizado
+        self._loop = None
+        self._aviso = None
+        self._carga_lock = None
+        self._task = None
+        self._parar = threading.Event()
+        self._escucha = None
+
+    # ---------- ciclo de vida (desde el lifespan de la app) ----------
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._aviso = asyncio.Event()
+        self._carga_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        self._parar.clear()
+        self._escucha = threading.Thread(target=self._escuchar, daemon=True,
+                                         name="camaras-live-listen")
+        self._escucha.start()
+
+    async def stop(self):
+        self._parar.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._loop = None
+
+    # ---------- avisos ----------
+
+    def notificar(self):
+        """
+        Algo ha cambiado en alguna cámara (lectura nueva, pallet que entra o
+        sale). Se puede llamar desde cualquier hilo.
+        """
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._aviso.set)
+        except RuntimeError:
+            # El loop ya se ha cerrado (apagado del servidor)
+            pass
+
+    def _escuchar(self):
+        """
+        Hilo con una conexión propia haciendo LISTEN: cada NOTIFY de
+        cualquier worker (sensores, entradas/salidas de cámara) es un aviso.
+        """
+        while not self._parar.is_set():
+            conn = None
+            try:
+                conn = get_dedicated_connection()
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {CAMARAS_LIVE_CANAL}")
+                cur.close()
+                # Lo que haya cambiado mientras no escuchábamos
+                self.notificar()
+                while not self._parar.is_set():
+                    # Con timeout para ver _parar de vez en cuando
+                    if select.select([conn], [], [], CAMARAS_LIVE_REINTENTO)[0]:
+                        conn.poll()
+                        if conn.notifies:
+                            conn.notifies.clear()
+                            self.notificar()
+            except Exception as e:
+                logger.warning(f"LISTEN {CAMARAS_LIVE_CANAL} caído, se reintenta: {repr(e)}")
+                self._parar.wait(CAMARAS_LIVE_REINTENTO)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    async def _run(self):
+        while True:
+            await self._aviso.wait()
+            await asyncio.sleep(self.debounce)
+            self._aviso.clear()
+
+            if not self._suscriptores:
+                # Nadie mirando: no consultamos, el próximo cliente recargará
+                self._snapshot = None
+                continue
+            try:
+                await self._refrescar()
+            except Exception as e:
+                logger.error(f"Error recalculando cámaras en vivo: {repr(e)}")
+
+    async def _refrescar(self):
+        async with self._carga_lock:
+            filas = await run_in_threadpool(_cargar_camaras)
+            nuevas = {f["id_camara"]: f for f in filas}
+            anteriores = self._snapshot or {}
+            self._snapshot = nuevas
+
+        cambiadas = [f for id_c, f in nuevas.items() if anteriores.get(id_c) != f]
+        eliminadas = [id_c for id_c in anteriores if id_c not in nuevas]
+
+        for sub in list(self._suscriptores):
+            eventos = [
+                ("camara", self._delta(f))
+                for f in cambiadas if sub.admin or not f["es_franquiciado"]
+            ]
+            eventos += [("camara_eliminada", {"id_camara": id_c}) for id_c in eliminadas]
+            self._enviar(sub, eventos)
+
+    @staticmethod
+    def _delta(fila):
+        fila = dict(fila)
+        fila["grupo"] = "franquiciados" if fila.pop("es_franquiciado") else "propias"
+        return fila
+
+    def _enviar(self, sub, eventos):
+        try:
+            for evento in eventos:
+                sub.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente lento: vaciamos su cola y le mandamos el estado completo
+            while not sub.cola.empty():
+                sub.cola.get_nowait()
+            sub.cola.put_nowait(("snapshot", self.snapshot(sub.admin)))
+
+    # ---------- suscripción ----------
+
+    def snapshot(self, admin: bool):
+        return agrupar_camaras((self._snapshot or {}).values(), admin)
+
+    async def suscribir(self, admin: bool):
+        """Registra un cliente. Devuelve (suscriptor, estado_inicial)."""
+        if self._snapshot is None:
+            async with self._carga_lock:
+                if self._snapshot is None:
+                    filas = await run_in_threadpool(_cargar_camaras)
+                    self._snapshot = {f["id_camara"]: f for f in filas}
+        sub = _Suscriptor(admin)
+        self._suscriptores.add(sub)
+        return sub, self.snapshot(admin)
+
+    def desuscribir(self, sub):
+        self._suscriptores.discard(sub)
+
+    def num_suscriptores(self):
+        return len(self._suscriptores)
+
+
+camaras_publisher = CamarasPublisher(CAMARAS_LIVE_DEBOUNCE)
+
+# Cada volcado de lecturas de sensores puede cambiar temperatura/humedad.
+# El NOTIFY también llega a este worker; el aviso directo no espera al LISTEN.
+sensor_buffer.add_listener(lambda filas: camaras_publisher.notificar())
@@ -1,92 +1,88 @@
-from fastapi import APIRouter, Depends
-from backend.auth.auth import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Optional, List
+from backend.auth.auth import get_current_user, get_current_user_stream
 from backend.database import get_connection
-from datetime import date
+from backend.sensor_buffer import sensor_map, sensor_buffer, valor_valido, fecha_valida, fecha_local, VALOR_MAX
+from backend.camaras_live import camaras_publisher, consultar_camaras, agrupar_camaras
+from datetime import date, datetime
+import asyncio
+import json
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
+SSE_KEEPALIVE = 15  # segundos sin eventos antes de mandar un keepalive
+
+
+class LecturaSensorIn(BaseModel):
+    codigo_dispositivo: str
+    valor: float
+    timestamp: Optional[datetime] = None
+
+
+class LecturasSensorBatchIn(BaseModel):
+    lecturas: List[LecturaSensorIn]
+
 
 @router.get("/camaras")
 def get_camaras(user=Depends(get_current_user)):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        # Cámaras propias (sin franquiciado)
-        cur.execute("""
-            SELECT 
-                c.id_camara,
-                c.nombre,
-                c.capacidad_max,
-                COUNT(p.id_pallet) FILTER (WHERE p.estado = 'en_camara') AS pallets_dentro,
-                COUNT(p.id_pallet) FILTER (
-                    WHERE p.estado = 'en_camara' 
-                    AND p.fecha_salida_prevista < CURRENT_DATE
-                ) AS pallets_vencidos,
-                (SELECT sl.valor FROM sensor s
-                 JOIN sensor_lectura sl ON sl.id_sensor = s.id_sensor
-                 WHERE s.id_camara = c.id_camara AND s.tipo = 'temperatura' AND s.activo = true
-                 ORDER BY sl.fecha_lectura DESC LIMIT 1) AS temperatura,
-                (SELECT sl.valor FROM sensor s
-                 JOIN sensor_lectura sl ON sl.id_sensor = s.id_sensor
-                 WHERE s.id_camara = c.id_camara AND s.tipo = 'humedad' AND s.activo = true
-                 ORDER BY sl.fecha_lectura DESC LIMIT 1) AS humedad,
-                (SELECT sl.fecha_lectura FROM sensor s
-                 JOIN sensor_lectura sl ON sl.id_sensor = s.id_sensor
-                 WHERE s.id_camara = c.id_camara AND s.activo = true
-                 ORDER BY sl.fecha_lectura DESC LIMIT 1) AS ultima_lectura
-            FROM camara c
-            LEFT JOIN pallet p ON p.id_camara = c.id_camara
-            WHERE c.id_franquiciado IS NULL
-            GROUP BY c.id_camara, c.nombre, c.capacidad_max
-            ORDER BY c.nombre
-        """)
-        cols = [d[0] for d in cur.description]
-        camaras_propias = [dict(zip(cols, row)) for row in cur.fetchall()]
-
-        resultado = {"propias": camaras_propias}
-
+        # Una sola pasada para cámaras propias y de franquiciados; los
+        # usuarios no admin solo ven las propias (sin franquiciado).
         # Si es admin, devolvemos también las cámaras de franquiciados, con la
         # misma forma que las propias (una fila por cámara) para que el
         # frontend pueda pintarlas igual, solo que son cámaras con
         # id_franquiciado asignado (p.ej. "Motilla 1", "Villaconejos 1"...).
-        if user["rol"] == "admin":
-            cur.execute("""
-                SELECT
-                    c.id_camara,
-                    c.nombre,
-                    c.capacidad_max,
-                    COUNT(p.id_pallet) FILTER (WHERE p.estado = 'en_camara') AS pallets_dentro,
-                    COUNT(p.id_pallet) FILTER (
-                        WHERE p.estado = 'en_camara'
-                        AND p.fecha_salida_prevista < CURRENT_DATE
-                    ) AS pallets_vencidos,
-                    (SELECT sl.valor FROM sensor s
-                     JOIN sensor_lectura sl ON sl.id_sensor = s.id_sensor
-                     WHERE s.id_camara = c.id_camara AND s.tipo = 'temperatura' AND s.activo = true
-                     ORDER BY sl.fecha_lectura DESC LIMIT 1) AS temperatura,
-                    (SELECT sl.valor FROM sensor s
-                     JOIN sensor_lectura sl ON sl.id_sensor = s.id_sensor
-                     WHERE s.id_camara = c.id_camara AND s.tipo = 'humedad' AND s.activo = true
-                     ORDER BY sl.fecha_lectura DESC LIMIT 1) AS humedad,
-                    (SELECT sl.fecha_lectura FROM sensor s
-                     JOIN sensor_lectura sl ON sl.id_sensor = s.id_sensor
-                     WHERE s.id_camara = c.id_camara AND s.activo = true
-                     ORDER BY sl.fecha_lectura DESC LIMIT 1) AS ultima_lectura
-                FROM camara c
-                LEFT JOIN pallet p ON p.id_camara = c.id_camara
-                WHERE c.id_franquiciado IS NOT NULL
-                GROUP BY c.id_camara, c.nombre, c.capacidad_max
-                ORDER BY c.nombre
-            """)
-            cols = [d[0] for d in cur.description]
-            resultado["franquiciados"] = [dict(zip(cols, row)) for row in cur.fetchall()]
-
-        return resultado
+        admin = user["rol"] == "admin"
+        return agrupar_camaras(consultar_camaras(cur, admin), admin)
     finally:
         cur.close()
         conn.close()
 
 
+def _evento_sse(evento, datos):
+    return f"event: {evento}\ndata: {json.dumps(jsonable_encoder(datos))}\n\n"
+
+
+@router.get("/camaras/stream")
+async def stream_camaras(request: Request, user=Depends(get_current_user_stream)):
+    """
+    Versión en vivo de /camaras (Server-Sent Events). Como EventSource no
+    manda cabeceras, se autentica con ?token= de POST /auth/stream-token
+    (válido unos segundos, solo para conectar). Al conectar se envía un
+    evento 'snapshot' con la misma forma que /camaras; después, un evento
+    'camara' con la fila completa de cada cámara que cambie (lectura de
+    sensor nueva, pallet que entra o sale), con "grupo": "propias" o
+    "franquiciados", y 'camara_eliminada' si desaparece alguna.
+    """
+    admin = user["rol"] == "admin"
+    sub, inicial = await camaras_publisher.suscribir(admin)
+
+    async def eventos():
+        try:
+            yield _evento_sse("snapshot", inicial)
+            while not await request.is_disconnected():
+                try:
+                    evento, datos = await asyncio.wait_for(sub.cola.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Comentario SSE para que proxies y navegador no corten la conexión
+                    yield ": keepalive\n\n"
+                    continue
+                yield _evento_sse(evento, datos)
+        finally:
+            camaras_publisher.desuscribir(sub)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/camara/{id_camara}/pallets")
 def get_pallets_camara(id_camara: int, user=Depends(get_current_user)):
     conn = get_connection()
@@ -113,20 +109,17 @@ def get_pallets_camara(id_camara: int, user=Depends(get_current_user)):
 
         # Info de la cámara + capacidad
         cur.execute("""
-            SELECT id_camara, nombre, capacidad_max,
-                (SELECT sl.valor FROM sensor s
-                 JOIN sensor_lectura sl ON sl.id_sensor = s.id_sensor
-                 WHERE s.id_camara = c.id_camara AND s.tipo = 'temperatura' AND s.activo = true
-                 ORDER BY sl.fecha_lectura DESC LIMIT 1) AS temperatura,
-                (SELECT sl.valor FROM sensor s
-                 JOIN sensor_lectura sl ON sl.id_sensor = s.id_sensor
-                 WHERE s.id_camara = c.id_camara AND s.tipo = 'humedad' AND s.activo = true
-                 ORDER BY sl.fecha_lectura DESC LIMIT 1) AS humedad,
-                (SELECT sl.fecha_lectura FROM sensor s
-                 JOIN sensor_lectura sl ON sl.id_sensor = s.id_sensor
-                 WHERE s.id_camara = c.id_camara AND s.activo = true
-                 ORDER BY sl.fecha_lectura DESC LIMIT 1) AS ultima_lectura
-            FROM camara c WHERE id_camara = %(id)s
+            SELECT c.id_camara, c.nombre, c.capacidad_max,
+                   (ARRAY_AGG(u.valor ORDER BY u.fecha_lectura DESC)
+                       FILTER (WHERE s.tipo = 'temperatura'))[1] AS temperatura,
+                   (ARRAY_AGG(u.valor ORDER BY u.fecha_lectura DESC)
+                       FILTER (WHERE s.tipo = 'humedad'))[1] AS humedad,
+                   MAX(u.fecha_lectura) AS ultima_lectura
+            FROM camara c
+            LEFT JOIN sensor s ON s.id_camara = c.id_camara AND s.activo = true
+            LEFT JOIN sensor_ultima_lectura u ON u.id_sensor = s.id_sensor
+            WHERE c.id_camara = %(id)s
+            GROUP BY c.id_camara, c.nombre, c.capacidad_max
         """, {"id": id_camara})
         cols = [d[0] for d in cur.description]
         camara = dict(zip(cols, cur.fetchone()))
@@ -137,28 +130,124 @@ def get_pallets_camara(id_camara: int, user=Depends(get_current_user)):
         conn.close()
 
 
+# Resoluciones con nombre para /camara/{id}/lecturas (segundos por cubo)
+RESOLUCIONES = {
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+LECTURAS_DIAS = 90
+
+
 @router.get("/camara/{id_camara}/lecturas")
-def get_lecturas_camara(id_camara: int, tipo: str, user=Depends(get_current_user)):
+def get_lecturas_camara(
+    id_camara: int,
+    tipo: str,
+    resolution: Optional[str] = None,
+    max_points: Optional[int] = None,
+    user=Depends(get_current_user)
+):
     """
     Histórico de lecturas de un sensor de la cámara (tipo: 'temperatura' o 'humedad'),
     limitado a los últimos 90 días para no devolver un histórico sin límite.
+
+    Sin parámetros devuelve las lecturas en bruto. Con resolution
+    ('minute' | 'hour' | 'day') o max_points las agrupa en la BD por cubos de
+    tiempo y devuelve por cubo valor (media), min, max y n; así el tamaño de
+    la respuesta no depende de cuántas lecturas haya. Los cubos de horas o
+    días enteros salen de los rollups (pueden ir unos minutos por detrás).
     """
+    if resolution not in (None, "raw") and resolution not in RESOLUCIONES:
+        raise HTTPException(400, f"resolution debe ser una de: raw, {', '.join(RESOLUCIONES)}")
+    if max_points is not None and not 2 <= max_points <= 10000:
+        raise HTTPException(400, "max_points debe estar entre 2 y 10000")
+
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("""
-            SELECT sl.valor, sl.fecha_lectura
-            FROM sensor s
-            JOIN sensor_lectura sl ON sl.id_sensor = s.id_sensor
-            WHERE s.id_camara = %(id)s
-              AND s.tipo = %(tipo)s
-              AND s.activo = true
-              AND sl.fecha_lectura >= CURRENT_DATE - INTERVAL '90 days'
-            ORDER BY sl.fecha_lectura ASC
-        """, {"id": id_camara, "tipo": tipo})
+        params = {"id": id_camara, "tipo": tipo, "dias": LECTURAS_DIAS}
+
+        if resolution in (None, "raw") and max_points is None:
+            cur.execute("""
+                SELECT sl.valor, sl.fecha_lectura
+                FROM sensor s
+                JOIN sensor_lectura sl ON sl.id_sensor = s.id_sensor
+                WHERE s.id_camara = %(id)s
+                  AND s.tipo = %(tipo)s
+                  AND s.activo = true
+                  AND sl.fecha_lectura >= CURRENT_DATE - make_interval(days => %(dias)s)
+                ORDER BY sl.fecha_lectura ASC
+            """, params)
+            cols = [d[0] for d in cur.description]
+            lecturas = [dict(zip(cols, row)) for row in cur.fetchall()]
+            return {"lecturas": lecturas}
+
+        # Ancho del cubo: el de la resolución pedida, ampliado si con él se
+        # superaría max_points en la ventana (desde CURRENT_DATE - 90 días
+        # hasta ahora, que puede ser casi un día más). Los cubos van alineados
+        # a la época, no al inicio de la ventana, así que pueden quedar
+        # cortados los dos extremos: se reserva un cubo para eso. Por encima
+        # de una hora se redondea (hacia arriba) a horas enteras para poder
+        # leer de los rollups.
+        ancho = RESOLUCIONES.get(resolution, 1)
+        if max_points is not None:
+            ventana = (LECTURAS_DIAS + 1) * 86400
+            ancho = max(ancho, -(-ventana // (max_points - 1)))
+        if ancho > 3600:
+            ancho = -(-ancho // 3600) * 3600
+        params["ancho"] = ancho
+
+        if ancho % 3600 == 0:
+            # Cubos de horas/días: se agregan desde sensor_lectura_dia o
+            # sensor_lectura_hora (mantenidos por sensor_mantenimiento)
+            if ancho % 86400 == 0:
+                tabla, columna = "sensor_lectura_dia", "r.dia::timestamp"
+            else:
+                tabla, columna = "sensor_lectura_hora", "r.hora"
+            cur.execute(f"""
+                SELECT
+                    to_timestamp(
+                        floor(extract(epoch FROM {columna}) / %(ancho)s) * %(ancho)s
+                    ) AT TIME ZONE 'UTC' AS fecha_lectura,
+                    ROUND(SUM(r.suma) / SUM(r.n), 2) AS valor,
+                    MIN(r.minimo) AS min,
+                    MAX(r.maximo) AS max,
+                    SUM(r.n) AS n
+                FROM sensor s
+                JOIN {tabla} r ON r.id_sensor = s.id_sensor
+                WHERE s.id_camara = %(id)s
+                  AND s.tipo = %(tipo)s
+                  AND s.activo = true
+                  AND {columna} >= CURRENT_DATE - make_interval(days => %(dias)s)
+                GROUP BY 1
+                ORDER BY 1 ASC
+            """, params)
+        else:
+            cur.execute("""
+                SELECT
+                    to_timestamp(
+                        floor(extract(epoch FROM sl.fecha_lectura) / %(ancho)s) * %(ancho)s
+                    ) AT TIME ZONE 'UTC' AS fecha_lectura,
+                    ROUND(AVG(sl.valor), 2) AS valor,
+                    MIN(sl.valor) AS min,
+                    MAX(sl.valor) AS max,
+                    COUNT(*) AS n
+                FROM sensor s
+                JOIN sensor_lectura sl ON sl.id_sensor = s.id_sensor
+                WHERE s.id_camara = %(id)s
+                  AND s.tipo = %(tipo)s
+                  AND s.activo = true
+                  AND sl.fecha_lectura >= CURRENT_DATE - make_interval(days => %(dias)s)
+                GROUP BY 1
+                ORDER BY 1 ASC
+            """, params)
         cols = [d[0] for d in cur.description]
         lecturas = [dict(zip(cols, row)) for row in cur.fetchall()]
-        return {"lecturas": lecturas}
+        if max_points is not None and len(lecturas) > max_points:
+            # Solo con lecturas fechadas en el futuro (reloj del sensor mal):
+            # se conservan las más recientes
+            lecturas = lecturas[-max_points:]
+        return {"lecturas": lecturas, "resolucion_segundos": ancho}
     finally:
         cur.close()
         conn.close()
@@ -169,26 +258,48 @@ def registrar_lectura(payload: dict):
     """
     Endpoint para que los sensores físicos manden sus lecturas.
     Payload: { "codigo_dispositivo": "ESP32-C01-TEMP", "valor": 23.5 }
+    La lectura se encola y se escribe en el siguiente volcado del buffer.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            SELECT id_sensor FROM sensor 
-            WHERE codigo_dispositivo = %s AND activo = true
-        """, (payload["codigo_dispositivo"],))
-        row = cur.fetchone()
-        if not row:
-            from fastapi import HTTPException
-            raise HTTPException(404, "Sensor no encontrado o inactivo")
-
-        id_sensor = row[0]
-        cur.execute("""
-            INSERT INTO sensor_lectura (id_sensor, valor)
-            VALUES (%s, %s)
-        """, (id_sensor, payload["valor"]))
-        conn.commit()
-        return {"ok": True}
-    finally:
-        cur.close()
-        conn.close()
\ No newline at end of file
+    if not valor_valido(payload.get("valor")):
+        raise HTTPException(422, f"valor debe ser un número finito entre -{VALOR_MAX} y {VALOR_MAX}")
+
+    id_sensor = sensor_map.get(payload["codigo_dispositivo"])
+    if id_sensor is None:
+        raise HTTPException(404, "Sensor no encontrado o inactivo")
+
+    sensor_buffer.add(id_sensor, payload["valor"])
+    return {"ok": True}
+
+
+@router.post("/sensores/lecturas")
+def registrar_lecturas_batch(payload: LecturasSensorBatchIn):
+    """
+    Varias lecturas en una sola petición (p.ej. un ESP32 que acumula y envía
+    cada minuto). Las lecturas de dispositivos desconocidos se ignoran y se
+    devuelven en 'desconocidos'; las de valor no válido (NaN, infinito o
+    fuera del rango de la columna) o con timestamp fuera de rango (en el
+    futuro o más antiguo que la retención) se cuentan en 'rechazadas'.
+    Payload: { "lecturas": [{ "codigo_dispositivo": "...", "valor": 23.5,
+                              "timestamp": "2026-05-01T10:00:00" }, ...] }
+    """
+    filas = []
+    desconocidos = set()
+    rechazadas = 0
+    for lectura in payload.lecturas:
+        if not valor_valido(lectura.valor) or not fecha_valida(lectura.timestamp):
+            rechazadas += 1
+            continue
+        id_sensor = sensor_map.get(lectura.codigo_dispositivo)
+        if id_sensor is None:
+            desconocidos.add(lectura.codigo_dispositivo)
+            continue
+        # Con zona horaria -> hora local naive, como se guarda en sensor_lectura
+        filas.append((id_sensor, lectura.valor, fecha_local(lectura.timestamp)))
+
+    sensor_buffer.add_many(filas)
+    return {
+        "ok": True,
+        "aceptadas": len(filas),
+        "rechazadas": rechazadas,
+        "desconocidos": sorted(desconocidos),
+    }
@@ -1,12 +1,30 @@
 import psycopg2
+import psycopg2.extensions
 import os
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent
 load_dotenv(BASE_DIR.parent / ".env")
 
-def get_connection():
+logger = logging.getLogger(__name__)
+
+# ================================
+# CONFIGURACIÓN DEL POOL
+# ================================
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))           # segundos esperando conexión libre
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))  # segundos de vida de una conexión
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "5"))      # ping si lleva más de N s ociosa
+
+
+def _connect():
     return psycopg2.connect(
         dbname=os.getenv("DB_NAME"),
         user=os.getenv("DB_USER"),
@@ -14,4 +32,323 @@ def get_connection():
         host=os.getenv("DB_HOST"),
         port=os.getenv("DB_PORT"),
         sslmode="require"
-    )
\ No newline at end of file
+    )
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """No se ha liberado ninguna conexión dentro de DB_POOL_TIMEOUT."""
+
+
+class _Slot:
+    __slots__ = ("raw", "created_at", "released_at", "sucia")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.released_at = self.created_at
+        self.sucia = False      # se ha cambiado el estado de sesión (autocommit, set_session...)
+
+
+class PooledConnection:
+    """
+    Envoltorio sobre una conexión psycopg2 del pool. Se usa igual que una
+    conexión normal (cursor, commit, rollback, `with conn:`, conn.autocommit
+    = True...), pero close() la devuelve al pool en lugar de cerrar el socket.
+    """
+
+    # Métodos que cambian el estado de la sesión: al devolver la conexión
+    # al pool hay que restablecerlo
+    _CAMBIAN_SESION = {"set_session", "set_isolation_level", "set_client_encoding"}
+
+    def __init__(self, pool, slot):
+        self._pool = pool
+        self._slot = slot
+
+    def close(self):
+        slot, self._slot = self._slot, None
+        if slot is not None:
+            self._pool._release(slot)
+
+    @property
+    def closed(self):
+        return 1 if self._slot is None else self._slot.raw.closed
+
+    def _raw_slot(self):
+        slot = self.__dict__.get("_slot")
+        if slot is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return slot
+
+    def __getattr__(self, name):
+        slot = self._raw_slot()
+        if name in self._CAMBIAN_SESION:
+            slot.sucia = True
+        return getattr(slot.raw, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+            return
+        # autocommit, isolation_level, readonly... van a la conexión real
+        slot = self._raw_slot()
+        slot.sucia = True
+        setattr(slot.raw, name, value)
+
+    def __enter__(self):
+        # Igual que psycopg2: el bloque es una transacción (commit o
+        # rollback al salir); la conexión no se devuelve al pool
+        self._raw_slot().raw.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._raw_slot().raw.__exit__(exc_type, exc, tb)
+
+    def __del__(self):
+        # Si alguien olvida cerrar, que al menos no se pierda el hueco del pool
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones compartido por todos los routers.
+
+    - min_size conexiones se mantienen calientes, hasta max_size en picos.
+    - Si no hay ninguna libre se espera hasta `timeout` segundos (PoolTimeoutError).
+    - Al sacar una conexión se comprueba que sigue viva (ping si lleva un rato ociosa).
+    - Las conexiones con más de `max_lifetime` segundos se reciclan al devolverlas.
+    """
+
+    def __init__(self, connect, min_size, max_size, timeout, max_lifetime, ping_after):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+
+        self._idle = deque()
+        self._size = 0          # conexiones abiertas (ociosas + en uso)
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Métricas
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # ---------- ciclo de vida ----------
+
+    def open(self):
+        """Abre min_size conexiones por adelantado."""
+        with self._cond:
+            self._closed = False
+        while True:
+            # Se reserva el hueco de una en una: si falla la conexión solo se
+            # libera ese hueco y el tamaño del pool no queda inflado
+            with self._cond:
+                if self._size >= min(self.min_size, self.max_size):
+                    return
+                self._size += 1
+            try:
+                slot = _Slot(self._connect())
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(slot)
+                self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for slot in idle:
+            self._close_raw(slot)
+
+    # ---------- checkout / release ----------
+
+    def getconn(self):
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+
+        while True:
+            slot = None
+            crear = False
+            with self._cond:
+                while True:
+                    if self._idle:
+                        slot = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        crear = True
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Pool de conexiones agotado ({self.max_size} en uso)"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(restante)
+                    finally:
+                        self._waiting -= 1
+
+            if crear:
+                try:
+                    slot = _Slot(self._connect())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(slot):
+                self._discard(slot)
+                continue
+
+            espera = time.monotonic() - inicio
+            with self._cond:
+                self._checkouts += 1
+                self._wait_total += espera
+                self._wait_max = max(self._wait_max, espera)
+            return PooledConnection(self, slot)
+
+    def _release(self, slot):
+        raw = slot.raw
+        if raw.closed:
+            self._discard(slot, cerrar=False)
+            return
+
+        # Deshacer cualquier transacción que el endpoint dejase abierta
+        # (p.ej. un HTTPException antes del commit) y, si se tocó la
+        # sesión, dejarla como recién abierta para el siguiente.
+        try:
+            if raw.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                raw.rollback()
+            if slot.sucia or raw.autocommit:
+                self._reset_sesion(raw)
+                slot.sucia = False
+        except Exception:
+            self._discard(slot)
+            return
+
+        if self._closed or time.monotonic() - slot.created_at > self.max_lifetime:
+            self._discard(slot)
+            return
+
+        slot.released_at = time.monotonic()
+        with self._cond:
+            self._idle.append(slot)
+            self._cond.notify()
+
+    @staticmethod
+    def _reset_sesion(raw):
+        raw.autocommit = False
+        raw.set_session(isolation_level="DEFAULT", readonly="DEFAULT", deferrable="DEFAULT")
+        # RESET ALL + SET SESSION AUTHORIZATION DEFAULT (deshace los SET del endpoint)
+        raw.reset()
+
+    def _is_healthy(self, slot):
+        raw = slot.raw
+        if raw.closed:
+            return False
+        if time.monotonic() - slot.created_at > self.max_lifetime:
+            return False
+        if time.monotonic() - slot.released_at < self.ping_after:
+            return True
+        try:
+            cur = raw.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            raw.rollback()
+            return True
+        except Exception:
+            logger.warning("Conexión del pool caída, se descarta")
+            return False
+
+    def _discard(self, slot, cerrar=True):
+        if cerrar:
+            self._close_raw(slot)
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_raw(slot):
+        try:
+            slot.raw.close()
+        except Exception:
+            pass
+
+    # ---------- métricas ----------
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "wait_time_total_s": round(self._wait_total, 4),
+                "wait_time_avg_ms": round(1000 * self._wait_total / self._checkouts, 3) if self._checkouts else 0.0,
+                "wait_time_max_ms": round(1000 * self._wait_max, 3),
+            }
+
+
+pool = ConnectionPool(
+    _connect,
+    min_size=DB_POOL_MIN,
+    max_size=DB_POOL_MAX,
+    timeout=DB_POOL_TIMEOUT,
+    max_lifetime=DB_POOL_MAX_LIFETIME,
+    ping_after=DB_POOL_PING_AFTER,
+)
+
+
+def get_connection():
+    """Saca una conexión del pool. conn.close() la devuelve al pool."""
+    return pool.getconn()
+
+
+@contextmanager
+def connection():
+    """
+    with connection() as conn:
+        ...
+    Devuelve la conexión al pool al salir (rollback si no se hizo commit).
+    """
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def pool_stats():
+    return pool.stats()
+
+
+def get_dedicated_connection():
+    """
+    Conexión propia, fuera del pool, para lo que la tiene ocupada todo el
+    rato (p.ej. un LISTEN). Quien la abre la cierra.
+    """
+    return _connect()
@@ -0,0 +1,239 @@
+# backend/exportar.py
+#
+# Exportación masiva de histórico (engorde, sensor_lectura, lote_final) a
+# Parquet o Arrow IPC para análisis. Se lee con un cursor de servidor por
+# bloques y cada bloque se escribe como un RecordBatch, así la memoria no
+# depende del rango de fechas exportado.
+#
+#   GET /exportar/{dataset}?desde=2025-01-01&hasta=2026-01-01&formato=parquet
+#   python -m backend.exportar engorde --desde 2025-01-01 --hasta 2026-01-01 -o engorde.parquet
+
+import os
+import uuid
+import argparse
+from datetime import date
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from backend.auth.auth import require_admin
+from backend.database import get_connection
+
+router = APIRouter(prefix="/exportar", tags=["exportar"])
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "50000"))
+
+
+# Columnas de cada dataset: (expresión SQL, nombre, tipo arrow). Los NUMERIC
+# salen como float8 y los JSON como texto para que el esquema sea fijo.
+DATASETS = {
+    "engorde": {
+        "from": "engorde e",
+        "fecha": "e.timestamp",
+        "orden": "e.timestamp",
+        "columnas": [
+            ("e.id_pallet", "id_pallet", "int32"),
+            ("e.tipo_evento", "tipo_evento", "string"),
+            ("e.id_camara", "id_camara", "int32"),
+            ("e.id_lote_alimento", "id_lote_alimento", "int32"),
+            ("e.id_lote_huevo", "id_lote_huevo", "int32"),
+            ("e.estado_anterior", "estado_anterior", "string"),
+            ("e.estado_nuevo", "estado_nuevo", "string"),
+            ("e.usuario::text", "usuario", "string"),
+            ("e.id_sesion_procesado", "id_sesion_procesado", "int32"),
+            ("e.fecha_entrada", "fecha_entrada", "date"),
+            ("e.fecha_salida_prevista", "fecha_salida_prevista", "date"),
+            ("e.metadata::text", "metadata", "string"),
+            ("e.timestamp", "timestamp", "timestamp"),
+        ],
+    },
+    "sensor_lectura": {
+        "from": "sensor_lectura sl JOIN sensor s ON s.id_sensor = sl.id_sensor",
+        "fecha": "sl.fecha_lectura",
+        "orden": "sl.fecha_lectura",
+        "columnas": [
+            ("sl.id_lectura", "id_lectura", "int64"),
+            ("sl.id_sensor", "id_sensor", "int32"),
+            ("s.id_camara", "id_camara", "int32"),
+            ("s.tipo", "tipo", "string"),
+            ("sl.valor::float8", "valor", "float64"),
+            ("sl.fecha_lectura", "fecha_lectura", "timestamp"),
+        ],
+    },
+    "lote_final": {
+        "from": "lote_final lf",
+        "fecha": "lf.fecha_produccion",
+        "orden": "lf.fecha_produccion, lf.id",
+        "columnas": [
+            ("lf.id", "id", "int32"),
+            ("lf.codigo_lote", "codigo_lote", "string"),
+            ("lf.tipo_producto", "tipo_producto", "string"),
+            ("lf.fecha_produccion", "fecha_produccion", "date"),
+            ("lf.peso::float8", "peso", "float64"),
+            ("lf.id_sesion_procesado", "id_sesion_procesado", "int32"),
+            ("lf.id_lote_alimento", "id_lote_alimento", "int32"),
+            ("lf.id_lote_huevo", "id_lote_huevo", "int32"),
+            ("lf.destino", "destino", "string"),
+            ("lf.etiquetado_ok", "etiquetado_ok", "bool"),
+            ("lf.observaciones", "observaciones", "string"),
+        ],
+    },
+}
+
+FORMATOS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def _esquema(dataset):
+    tipos = {
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "string": pa.string(),
+        "bool": pa.bool_(),
+        "date": pa.date32(),
+        "timestamp": pa.timestamp("us"),
+    }
+    return pa.schema([(nombre, tipos[tipo]) for _, nombre, tipo in DATASETS[dataset]["columnas"]])
+
+
+def _consulta(dataset, desde, hasta):
+    d = DATASETS[dataset]
+    condiciones = []
+    params = {}
+    if desde:
+        condiciones.append(f"{d['fecha']} >= %(desde)s")
+        params["desde"] = desde
+    if hasta:
+        condiciones.append(f"{d['fecha']} < %(hasta)s")
+        params["hasta"] = hasta
+    where = " AND ".join(condiciones) or "TRUE"
+    columnas = ", ".join(expr for expr, _, _ in d["columnas"])
+    return f"SELECT {columnas} FROM {d['from']} WHERE {where} ORDER BY {d['orden']}", params
+
+
+class SalidaPorTrozos:
+    """Fichero de solo escritura que acumula bytes para ir enviándolos."""
+
+    def __init__(self):
+        self._partes = []
+        self.closed = False
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def sacar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+def exportar(dataset, desde=None, hasta=None, formato="parquet", batch_rows=EXPORT_BATCH_ROWS):
+    """
+    Generador de bytes del fichero exportado. Lee `batch_rows` filas cada vez
+    con un cursor de servidor y escribe un RecordBatch por bloque.
+    """
+    esquema = _esquema(dataset)
+    sql, params = _consulta(dataset, desde, hasta)
+
+    sink = SalidaPorTrozos()
+    salida = pa.PythonFile(sink, mode="w")
+    if formato == "parquet":
+        writer = pa.parquet.ParquetWriter(salida, esquema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(salida, esquema)
+
+    conn = get_connection()
+    # Cursor con nombre = cursor de servidor: las filas llegan por bloques
+    cur = conn.cursor(name=f"exportar_{dataset}_{uuid.uuid4().hex[:8]}")
+    cur.itersize = batch_rows
+    try:
+        cur.execute(sql, params)
+        while True:
+            filas = cur.fetchmany(batch_rows)
+            if not filas:
+                break
+            columnas = list(zip(*filas))
+            lote = pa.RecordBatch.from_arrays(
+                [pa.array(col, type=campo.type) for col, campo in zip(columnas, esquema)],
+                schema=esquema
+            )
+            writer.write_batch(lote)
+            datos = sink.sacar()
+            if datos:
+                yield datos
+        writer.close()
+        yield sink.sacar()
+    finally:
+        cur.close()
+        conn.rollback()
+        conn.close()
+
+
+def _validar(dataset, formato, desde, hasta):
+    if dataset not in DATASETS:
+        raise ValueError(f"dataset debe ser uno de: {', '.join(DATASETS)}")
+    if formato not in FORMATOS:
+        raise ValueError(f"formato debe ser uno de: {', '.join(FORMATOS)}")
+    if desde and hasta and desde >= hasta:
+        raise ValueError("'desde' debe ser anterior a 'hasta'")
+
+
+@router.get("/{dataset}")
+def exportar_dataset(
+    dataset: str,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    formato: str = "parquet",
+    user=Depends(require_admin)
+):
+    """
+    Descarga engorde, sensor_lectura o lote_final en Parquet (formato=parquet)
+    o Arrow IPC stream (formato=arrow), filtrado por [desde, hasta).
+    """
+    try:
+        _validar(dataset, formato, desde, hasta)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    media_type, extension = FORMATOS[formato]
+    nombre = f"{dataset}_{desde or 'inicio'}_{hasta or 'hoy'}.{extension}"
+    return StreamingResponse(
+        exportar(dataset, desde, hasta, formato),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta histórico a Parquet / Arrow IPC")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--desde", type=date.fromisoformat)
+    parser.add_argument("--hasta", type=date.fromisoformat)
+    parser.add_argument("--formato", choices=sorted(FORMATOS), default="parquet")
+    parser.add_argument("--batch", type=int, default=EXPORT_BATCH_ROWS)
+    parser.add_argument("-o", "--salida", required=True)
+    args = parser.parse_args()
+
+    try:
+        _validar(args.dataset, args.formato, args.desde, args.hasta)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with open(args.salida, "wb") as f:
+        for trozo in exportar(args.dataset, args.desde, args.hasta, args.formato, args.batch):
+            f.write(trozo)
+    print(f"Exportado {args.dataset} a {args.salida}")
@@ -0,0 +1,307 @@
+# backend/genealogia.py
+#
+# Genealogía de lotes para retiradas (recall):
+#   - hacia atrás: lote final → sesión de procesado → pallets cribados →
+#     su ciclo (cámara, fechas) → lotes de alimento y huevo
+#   - hacia delante: lote de alimento / huevo → pallets y ciclos en los que
+#     se usó → lotes finales afectados
+# Se apoya en vista_ciclo_pallet y pallet_lotes.fecha_asignacion (ver
+# PostgreSQL_archivos/genealogia_migration.sql). Solo se cachea la
+# genealogía hacia atrás, con una huella del lote en la clave: el xmin de
+# su fila de lote_final y de su procesado_sesion (cada cribado la
+# actualiza) más la versión de genealogia_version, que solo sube con
+# correcciones a mano (ver genealogia_version_migration.sql). Así se
+# invalida en todos los workers sin un contador común en las líneas de
+# cribado. Las consultas hacia delante (retiradas) van siempre a la BD: un
+# pallet recién montado tiene que salir en la siguiente consulta.
+
+import os
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from backend.auth.dependencies import get_current_user
+from backend.cache import TTLCache
+from backend.database import get_connection
+
+router = APIRouter(prefix="/trazabilidad/genealogia", tags=["trazabilidad"])
+
+GENEALOGIA_CACHE_TTL = float(os.getenv("GENEALOGIA_CACHE_TTL", "300"))
+
+_cache = TTLCache(maxsize=256, ttl=GENEALOGIA_CACHE_TTL)
+
+
+# ============================================================
+# CICLOS DE PALLET
+# ============================================================
+
+def _ciclos_de_pallets(cur, ids_pallet):
+    """
+    Ciclos de los pallets indicados, con los lotes de cada ciclo. Las filas
+    de pallet_lotes sin fecha (anteriores a la migración) no se pueden
+    situar en un ciclo: se añaden a todos y el ciclo se marca 'aproximado'.
+    """
+    if not ids_pallet:
+        return []
+
+    cur.execute("""
+        SELECT c.id_pallet, p.codigo_qr, c.ciclo, c.inicio, c.fin,
+               c.id_sesion_procesado, c.id_camara, cam.nombre,
+               c.fecha_entrada, c.fecha_salida,
+               c.lotes_alimento_eventos, c.lotes_huevo_eventos
+        FROM vista_ciclo_pallet c
+        JOIN Pallet p ON p.id_pallet = c.id_pallet
+        LEFT JOIN Camara cam ON cam.id_camara = c.id_camara
+        WHERE c.id_pallet = ANY(%s)
+        ORDER BY c.id_pallet, c.ciclo
+    """, [list(ids_pallet)])
+    ciclos = []
+    por_pallet = {}
+    for r in cur.fetchall():
+        ciclo = {
+            "id_pallet": r[0],
+            "codigo_qr": r[1],
+            "ciclo": r[2],
+            "inicio": r[3],
+            "fin": r[4],
+            "id_sesion_procesado": r[5],
+            "camara": {"id_camara": r[6], "nombre": r[7]} if r[6] else None,
+            "fecha_entrada_camara": r[8],
+            "fecha_salida_camara": r[9],
+            "lotes_alimento": set(r[10] or []),
+            "lotes_huevo": set(r[11] or []),
+            "aproximado": False,
+        }
+        ciclos.append(ciclo)
+        por_pallet.setdefault(r[0], []).append(ciclo)
+
+    cur.execute("""
+        SELECT id_pallet, id_lote_alimento, id_lote_huevo, fecha_asignacion
+        FROM pallet_lotes
+        WHERE id_pallet = ANY(%s)
+    """, [list(ids_pallet)])
+    for id_pallet, id_la, id_lh, fecha in cur.fetchall():
+        for ciclo in por_pallet.get(id_pallet, []):
+            if fecha is None:
+                ciclo["aproximado"] = True
+            elif not (ciclo["inicio"] <= fecha <= (ciclo["fin"] or datetime.max)):
+                continue
+            if id_la is not None:
+                ciclo["lotes_alimento"].add(id_la)
+            if id_lh is not None:
+                ciclo["lotes_huevo"].add(id_lh)
+
+    return ciclos
+
+
+def _describir_lotes(cur, ids_alimento, ids_huevo):
+    alimentos = {}
+    huevos = {}
+    if ids_alimento:
+        cur.execute("""
+            SELECT id_lote_alimento, codigo_qr, descripcion, fecha_llegada
+            FROM Lote_Alimento WHERE id_lote_alimento = ANY(%s)
+        """, [list(ids_alimento)])
+        for r in cur.fetchall():
+            alimentos[r[0]] = {
+                "id_lote_alimento": r[0], "codigo_qr": r[1],
+                "descripcion": r[2], "fecha_llegada": r[3]
+            }
+    if ids_huevo:
+        cur.execute("""
+            SELECT id_lote_huevo, codigo_qr, origen, fecha_registro
+            FROM Lote_Huevo WHERE id_lote_huevo = ANY(%s)
+        """, [list(ids_huevo)])
+        for r in cur.fetchall():
+            huevos[r[0]] = {
+                "id_lote_huevo": r[0], "codigo_qr": r[1],
+                "origen": r[2], "fecha_registro": r[3]
+            }
+    return alimentos, huevos
+
+
+def _ciclo_out(ciclo):
+    return {
+        "id_pallet": ciclo["id_pallet"],
+        "codigo_qr": ciclo["codigo_qr"],
+        "ciclo": ciclo["ciclo"],
+        "montado": ciclo["inicio"],
+        "cribado": ciclo["fin"],
+        "id_sesion_procesado": ciclo["id_sesion_procesado"],
+        "camara": ciclo["camara"],
+        "fecha_entrada_camara": ciclo["fecha_entrada_camara"],
+        "fecha_salida_camara": ciclo["fecha_salida_camara"],
+        "lotes_alimento": sorted(ciclo["lotes_alimento"]),
+        "lotes_huevo": sorted(ciclo["lotes_huevo"]),
+        "aproximado": ciclo["aproximado"],
+    }
+
+
+def _lotes_finales(cur, where, params):
+    cur.execute(f"""
+        SELECT id, codigo_lote, tipo_producto, fecha_produccion, peso,
+               destino, id_sesion_procesado
+        FROM lote_final
+        WHERE {where}
+        ORDER BY fecha_produccion, codigo_lote
+    """, params)
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+# ============================================================
+# HACIA ATRÁS: LOTE FINAL → PALLETS → LOTES DE ORIGEN
+# ============================================================
+
+def genealogia_lote_final(cur, codigo_lote):
+    lotes = _lotes_finales(cur, "codigo_lote = %s", [codigo_lote])
+    if not lotes:
+        return None
+    lote = lotes[0]
+    id_sesion = lote["id_sesion_procesado"]
+
+    ciclos = []
+    if id_sesion is not None:
+        cur.execute("""
+            SELECT DISTINCT id_pallet FROM engorde
+            WHERE id_sesion_procesado = %s AND tipo_evento = 'CRIBADO'
+        """, [id_sesion])
+        ids_pallet = [r[0] for r in cur.fetchall()]
+        ciclos = [
+            c for c in _ciclos_de_pallets(cur, ids_pallet)
+            if c["id_sesion_procesado"] == id_sesion
+        ]
+
+    # Lotes de origen: los de los ciclos + los guardados en el propio lote final
+    ids_alimento = set().union(*(c["lotes_alimento"] for c in ciclos))
+    ids_huevo = set().union(*(c["lotes_huevo"] for c in ciclos))
+    cur.execute("SELECT id_lote_alimento, id_lote_huevo FROM lote_final WHERE id = %s", [lote["id"]])
+    id_la, id_lh = cur.fetchone()
+    if id_la is not None:
+        ids_alimento.add(id_la)
+    if id_lh is not None:
+        ids_huevo.add(id_lh)
+
+    alimentos, huevos = _describir_lotes(cur, ids_alimento, ids_huevo)
+    return {
+        "lote_final": lote,
+        "pallets": [_ciclo_out(c) for c in ciclos],
+        "lotes_alimento": [alimentos[i] for i in sorted(alimentos)],
+        "lotes_huevo": [huevos[i] for i in sorted(huevos)],
+        "aproximado": any(c["aproximado"] for c in ciclos),
+    }
+
+
+# ============================================================
+# HACIA DELANTE: LOTE DE ALIMENTO / HUEVO → LOTES FINALES
+# ============================================================
+
+_LOTES_ORIGEN = {
+    # tipo: (tabla, columna id, clave del ciclo)
+    "alimento": ("Lote_Alimento", "id_lote_alimento", "lotes_alimento"),
+    "huevo": ("Lote_Huevo", "id_lote_huevo", "lotes_huevo"),
+}
+
+
+def genealogia_lote_origen(cur, tipo, codigo_qr):
+    tabla, columna, clave = _LOTES_ORIGEN[tipo]
+
+    cur.execute(f"SELECT {columna} FROM {tabla} WHERE codigo_qr = %s", [codigo_qr])
+    row = cur.fetchone()
+    if not row:
+        return None
+    id_lote = row[0]
+
+    cur.execute(f"""
+        SELECT id_pallet FROM pallet_lotes WHERE {columna} = %(id)s
+        UNION
+        SELECT id_pallet FROM engorde WHERE {columna} = %(id)s AND id_pallet IS NOT NULL
+    """, {"id": id_lote})
+    ids_pallet = [r[0] for r in cur.fetchall()]
+
+    ciclos = [c for c in _ciclos_de_pallets(cur, ids_pallet) if id_lote in c[clave]]
+    sesiones = sorted({c["id_sesion_procesado"] for c in ciclos if c["id_sesion_procesado"] is not None})
+
+    lotes_finales = _lotes_finales(
+        cur, f"id_sesion_procesado = ANY(%(sesiones)s) OR {columna} = %(id)s",
+        {"sesiones": sesiones, "id": id_lote}
+    )
+
+    alimentos, huevos = _describir_lotes(
+        cur, [id_lote] if tipo == "alimento" else [], [id_lote] if tipo == "huevo" else []
+    )
+    return {
+        "lote": (alimentos or huevos)[id_lote],
+        "pallets": [_ciclo_out(c) for c in ciclos],
+        "lotes_finales": lotes_finales,
+        "aproximado": any(c["aproximado"] for c in ciclos),
+    }
+
+
+# ============================================================
+# ENDPOINTS
+# ============================================================
+
+def _huella_lote_final(cur, codigo_lote):
+    """
+    Lo que cambia si cambia la genealogía de un lote final: la fila del lote,
+    la de su sesión (pallets_cribados sube con cada CRIBADO) y la versión de
+    las correcciones a mano. None si el lote no existe (no se cachea).
+    """
+    cur.execute("""
+        SELECT lf.xmin::text, ps.xmin::text,
+               (SELECT version FROM genealogia_version)
+        FROM lote_final lf
+        LEFT JOIN procesado_sesion ps ON ps.id = lf.id_sesion_procesado
+        WHERE lf.codigo_lote = %s
+    """, [codigo_lote])
+    return cur.fetchone()
+
+
+def _consultar(huella, fn, *args):
+    """
+    Ejecuta fn(cur, *args). Con huella, cachea por (fn, args, huella(cur, *args)):
+    una huella distinta es una entrada nueva y la vieja caduca sola.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    clave = None
+    try:
+        if huella is not None:
+            h = huella(cur, *args)
+            clave = (fn.__name__, args, h) if h is not None else None
+        if clave is not None:
+            resultado = _cache.get(clave)
+            if resultado is not None:
+                return resultado
+        resultado = fn(cur, *args)
+    finally:
+        cur.close()
+        conn.close()
+
+    if resultado is None:
+        raise HTTPException(404, "Lote no encontrado")
+    if clave is not None:
+        _cache.set(clave, resultado)
+    return resultado
+
+
+@router.get("/lote_final/{codigo_lote}")
+def get_genealogia_lote_final(codigo_lote: str, user=Depends(get_current_user)):
+    """Hacia atrás: pallets, estancias en cámara y lotes de alimento/huevo de un lote final."""
+    codigo_lote = codigo_lote.strip().upper()
+    return _consultar(_huella_lote_final, genealogia_lote_final, codigo_lote)
+
+
+@router.get("/lote_alimento/{codigo_qr}")
+def get_genealogia_lote_alimento(codigo_qr: str, user=Depends(get_current_user)):
+    """Hacia delante: pallets y lotes finales en los que se usó un lote de alimento."""
+    codigo_qr = codigo_qr.strip().upper()
+    return _consultar(None, genealogia_lote_origen, "alimento", codigo_qr)
+
+
+@router.get("/lote_huevo/{codigo_qr}")
+def get_genealogia_lote_huevo(codigo_qr: str, user=Depends(get_current_user)):
+    """Hacia delante: pallets y lotes finales en los que se usó un lote de huevo."""
+    codigo_qr = codigo_qr.strip().upper()
+    return _consultar(None, genealogia_lote_origen, "huevo", codigo_qr)
@@ -0,0 +1,53 @@
+# backend/lotes_activos.py
+#
+# Lotes de alimento y huevo activos, en memoria. Cambian pocas veces al día
+# (lotes/toggle, lote_alimento/activar, lote_huevo/activar) y se leen en cada
+# montaje de pallet. La copia lleva la versión de lotes_activos_version (ver
+# PostgreSQL_archivos/lotes_activos_version_migration.sql): comprobarla es
+# leer una fila, y solo se recargan los lotes si otro worker los ha cambiado.
+
+import threading
+
+
+class LotesActivosSnapshot:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._alimento = ()
+        self._huevo = ()
+
+    def get(self, cur):
+        """
+        Devuelve (ids_lote_alimento, ids_lote_huevo) activos. Usa el cursor de
+        la petición, así la lectura va dentro de su transacción.
+        """
+        cur.execute("SELECT version FROM lotes_activos_version")
+        row = cur.fetchone()
+        version = row[0] if row else None
+
+        with self._lock:
+            if version is not None and version == self._version:
+                return self._alimento, self._huevo
+
+        cur.execute("""
+            SELECT 'alimento', id_lote_alimento FROM Lote_Alimento WHERE activo = TRUE
+            UNION ALL
+            SELECT 'huevo', id_lote_huevo FROM Lote_Huevo WHERE activo = TRUE
+        """)
+        filas = cur.fetchall()
+        alimento = tuple(sorted(i for t, i in filas if t == "alimento"))
+        huevo = tuple(sorted(i for t, i in filas if t == "huevo"))
+
+        with self._lock:
+            self._version = version
+            self._alimento = alimento
+            self._huevo = huevo
+        return alimento, huevo
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+
+lotes_activos = LotesActivosSnapshot()
@@ -0,0 +1,118 @@
+# backend/paginacion.py
+#
+# Paginación por cursor (keyset) para los listados de backend.py.
+# En vez de SELECT * de toda la tabla, cada página es
+#   WHERE pk > after [AND filtros] ORDER BY pk LIMIT n
+# que usa el índice de la clave primaria y tarda lo mismo en la página 1
+# que en la 1000. El cuerpo de la respuesta sigue siendo la lista de filas;
+# el cursor de la siguiente página va en la cabecera X-Next-After y el
+# total (solo si se pide con count=true) en X-Total-Count.
+# Sin limit ni after se devuelve la tabla entera (en orden de clave), como
+# antes de paginar, para no cortar a los clientes que no conocen los
+# parámetros. La clave tiene que ser única: con una repetida (p.ej.
+# id_pallet en engorde) las filas que caen en el corte de página se saltan.
+
+import os
+import threading
+
+import psycopg2
+from fastapi import HTTPException
+from psycopg2 import sql
+
+LIST_DEFAULT_LIMIT = int(os.getenv("LIST_DEFAULT_LIMIT", "500"))    # si se pasa after sin limit
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "5000"))
+
+# Parámetros de la query string que no son filtros por campo
+PARAMS_RESERVADOS = {"limit", "after", "count"}
+
+CABECERAS_PAGINACION = ["X-Next-After", "X-Total-Count"]
+
+_columnas = {}
+_columnas_lock = threading.Lock()
+
+
+def _columnas_tabla(cur, tabla):
+    with _columnas_lock:
+        cols = _columnas.get(tabla)
+    if cols is None:
+        cur.execute(sql.SQL("SELECT * FROM {} LIMIT 0").format(sql.Identifier(tabla.lower())))
+        cols = {d[0].lower() for d in cur.description}
+        with _columnas_lock:
+            _columnas[tabla] = cols
+    return cols
+
+
+def paginar(cur, tabla, pk, query_params, limit=None, after=None, count=False, fijos=None):
+    """
+    Devuelve (filas, siguiente_after, total). Los query_params que coinciden
+    con una columna de la tabla se aplican como filtro de igualdad; `fijos`
+    son filtros que impone el endpoint (p.ej. el operario de un usuario).
+    Sin limit ni after no se pagina: todas las filas y siguiente_after None.
+    """
+    if limit is None and after is not None:
+        limit = LIST_DEFAULT_LIMIT
+    if limit is not None and not 1 <= limit <= LIST_MAX_LIMIT:
+        raise HTTPException(400, f"limit debe estar entre 1 y {LIST_MAX_LIMIT}")
+
+    columnas = _columnas_tabla(cur, tabla)
+    filtros = {}
+    for campo, valor in query_params.items():
+        if campo in PARAMS_RESERVADOS:
+            continue
+        campo = campo.lower()
+        if campo not in columnas:
+            raise HTTPException(400, f"Filtro no válido: {campo}")
+        filtros[campo] = valor
+    filtros.update(fijos or {})
+
+    condiciones = [sql.SQL("{} = %s").format(sql.Identifier(c)) for c in filtros]
+    valores = list(filtros.values())
+    t = sql.Identifier(tabla.lower())
+    k = sql.Identifier(pk)
+
+    total = None
+    if count:
+        where = sql.SQL(" AND ").join(condiciones) if condiciones else sql.SQL("TRUE")
+        _ejecutar(cur, sql.SQL("SELECT COUNT(*) FROM {} WHERE {}").format(t, where), valores)
+        total = cur.fetchone()[0]
+
+    if after is not None:
+        condiciones.append(sql.SQL("{} > %s").format(k))
+        valores.append(after)
+    where = sql.SQL(" AND ").join(condiciones) if condiciones else sql.SQL("TRUE")
+
+    if limit is None:
+        _ejecutar(cur, sql.SQL("SELECT * FROM {} WHERE {} ORDER BY {}").format(t, where, k), valores)
+        cols = [d[0].lower() for d in cur.description]
+        return [dict(zip(cols, row)) for row in cur.fetchall()], None, total
+
+    # Una fila de más para saber si hay página siguiente
+    _ejecutar(
+        cur, sql.SQL("SELECT * FROM {} WHERE {} ORDER BY {} LIMIT %s").format(t, where, k),
+        valores + [limit + 1]
+    )
+    cols = [d[0].lower() for d in cur.description]
+    filas = [dict(zip(cols, row)) for row in cur.fetchmany(limit + 1)]
+
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = filas[-1][pk]
+    return filas, siguiente, total
+
+
+def _ejecutar(cur, query, valores):
+    # Los filtros llegan como texto: ?id_camara=abc sobre una columna entera
+    # es un error del cliente, no un 500
+    try:
+        cur.execute(query, valores)
+    except psycopg2.DataError:
+        cur.connection.rollback()
+        raise HTTPException(400, "Filtro no válido")
+
+
+def cabeceras_paginacion(response, siguiente, total):
+    if siguiente is not None:
+        response.headers["X-Next-After"] = str(siguiente)
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
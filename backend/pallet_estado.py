@@ -0,0 +1,96 @@
+# backend/pallet_estado.py
+#
+# Proyección pallet_estado_actual: una fila por pallet con su estado,
+# cámara, últimos lotes y fechas de cámara (ver
+# PostgreSQL_archivos/pallet_estado_actual_migration.sql).
+# log_engorde_event la actualiza con aplicar_evento() en la misma
+# transacción que inserta el evento. Si se desincroniza, se regenera
+# reproduciendo engorde:
+#   python -m backend.pallet_estado            (todos los pallets)
+#   python -m backend.pallet_estado 123        (solo el pallet 123)
+
+import sys
+import logging
+
+from backend.database import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+# Reglas (las mismas que reconstruir_pallet_estado_actual en SQL):
+#   - estado: el último estado_nuevo informado
+#   - id_camara: la del evento si el nuevo estado es 'en_camara', NULL si
+#     sale a otro estado, sin cambios si el evento no cambia de estado
+#   - lotes y fechas: el último valor no nulo dentro del ciclo actual. Un
+#     MONTADO (estado_nuevo 'preparado') abre ciclo: toma sus propios
+#     valores, aunque sean NULL, y no arrastra los del ciclo anterior
+SQL_APLICAR_EVENTO = """
+    INSERT INTO pallet_estado_actual AS pe (
+        id_pallet, estado, id_camara, id_lote_alimento, id_lote_huevo,
+        fecha_entrada, fecha_salida_prevista, ultimo_evento, fecha_ultimo_evento
+    )
+    VALUES (
+        %(id_pallet)s, %(estado)s,
+        CASE WHEN %(estado)s = 'en_camara' THEN %(id_camara)s::int END,
+        %(id_lote_alimento)s, %(id_lote_huevo)s,
+        %(fecha_entrada)s, %(fecha_salida_prevista)s, %(tipo_evento)s, NOW()
+    )
+    ON CONFLICT (id_pallet) DO UPDATE SET
+        estado = COALESCE(EXCLUDED.estado, pe.estado),
+        id_camara = CASE
+            WHEN EXCLUDED.estado IS NULL THEN pe.id_camara
+            ELSE EXCLUDED.id_camara
+        END,
+        id_lote_alimento = CASE WHEN EXCLUDED.estado = 'preparado' THEN EXCLUDED.id_lote_alimento
+            ELSE COALESCE(EXCLUDED.id_lote_alimento, pe.id_lote_alimento) END,
+        id_lote_huevo = CASE WHEN EXCLUDED.estado = 'preparado' THEN EXCLUDED.id_lote_huevo
+            ELSE COALESCE(EXCLUDED.id_lote_huevo, pe.id_lote_huevo) END,
+        fecha_entrada = CASE WHEN EXCLUDED.estado = 'preparado' THEN EXCLUDED.fecha_entrada
+            ELSE COALESCE(EXCLUDED.fecha_entrada, pe.fecha_entrada) END,
+        fecha_salida_prevista = CASE WHEN EXCLUDED.estado = 'preparado' THEN EXCLUDED.fecha_salida_prevista
+            ELSE COALESCE(EXCLUDED.fecha_salida_prevista, pe.fecha_salida_prevista) END,
+        ultimo_evento = EXCLUDED.ultimo_evento,
+        fecha_ultimo_evento = EXCLUDED.fecha_ultimo_evento
+"""
+
+
+def aplicar_evento(
+    cur, id_pallet, tipo_evento, estado_nuevo=None, id_camara=None,
+    id_lote_alimento=None, id_lote_huevo=None,
+    fecha_entrada=None, fecha_salida_prevista=None
+):
+    """Actualiza la fila del pallet con un evento recién insertado en engorde."""
+    cur.execute(SQL_APLICAR_EVENTO, {
+        "id_pallet": id_pallet,
+        "tipo_evento": tipo_evento,
+        "estado": estado_nuevo,
+        "id_camara": id_camara,
+        "id_lote_alimento": id_lote_alimento,
+        "id_lote_huevo": id_lote_huevo,
+        "fecha_entrada": fecha_entrada,
+        "fecha_salida_prevista": fecha_salida_prevista,
+    })
+
+
+def reconstruir(id_pallet=None):
+    """Regenera la proyección desde engorde. Devuelve el número de pallets."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT reconstruir_pallet_estado_actual(%s)", [id_pallet])
+        filas = cur.fetchone()[0]
+        conn.commit()
+        return filas
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    id_pallet = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    total = reconstruir(id_pallet)
+    print(f"pallet_estado_actual reconstruida: {total} pallets")
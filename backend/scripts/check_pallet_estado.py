@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Comprobación de pallet_estado_actual contra la base de datos real, dentro
+de una transacción que se deshace al final (no deja nada escrito).
+
+Simula dos ciclos de un mismo pallet: el primero con lote de alimento y de
+huevo y fechas de cámara, y un segundo MONTADO solo con lote de huevo.
+Tras el remontaje la proyección no debe conservar el lote de alimento ni
+las fechas del ciclo anterior, y reconstruir_pallet_estado_actual() (la
+regeneración desde engorde) debe dar exactamente la misma fila.
+
+Uso:
+    python backend/scripts/check_pallet_estado.py [id_pallet]
+"""
+import sys
+from pathlib import Path
+from datetime import date, timedelta
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.database import get_connection
+from backend.trazabilidad_backend import log_engorde_event
+
+COLUMNAS = (
+    "estado, id_camara, id_lote_alimento, id_lote_huevo, "
+    "fecha_entrada, fecha_salida_prevista, ultimo_evento"
+)
+
+
+def fila(cur, id_pallet):
+    cur.execute(f"SELECT {COLUMNAS} FROM pallet_estado_actual WHERE id_pallet = %s", [id_pallet])
+    return cur.fetchone()
+
+
+conn = get_connection()
+cur = conn.cursor()
+try:
+    if len(sys.argv) > 1:
+        id_pallet = int(sys.argv[1])
+    else:
+        cur.execute("SELECT id_pallet FROM pallet ORDER BY id_pallet LIMIT 1")
+        id_pallet = cur.fetchone()[0]
+    cur.execute("SELECT id_camara FROM camara ORDER BY id_camara LIMIT 1")
+    id_camara = cur.fetchone()[0]
+    cur.execute("SELECT id_lote_alimento FROM Lote_Alimento ORDER BY id_lote_alimento DESC LIMIT 1")
+    id_lote_alimento = cur.fetchone()[0]
+    cur.execute("SELECT id_lote_huevo FROM Lote_Huevo ORDER BY id_lote_huevo DESC LIMIT 2")
+    lotes_huevo = [r[0] for r in cur.fetchall()]
+
+    hoy = date.today()
+    fechas = {"fecha_entrada": str(hoy), "fecha_salida_prevista": str(hoy + timedelta(days=14))}
+
+    # Ciclo 1 completo. Cada evento se vuelve a fechar con clock_timestamp():
+    # NOW() es el mismo en toda la transacción y la reconstrucción ordena
+    # por timestamp
+    eventos = [
+        ("MONTADO", dict(estado_anterior="vacio", estado_nuevo="preparado",
+                         id_lote_alimento=id_lote_alimento, id_lote_huevo=lotes_huevo[0])),
+        ("ENTRADA_CAMARA", dict(estado_anterior="preparado", estado_nuevo="en_camara",
+                                id_camara=id_camara, metadata=fechas)),
+        ("SALIDA_CAMARA", dict(estado_anterior="en_camara", estado_nuevo="fuera_camara",
+                               id_camara=id_camara)),
+        ("CRIBADO", dict(estado_anterior="fuera_camara", estado_nuevo="vacio")),
+        # Ciclo 2: solo hay lote de huevo activo
+        ("MONTADO", dict(estado_anterior="vacio", estado_nuevo="preparado",
+                         id_lote_huevo=lotes_huevo[-1])),
+    ]
+    for tipo, kwargs in eventos:
+        log_engorde_event(cur, id_pallet, tipo, **kwargs)
+        cur.execute("""
+            UPDATE engorde SET timestamp = clock_timestamp()
+            WHERE id_pallet = %s AND timestamp = NOW()
+        """, [id_pallet])
+
+    proyeccion = fila(cur, id_pallet)
+    print("Tras remontar solo con huevo:", proyeccion)
+    esperado = ("preparado", None, None, lotes_huevo[-1], None, None, "MONTADO")
+    assert proyeccion == esperado, f"se esperaba {esperado}"
+
+    cur.execute("SELECT reconstruir_pallet_estado_actual(%s)", [id_pallet])
+    reconstruida = fila(cur, id_pallet)
+    print("Reconstruida desde engorde:  ", reconstruida)
+    assert reconstruida == proyeccion, "la reconstrucción no coincide con la proyección"
+
+    print("\nOK: el remontaje no arrastra lotes ni fechas del ciclo anterior.")
+finally:
+    conn.rollback()
+    cur.close()
+    conn.close()
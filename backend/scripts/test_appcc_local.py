@@ -38,6 +38,8 @@ print("Proveedores:", len(datos["proveedores"]), "->", [p["nombre"] for p in dat
 print("Trazabilidad (lote_final este mes):", len(datos["trazabilidad"]))
 print("Zonas limpieza:", len(datos["zonas_limpieza"]))
 print("Dias laborables:", len(datos["dias_laborables"]))
+for tipo, camaras in datos["clima"].items():
+    print(f"Clima ({tipo}):", [(c["nombre"], f"{len(c['dias'])} dias con lecturas") for c in camaras])
 
 print("\nGenerando docx...")
 docx_bytes = appcc.generar_docx(datos)
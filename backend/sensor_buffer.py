@@ -0,0 +1,316 @@
+# backend/sensor_buffer.py
+#
+# Ingesta de lecturas de sensores (ESP32) con escritura en bloque.
+# Las lecturas se acumulan en memoria y se vuelcan a sensor_lectura con un
+# único INSERT multi-fila cuando se llena el buffer o pasa el intervalo.
+
+import os
+import math
+import time
+from datetime import datetime, timedelta
+import threading
+import logging
+from collections import deque
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from backend.database import get_connection
+from backend.sensor_mantenimiento import SENSOR_RAW_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+SENSOR_BUFFER_MAX_BATCH = int(os.getenv("SENSOR_BUFFER_MAX_BATCH", "500"))     # filas por volcado
+SENSOR_BUFFER_INTERVAL = float(os.getenv("SENSOR_BUFFER_INTERVAL", "2"))       # segundos entre volcados
+SENSOR_BUFFER_MAX_PENDING = int(os.getenv("SENSOR_BUFFER_MAX_PENDING", "50000"))  # tope si la BD no responde
+SENSOR_MAP_TTL = float(os.getenv("SENSOR_MAP_TTL", "60"))                      # refresco del mapa de dispositivos
+SENSOR_MAP_MISS_COOLDOWN = 5.0                                                  # recargas por dispositivo desconocido
+SENSOR_RECHAZADAS_MAX = 200                                                     # últimas filas rechazadas que se guardan
+SENSOR_MAX_ADELANTO = float(os.getenv("SENSOR_MAX_ADELANTO", "600"))            # segundos de reloj adelantado tolerados
+
+# sensor_lectura.valor es NUMERIC(6,2)
+VALOR_MAX = 9999.99
+
+
+def valor_valido(valor):
+    """True si el valor cabe en sensor_lectura.valor (finito y dentro de NUMERIC(6,2))."""
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return False
+    return math.isfinite(valor) and abs(round(valor, 2)) <= VALOR_MAX
+
+
+def fecha_local(fecha):
+    """
+    Fecha naive en hora local, como las guarda sensor_lectura (TIMESTAMP sin
+    zona): las que llegan con zona se convierten; con %s::timestamp la zona
+    se descartaría sin más.
+    """
+    if fecha is not None and fecha.tzinfo is not None:
+        return fecha.astimezone().replace(tzinfo=None)
+    return fecha
+
+
+def fecha_valida(fecha):
+    """
+    True si la fecha de una lectura es aceptable: ni en el futuro (más allá
+    de SENSOR_MAX_ADELANTO) ni anterior a la retención de datos en bruto.
+    Las de fuera caerían en la partición DEFAULT de sensor_lectura.
+    """
+    if fecha is None:
+        return True
+    fecha = fecha_local(fecha)
+    ahora = datetime.now()
+    return (ahora - timedelta(days=SENSOR_RAW_RETENTION_DAYS)
+            <= fecha <= ahora + timedelta(seconds=SENSOR_MAX_ADELANTO))
+
+
+# ============================================================
+# MAPA codigo_dispositivo -> id_sensor
+# ============================================================
+
+class SensorMap:
+    """Caché de sensores activos para no consultar la tabla sensor por lectura."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._map = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _reload(self):
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT codigo_dispositivo, id_sensor FROM sensor
+                WHERE activo = true AND codigo_dispositivo IS NOT NULL
+            """)
+            self._map = dict(cur.fetchall())
+            self._loaded_at = time.monotonic()
+        finally:
+            cur.close()
+            conn.close()
+
+    def get(self, codigo_dispositivo):
+        with self._lock:
+            edad = time.monotonic() - self._loaded_at
+            if edad > self.ttl:
+                self._reload()
+            elif codigo_dispositivo not in self._map and edad > SENSOR_MAP_MISS_COOLDOWN:
+                # Puede ser un sensor dado de alta hace poco
+                self._reload()
+            return self._map.get(codigo_dispositivo)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0.0
+
+
+sensor_map = SensorMap(SENSOR_MAP_TTL)
+
+
+# ============================================================
+# BUFFER DE ESCRITURA
+# ============================================================
+
+SQL_INSERT_LECTURAS = """
+    WITH nueva AS (
+        INSERT INTO sensor_lectura (id_sensor, valor, fecha_lectura)
+        VALUES %s
+        RETURNING id_sensor, valor, fecha_lectura
+    ),
+    -- Horas tocadas: las recalcula refrescar_rollups_pendientes()
+    -- (sensor_rollup_pendiente_migration.sql), también si son antiguas
+    pendiente AS (
+        INSERT INTO sensor_rollup_pendiente (id_sensor, hora)
+        SELECT DISTINCT id_sensor, date_trunc('hour', fecha_lectura)
+        FROM nueva
+        ORDER BY 1, 2
+        ON CONFLICT DO NOTHING
+    )
+    INSERT INTO sensor_ultima_lectura (id_sensor, valor, fecha_lectura)
+    SELECT DISTINCT ON (id_sensor) id_sensor, valor, fecha_lectura
+    FROM nueva
+    ORDER BY id_sensor, fecha_lectura DESC
+    ON CONFLICT (id_sensor) DO UPDATE
+        SET valor = EXCLUDED.valor,
+            fecha_lectura = EXCLUDED.fecha_lectura
+        WHERE sensor_ultima_lectura.fecha_lectura <= EXCLUDED.fecha_lectura
+"""
+
+
+class SensorWriteBuffer:
+    """
+    Acumula (id_sensor, valor, fecha_lectura) y los vuelca en bloque desde un
+    hilo propio. Con fecha_lectura=None se usa la hora de llegada al buffer
+    (no la del volcado).
+
+    Si un volcado falla por los datos (valor fuera de rango, sensor borrado,
+    fecha sin partición...) el lote se parte hasta aislar las filas malas, que
+    se apartan en `rechazadas` y se descartan; el resto se escribe. Solo los
+    errores de conexión devuelven el lote a la cola para reintentarlo.
+    """
+
+    def __init__(self, max_batch, interval, max_pending):
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = False
+        self._flush_lock = threading.Lock()
+        self._listeners = []
+        self.rechazadas = deque(maxlen=SENSOR_RECHAZADAS_MAX)   # (fila, error)
+
+        # Métricas
+        self.escritas = 0
+        self.descartadas = 0
+        self.volcados = 0
+        self.errores = 0
+        self.num_rechazadas = 0
+
+    def add_listener(self, fn):
+        """fn(filas) se llama tras cada volcado correcto con las filas escritas."""
+        self._listeners.append(fn)
+
+    def add(self, id_sensor, valor, fecha_lectura=None):
+        self.add_many([(id_sensor, valor, fecha_lectura)])
+
+    def add_many(self, filas):
+        # Hora de llegada (epoch) para las lecturas sin fecha; la BD la
+        # convierte en el volcado con to_timestamp()
+        recibida = time.time()
+        filas = [(id_sensor, valor, fecha_local(fecha), recibida)
+                 for id_sensor, valor, fecha in filas]
+        with self._cond:
+            self._pending.extend(filas)
+            exceso = len(self._pending) - self.max_pending
+            for _ in range(max(exceso, 0)):
+                self._pending.popleft()
+                self.descartadas += 1
+            if exceso > 0:
+                logger.warning(f"Buffer de sensores lleno: {exceso} lecturas descartadas")
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self):
+        """Vuelca todo lo pendiente. Devuelve el número de filas escritas."""
+        total = 0
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    n = min(len(self._pending), self.max_batch)
+                    lote = [self._pending.popleft() for _ in range(n)]
+                if not lote:
+                    return total
+                escritas, error = self._escribir(lote)
+                if escritas:
+                    total += len(escritas)
+                    self.escritas += len(escritas)
+                    self.volcados += 1
+                    for fn in self._listeners:
+                        try:
+                            fn(escritas)
+                        except Exception as e:
+                            logger.error(f"Error en listener del buffer de sensores: {repr(e)}")
+                if error is not None:
+                    self.errores += 1
+                    logger.error(f"Error volcando lecturas de sensores: {repr(error)}")
+                    return total
+
+    def _escribir(self, lote):
+        """
+        Escribe el lote partiéndolo en dos cada vez que la BD rechaza los
+        datos, hasta aislar las filas que fallan. Devuelve (filas escritas,
+        error de conexión o None); en ese caso lo no escrito vuelve a la cola.
+        """
+        escritas = []
+        trozos = [lote]
+        while trozos:
+            trozo = trozos.pop()
+            try:
+                self._write(trozo)
+            except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                if len(trozo) == 1:
+                    self._rechazar(trozo[0], e)
+                else:
+                    mitad = len(trozo) // 2
+                    trozos += [trozo[mitad:], trozo[:mitad]]
+                continue
+            except Exception as e:
+                # BD caída o similar: se reintenta en el siguiente ciclo
+                resto = trozo + [f for t in reversed(trozos) for f in t]
+                with self._cond:
+                    self._pending.extendleft(reversed(resto))
+                return escritas, e
+            escritas.extend(trozo)
+        return escritas, None
+
+    def _rechazar(self, fila, error):
+        self.num_rechazadas += 1
+        self.rechazadas.append((fila[:3], str(error).strip()))
+        logger.error(f"Lectura de sensor descartada {fila[:3]}: {repr(error)}")
+
+    def _write(self, lote):
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            execute_values(
+                cur, SQL_INSERT_LECTURAS, lote,
+                template="(%s, %s, COALESCE(%s::timestamp, to_timestamp(%s)::timestamp))",
+                page_size=len(lote)
+            )
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+    # ---------- hilo de volcado ----------
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="sensor-buffer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stop and len(self._pending) < self.max_batch:
+                    self._cond.wait(self.interval)
+                if self._stop:
+                    return
+            self.flush()
+
+    def stats(self):
+        return {
+            "pendientes": self.pending(),
+            "escritas": self.escritas,
+            "volcados": self.volcados,
+            "descartadas": self.descartadas,
+            "errores": self.errores,
+            "rechazadas": self.num_rechazadas,
+            "ultimas_rechazadas": [
+                {"id_sensor": f[0], "valor": f[1], "fecha_lectura": f[2], "error": e}
+                for f, e in list(self.rechazadas)[-10:]
+            ],
+        }
+
+
+sensor_buffer = SensorWriteBuffer(
+    SENSOR_BUFFER_MAX_BATCH, SENSOR_BUFFER_INTERVAL, SENSOR_BUFFER_MAX_PENDING
+)
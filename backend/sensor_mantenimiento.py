@@ -0,0 +1,163 @@
+# backend/sensor_mantenimiento.py
+#
+# Mantenimiento periódico de sensor_lectura (ver
+# PostgreSQL_archivos/sensor_lectura_particionado_migration.sql):
+#   - crea las particiones mensuales de los próximos meses
+#   - refresca los rollups por hora y por día de las horas con lecturas
+#     nuevas (sensor_rollup_pendiente, la rellena sensor_buffer)
+#   - borra las particiones de datos en bruto fuera de la retención
+#
+# Se ejecuta en un hilo del backend y también a mano:
+#   python -m backend.sensor_mantenimiento
+
+import os
+import re
+import threading
+import logging
+from datetime import date
+
+from backend.database import get_connection
+
+logger = logging.getLogger(__name__)
+
+SENSOR_RAW_RETENTION_DAYS = int(os.getenv("SENSOR_RAW_RETENTION_DAYS", "180"))   # días de lecturas en bruto
+SENSOR_PARTITIONS_AHEAD = int(os.getenv("SENSOR_PARTITIONS_AHEAD", "2"))         # meses creados por adelantado
+SENSOR_MAINTENANCE_INTERVAL = float(os.getenv("SENSOR_MAINTENANCE_INTERVAL", "300"))
+
+# Solo un proceso (de los workers de uvicorn) hace el mantenimiento a la vez
+_ADVISORY_LOCK_ID = 74201007
+
+_RE_PARTICION = re.compile(r"^sensor_lectura_(\d{4})(\d{2})$")
+
+
+def crear_particiones(cur, meses_adelante=SENSOR_PARTITIONS_AHEAD):
+    cur.execute("""
+        SELECT crear_particion_sensor_lectura(
+            (date_trunc('month', NOW()) + make_interval(months => i))::date
+        )
+        FROM generate_series(0, %s) AS i
+    """, [meses_adelante])
+
+
+def refrescar_rollups(cur):
+    """Recalcula las horas (y sus días) con lecturas nuevas. Devuelve cuántas."""
+    cur.execute("SELECT refrescar_rollups_pendientes()")
+    return cur.fetchone()[0]
+
+
+def refrescar_rollups_rango(cur, desde, hasta):
+    """
+    Como refrescar_rollups pero solo con las horas pendientes de [desde, hasta)
+    (ver sensor_rollup_pendiente_rango_migration.sql), bajo el mismo lock que
+    el mantenimiento. Si el mantenimiento está en marcha devuelve None sin
+    hacer nada: ya está refrescando toda la cola. El lock es de transacción,
+    se suelta con el commit/rollback de quien llama.
+    """
+    cur.execute("SELECT pg_try_advisory_xact_lock(%s)", [_ADVISORY_LOCK_ID])
+    if not cur.fetchone()[0]:
+        return None
+    cur.execute("SELECT refrescar_rollups_pendientes(%s, %s)", [desde, hasta])
+    return cur.fetchone()[0]
+
+
+def purgar_datos_brutos(cur, dias=SENSOR_RAW_RETENTION_DAYS):
+    """
+    Elimina las particiones mensuales completamente anteriores a la
+    retención. Antes de borrar una partición se recalculan sus rollups,
+    así los agregados por hora/día se conservan.
+    Devuelve la lista de particiones borradas.
+    """
+    cur.execute("SELECT (CURRENT_DATE - make_interval(days => %s))::date", [dias])
+    limite = cur.fetchone()[0]
+
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'sensor_lectura'::regclass
+    """)
+    borradas = []
+    for (nombre,) in cur.fetchall():
+        m = _RE_PARTICION.match(nombre)
+        if not m:
+            continue
+        inicio = date(int(m.group(1)), int(m.group(2)), 1)
+        fin = date(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+        if fin > limite:
+            continue
+        cur.execute("SELECT refrescar_rollups_sensor(%s, %s)", [inicio, fin])
+        cur.execute(f'DROP TABLE "{nombre}"')
+        borradas.append(nombre)
+
+    cur.execute("DELETE FROM sensor_lectura_default WHERE fecha_lectura < %s", [limite])
+    return borradas
+
+
+def ejecutar_mantenimiento():
+    """Una pasada completa. Devuelve False si otro proceso ya la estaba haciendo."""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", [_ADVISORY_LOCK_ID])
+        if not cur.fetchone()[0]:
+            conn.rollback()
+            return False
+
+        try:
+            # Cada paso en su propia transacción (para no retener locks de
+            # DDL) y con su propio try: que falle uno no para los demás
+            for paso in (crear_particiones, refrescar_rollups, purgar_datos_brutos):
+                try:
+                    resultado = paso(cur)
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Mantenimiento de sensor_lectura, {paso.__name__}: {repr(e)}")
+                    continue
+                if paso is purgar_datos_brutos and resultado:
+                    logger.info(f"Particiones de sensor_lectura purgadas: {resultado}")
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", [_ADVISORY_LOCK_ID])
+            conn.commit()
+        return True
+    finally:
+        cur.close()
+        conn.close()
+
+
+class MantenimientoSensores:
+    """Hilo que lanza ejecutar_mantenimiento() cada `interval` segundos."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sensor-mantenimiento", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                ejecutar_mantenimiento()
+            except Exception as e:
+                logger.error(f"Error en el mantenimiento de sensor_lectura: {repr(e)}")
+            self._stop.wait(self.interval)
+
+
+mantenimiento_sensores = MantenimientoSensores(SENSOR_MAINTENANCE_INTERVAL)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    ejecutar_mantenimiento()
+    print("Mantenimiento de sensor_lectura completado")
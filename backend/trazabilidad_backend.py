@@ -6,7 +6,12 @@ from pydantic import BaseModel
 from typing import Optional, List
 from datetime import date, datetime, timedelta
 from backend.database import get_connection
+from psycopg2.extras import execute_values
+from psycopg2.errors import UniqueViolation
 from backend.auth.dependencies import get_current_user
+from backend.camaras_live import camaras_publisher
+from backend.pallet_estado import aplicar_evento
+from backend.lotes_activos import lotes_activos
 from fastapi import Request
 
 import logging
@@ -36,6 +41,9 @@ class FechaSalidaUpdate(BaseModel):
 class PalletMontadoIn(BaseModel):
     codigo_qr_pallet: str
 
+class PalletsMontadosIn(BaseModel):
+    codigos_qr_pallet: List[str]
+
 class EntradaCamaraIn(BaseModel):
     codigo_qr_camara: str
     codigo_qr_pallet: str
@@ -44,6 +52,15 @@ class SalidaCamaraIn(BaseModel):
     codigo_qr_pallet: str
     confirmar: bool = False
 
+class EntradaCamaraLoteIn(BaseModel):
+    codigo_qr_camara: str
+    codigos_qr_pallet: List[str]
+
+class SalidaCamaraLoteIn(BaseModel):
+    codigos_qr_pallet: List[str]
+    codigo_qr_camara: Optional[str] = None  # si se indica, los pallets deben estar en ella
+    confirmar: bool = False
+
 class IniciarSesionIn(BaseModel):
     id_operario: Optional[int] = None
 
@@ -54,6 +71,10 @@ class PalletCribadoIn(BaseModel):
 class BigBagLlenoIn(BaseModel):
     id_sesion: int
     peso: Optional[float] = None
+    codigo_lote: Optional[str] = None  # etiqueta preimpresa (ver /lote_final/reservar_codigos)
+
+class ReservarCodigosIn(BaseModel):
+    cantidad: int
 
 class TerminarSesionIn(BaseModel):
     id_sesion: int
@@ -62,6 +83,9 @@ class TerminarSesionIn(BaseModel):
 class RegistrarQRIn(BaseModel):
     codigo_qr: str
 
+class RegistrarQRLoteIn(BaseModel):
+    codigos_qr: List[str]
+
 class IncidenciaIn(BaseModel):
     titulo: str
     descripcion: str
@@ -79,55 +103,43 @@ import re
 
 PREFIJOS_HUEVO = {"BFS", "TEN"}
 
+RE_QR_CAMARA = re.compile(r"^CAMARA-(\d+)$")
+RE_QR_PALLET = re.compile(r"^PALLET-(\d+)$")
+RE_QR_HUEVO = re.compile(r"^([A-Z]+)-(\d+)$")
+RE_QR_ALIMENTO = re.compile(r"^([A-Z][A-Z0-9]*(?:-[A-Z][A-Z0-9]*)+)-(\d+)$")
+
+
 def parse_qr(codigo: str):
     codigo = codigo.strip().upper()
-    print(f"[parse_qr] INPUT: '{codigo}'")
-    print(f"[parse_qr] REPR: {repr(codigo)}")  # muestra caracteres ocultos
 
     # Cámara
-    m = re.match(r"^CAMARA-(\d+)$", codigo)
-    print(f"[parse_qr] camara match: {m}")
+    m = RE_QR_CAMARA.match(codigo)
     if m:
         return "camara", int(m.group(1))
 
     # Pallet
-    m = re.match(r"^PALLET-(\d+)$", codigo)
-    print(f"[parse_qr] pallet match: {m}")
+    m = RE_QR_PALLET.match(codigo)
     if m:
         return "pallet", int(m.group(1))
 
     # Lote huevo
-    m = re.match(r"^([A-Z]+)-(\d+)$", codigo)
-    print(f"[parse_qr] huevo candidato match: {m}")
-    if m:
-        print(f"[parse_qr] huevo prefijo extraído: '{m.group(1)}', en PREFIJOS: {m.group(1) in PREFIJOS_HUEVO}")
+    m = RE_QR_HUEVO.match(codigo)
     if m and m.group(1) in PREFIJOS_HUEVO:
         return "lote_huevo", int(m.group(2))
 
     # Lote alimento
-    m = re.match(r"^([A-Z][A-Z0-9]*(?:-[A-Z][A-Z0-9]*)+)-(\d+)$", codigo)
-    print(f"[parse_qr] alimento match: {m}")
+    m = RE_QR_ALIMENTO.match(codigo)
     if m:
         return "lote_alimento", int(m.group(2))
 
-    print(f"[parse_qr] NINGÚN PATRÓN COINCIDIÓ")
+    logger.debug(f"parse_qr: ningún patrón coincide con {codigo!r}")
     return None, None
 
 
 def qr_exists(cur, codigo):
-    tables = [
-        "Camara",
-        "Pallet",
-        "Lote_Alimento",
-        "Lote_Huevo"
-    ]
-
-    for t in tables:
-        cur.execute(f"SELECT 1 FROM {t} WHERE codigo_qr = %s", [codigo])
-        if cur.fetchone():
-            return True
-
-    return False
+    # qr_registro cubre Camara, Pallet, Lote_Alimento y Lote_Huevo
+    cur.execute("SELECT 1 FROM qr_registro WHERE codigo_qr = %s", [codigo])
+    return cur.fetchone() is not None
 
 
 def _mapear_motivo_cancelacion(motivo: str) -> str:
@@ -145,19 +157,35 @@ def log_engorde_event(
     id_camara=None, id_lote_alimento=None, id_lote_huevo=None,
     estado_anterior=None, estado_nuevo=None, usuario=None, metadata=None
 ):
+    # Las claves que se consultan (sesión de procesado y fechas de cámara) se
+    # guardan también en columnas propias e indexadas, ver
+    # PostgreSQL_archivos/engorde_columnas_migration.sql. En la misma
+    # transacción se actualiza pallet_estado_actual.
+    meta = metadata or {}
     cur.execute("""
         INSERT INTO engorde (
             id_pallet, tipo_evento, id_camara,
             id_lote_alimento, id_lote_huevo,
-            estado_anterior, estado_nuevo, usuario, metadata
+            estado_anterior, estado_nuevo, usuario, metadata,
+            id_sesion_procesado, fecha_entrada, fecha_salida_prevista
         )
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
     """, [
         id_pallet, tipo_evento, id_camara,
         id_lote_alimento, id_lote_huevo,
         estado_anterior, estado_nuevo, usuario,
-        json.dumps(metadata) if metadata else None
+        json.dumps(metadata) if metadata else None,
+        meta.get("id_sesion_procesado"),
+        meta.get("fecha_entrada"),
+        meta.get("fecha_salida_prevista")
     ])
+    aplicar_evento(
+        cur, id_pallet, tipo_evento,
+        estado_nuevo=estado_nuevo, id_camara=id_camara,
+        id_lote_alimento=id_lote_alimento, id_lote_huevo=id_lote_huevo,
+        fecha_entrada=meta.get("fecha_entrada"),
+        fecha_salida_prevista=meta.get("fecha_salida_prevista")
+    )
 
 
 def _get_lote_alimento_activo(cur):
@@ -184,83 +212,172 @@ def _get_lote_huevo_activo(cur):
     return dict(zip(["id_lote_huevo", "origen"], row)) if row else None
 
 
-def _get_pallet_y_engorde(cur, codigo_qr):
-    logger.info(f"EXEC _get_pallet_y_engorde con: {codigo_qr}")
-    try:
-        cur.execute("""
-            SELECT id_pallet, estado, id_camara
-            FROM Pallet WHERE codigo_qr = %s
-        """, [codigo_qr])
-        row = cur.fetchone()
+def _get_pallet_y_estado(cur, codigo_qr):
+    """
+    Pallet + su fila de pallet_estado_actual (lotes, cámara y fechas según
+    engorde) en una sola lectura. El segundo valor es None si el pallet aún
+    no tiene eventos.
+    """
+    cur.execute("""
+        SELECT p.id_pallet, p.estado, p.id_camara,
+               pe.id_pallet IS NOT NULL AS tiene_estado,
+               pe.id_lote_alimento, pe.id_lote_huevo, pe.id_camara,
+               pe.estado, pe.fecha_entrada, pe.fecha_salida_prevista,
+               pe.ultimo_evento, pe.fecha_ultimo_evento
+        FROM Pallet p
+        LEFT JOIN pallet_estado_actual pe ON pe.id_pallet = p.id_pallet
+        WHERE p.codigo_qr = %s
+    """, [codigo_qr])
+    row = cur.fetchone()
+    if not row:
+        return None, None
+
+    pallet_dict = {"id_pallet": row[0], "estado": row[1], "id_camara": row[2]}
+    if not row[3]:
+        return pallet_dict, None
+
+    estado_dict = {
+        "id_lote_alimento": row[4],
+        "id_lote_huevo": row[5],
+        "id_camara": row[6],
+        "estado": row[7],
+        "fecha_entrada": row[8],
+        "fecha_salida_prevista": row[9],
+        "ultimo_evento": row[10],
+        "fecha_ultimo_evento": row[11],
+    }
+    return pallet_dict, estado_dict
 
-        if not row:
-            return None, None
 
-        pallet_dict = {"id_pallet": row[0], "estado": row[1], "id_camara": row[2]}
+RE_CODIGO_LOTE = re.compile(r"^IN-(\d{8})-(\d+)$")
+MAX_CODIGOS_RESERVA = 500
 
-        cur.execute("""
-            SELECT
-                id_lote_alimento, id_lote_huevo, id_camara,
-                estado_anterior, estado_nuevo, metadata, timestamp
-            FROM engorde
-            WHERE id_pallet = %s
-            ORDER BY timestamp DESC
-            LIMIT 1
-        """, [row[0]])
-
-        engorde_row = cur.fetchone()
-        if not engorde_row:
-            return pallet_dict, None
-
-        metadata = engorde_row[5]
-        if isinstance(metadata, str):
-            metadata = json.loads(metadata)
-        elif metadata is None:
-            metadata = {}
-
-        engorde_dict = {
-            "id_lote_alimento": engorde_row[0],
-            "id_lote_huevo": engorde_row[1],
-            "id_camara": engorde_row[2],
-            "estado_anterior": engorde_row[3],
-            "estado_nuevo": engorde_row[4],
-            "metadata": metadata,
-            "timestamp": engorde_row[6],
-        }
 
-        return pallet_dict, engorde_dict
+def _formatear_codigo_lote(fecha: date, numero: int) -> str:
+    # Dos dígitos como mínimo; a partir del 100 crece sin truncar
+    return f"IN-{fecha.strftime('%Y%m%d')}-{str(numero).zfill(2)}"
 
-    except Exception as e:
-        logger.error(f"ERROR EN _get_pallet_y_engorde: {repr(e)}")
-        raise
+
+def _reservar_codigos_lote(cur, cantidad: int = 1, fecha: Optional[date] = None) -> List[str]:
+    """
+    Reserva `cantidad` códigos consecutivos de la secuencia diaria
+    (lote_final_secuencia). El contador queda bloqueado hasta el commit de la
+    transacción, así que dos peticiones a la vez nunca obtienen el mismo código.
+    """
+    fecha = fecha or date.today()
+    cur.execute("""
+        INSERT INTO lote_final_secuencia AS s (fecha, ultimo)
+        VALUES (%s, %s)
+        ON CONFLICT (fecha) DO UPDATE SET ultimo = s.ultimo + EXCLUDED.ultimo
+        RETURNING ultimo
+    """, [fecha, cantidad])
+    ultimo = cur.fetchone()[0]
+    return [_formatear_codigo_lote(fecha, n) for n in range(ultimo - cantidad + 1, ultimo + 1)]
 
 
 def _generar_codigo_lote(cur, tipo_producto: str) -> str:
     """Genera código tipo IN-YYYYMMDD-NN con secuencia diaria."""
-    hoy = date.today()
-    prefijo = f"IN-{hoy.strftime('%Y%m%d')}-"
+    return _reservar_codigos_lote(cur, 1)[0]
 
-    cur.execute("""
-        SELECT codigo_lote FROM lote_final
-        WHERE codigo_lote LIKE %s
-        ORDER BY codigo_lote DESC
-        LIMIT 1
-    """, [f"{prefijo}%"])
 
+def _validar_codigo_reservado(cur, codigo_lote: str) -> str:
+    """Comprueba que un código preimpreso salió de la secuencia de su día."""
+    codigo_lote = codigo_lote.strip().upper()
+    m = RE_CODIGO_LOTE.match(codigo_lote)
+    if not m:
+        raise HTTPException(400, "Código de lote no válido")
+    try:
+        fecha = datetime.strptime(m.group(1), "%Y%m%d").date()
+    except ValueError:
+        raise HTTPException(400, "Código de lote no válido")
+
+    cur.execute("SELECT ultimo FROM lote_final_secuencia WHERE fecha = %s", [fecha])
     row = cur.fetchone()
-    if row:
-        ultimo = int(row[0].split("-")[-1])
-        siguiente = ultimo + 1
-    else:
-        siguiente = 1
+    if not row or int(m.group(2)) > row[0]:
+        raise HTTPException(400, "El código de lote no ha sido reservado")
 
-    return f"{prefijo}{str(siguiente).zfill(2)}"
+    cur.execute("SELECT 1 FROM lote_final WHERE codigo_lote = %s", [codigo_lote])
+    if cur.fetchone():
+        raise HTTPException(400, "El código de lote ya está usado")
+    return codigo_lote
 
 
 # ============================================================
 # SCAN QR — entrada única
 # ============================================================
 
+def _scan_camara(cur, codigo_qr):
+    cur.execute("""
+        SELECT c.id_camara, c.nombre, c.capacidad_max, c.codigo_qr,
+               (SELECT COUNT(*) FROM Pallet p
+                WHERE p.id_camara = c.id_camara AND p.estado = 'en_camara')
+        FROM Camara c WHERE c.codigo_qr = %s
+    """, [codigo_qr])
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {
+        "id_camara": row[0], "nombre": row[1],
+        "capacidad_max": row[2], "codigo_qr": row[3],
+        "pallets_dentro": row[4],
+        "huecos_libres": row[2] - row[4]
+    }
+
+
+def _scan_pallet(cur, codigo_qr):
+    pallet, estado = _get_pallet_y_estado(cur, codigo_qr)
+    if not pallet:
+        return None
+
+    data = {**pallet}
+    if estado:
+        data.update({
+            "id_lote_alimento_traz": estado["id_lote_alimento"],
+            "id_lote_huevo_traz": estado["id_lote_huevo"],
+            "fecha_entrada_camara": str(estado["fecha_entrada"]) if estado["fecha_entrada"] else None,
+            "fecha_salida_prevista": str(estado["fecha_salida_prevista"]) if estado["fecha_salida_prevista"] else None,
+        })
+    return data
+
+
+def _scan_lote_alimento(cur, codigo_qr):
+    cur.execute("""
+        SELECT id_lote_alimento, descripcion, fecha_llegada, activo
+        FROM Lote_Alimento WHERE codigo_qr = %s
+    """, [codigo_qr])
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {
+        "id_lote_alimento": row[0], "descripcion": row[1],
+        "fecha_llegada": row[2].strftime("%Y-%m-%d") if row[2] else None,
+        "activo": row[3]
+    }
+
+
+def _scan_lote_huevo(cur, codigo_qr):
+    cur.execute("""
+        SELECT id_lote_huevo, origen, fecha_registro, activo
+        FROM Lote_Huevo WHERE codigo_qr = %s
+    """, [codigo_qr])
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {
+        "id_lote_huevo": row[0], "origen": row[1],
+        "fecha_registro": row[2].strftime("%Y-%m-%d") if row[2] else None,
+        "activo": row[3]
+    }
+
+
+SCANNERS = {
+    "camara": _scan_camara,
+    "pallet": _scan_pallet,
+    "lote_alimento": _scan_lote_alimento,
+    "lote_huevo": _scan_lote_huevo,
+}
+
+
 @router.get("/scan/{codigo_qr}")
 def scan_qr(codigo_qr: str):
     conn = get_connection()
@@ -270,73 +387,20 @@ def scan_qr(codigo_qr: str):
     logger.info(f"QR recibido: {codigo_qr}")
 
     try:
-        # ¿ES CÁMARA?
-        cur.execute("""
-            SELECT id_camara, nombre, capacidad_max, codigo_qr
-            FROM Camara WHERE codigo_qr = %s
-        """, [codigo_qr])
+        # El prefijo del código ya dice de qué tabla es: vamos directos
+        tipo, _ = parse_qr(codigo_qr)
+        if tipo:
+            datos = SCANNERS[tipo](cur, codigo_qr)
+            if datos:
+                return {"tipo": tipo, "datos": datos}
+
+        # Códigos antiguos o con formato libre: tipo real según qr_registro
+        cur.execute("SELECT tipo FROM qr_registro WHERE codigo_qr = %s", [codigo_qr])
         row = cur.fetchone()
-        if row:
-            cur.execute("""
-                SELECT COUNT(*) FROM Pallet
-                WHERE id_camara = %s AND estado = 'en_camara'
-            """, [row[0]])
-            pallets_dentro = cur.fetchone()[0]
-            return {
-                "tipo": "camara",
-                "datos": {
-                    "id_camara": row[0], "nombre": row[1],
-                    "capacidad_max": row[2], "codigo_qr": row[3],
-                    "pallets_dentro": pallets_dentro,
-                    "huecos_libres": row[2] - pallets_dentro
-                }
-            }
-
-        # ¿ES PALLET?
-        pallet, engorde = _get_pallet_y_engorde(cur, codigo_qr)
-        if pallet:
-            data = {**pallet}
-            if engorde:
-                metadata = engorde["metadata"]
-                data.update({
-                    "id_lote_alimento_traz": engorde["id_lote_alimento"],
-                    "id_lote_huevo_traz": engorde["id_lote_huevo"],
-                    "fecha_entrada_camara": metadata.get("fecha_entrada"),
-                    "fecha_salida_prevista": metadata.get("fecha_salida_prevista"),
-                })
-            return {"tipo": "pallet", "datos": data}
-
-        # ¿ES LOTE ALIMENTO?
-        cur.execute("""
-            SELECT id_lote_alimento, descripcion, fecha_llegada, activo
-            FROM Lote_Alimento WHERE codigo_qr = %s
-        """, [codigo_qr])
-        row = cur.fetchone()
-        if row:
-            return {
-                "tipo": "lote_alimento",
-                "datos": {
-                    "id_lote_alimento": row[0], "descripcion": row[1],
-                    "fecha_llegada": row[2].strftime("%Y-%m-%d") if row[2] else None,
-                    "activo": row[3]
-                }
-            }
-
-        # ¿ES LOTE HUEVO?
-        cur.execute("""
-            SELECT id_lote_huevo, origen, fecha_registro, activo
-            FROM Lote_Huevo WHERE codigo_qr = %s
-        """, [codigo_qr])
-        row = cur.fetchone()
-        if row:
-            return {
-                "tipo": "lote_huevo",
-                "datos": {
-                    "id_lote_huevo": row[0], "origen": row[1],
-                    "fecha_registro": row[2].strftime("%Y-%m-%d") if row[2] else None,
-                    "activo": row[3]
-                }
-            }
+        if row and row[0] != tipo:
+            datos = SCANNERS[row[0]](cur, codigo_qr)
+            if datos:
+                return {"tipo": row[0], "datos": datos}
 
         raise HTTPException(status_code=404, detail="QR no reconocido")
 
@@ -369,6 +433,7 @@ def activar_lote_alimento(codigo_qr: str):
         cur.execute("UPDATE Lote_Alimento SET activo = FALSE WHERE activo = TRUE AND id_lote_alimento != %s", [nuevo_id])
         cur.execute("UPDATE Lote_Alimento SET activo = TRUE WHERE id_lote_alimento = %s", [nuevo_id])
         conn.commit()
+        lotes_activos.invalidate()
         return {"message": "Lote de alimento activado", "id_lote_alimento": nuevo_id}
     finally:
         cur.close()
@@ -402,6 +467,7 @@ def activar_lote_huevo(data: LoteHuevoIn):
             raise HTTPException(404, "Lote de huevo no encontrado")
 
         conn.commit()
+        lotes_activos.invalidate()
         return {"message": "Lote de huevo activado", "id_lote_huevo": nuevo_id}
     finally:
         cur.close()
@@ -412,6 +478,46 @@ def activar_lote_huevo(data: LoteHuevoIn):
 # MONTAR PALLET
 # ============================================================
 
+def _montar_pallets(cur, ids_pallet, lotes_alimento, lotes_huevo):
+    """
+    Asigna los lotes activos a los pallets (ya comprobados como 'vacio'):
+    todas las filas de pallet_lotes en un solo INSERT, un evento MONTADO por
+    pallet y un único UPDATE de estado.
+    """
+    filas = []
+    for id_pallet in ids_pallet:
+        filas.extend((id_pallet, "alimento", id_la, None) for id_la in lotes_alimento)
+        filas.extend((id_pallet, "huevo", None, id_lh) for id_lh in lotes_huevo)
+    execute_values(cur, """
+        INSERT INTO pallet_lotes (id_pallet, tipo, id_lote_alimento, id_lote_huevo)
+        VALUES %s
+    """, filas, page_size=len(filas))
+
+    for id_pallet in ids_pallet:
+        # Log engorde (guardamos el primero como referencia rápida)
+        log_engorde_event(
+            cur, id_pallet, "MONTADO",
+            estado_anterior="vacio", estado_nuevo="preparado",
+            id_lote_alimento=lotes_alimento[0] if lotes_alimento else None,
+            id_lote_huevo=lotes_huevo[0] if lotes_huevo else None
+        )
+
+    cur.execute(
+        "UPDATE Pallet SET estado = 'preparado' WHERE id_pallet = ANY(%s)",
+        [list(ids_pallet)]
+    )
+
+
+def _lotes_para_montar(cur):
+    lotes_alimento, lotes_huevo = lotes_activos.get(cur)
+    if not lotes_alimento and not lotes_huevo:
+        raise HTTPException(
+            400,
+            "No hay lotes activos. Activa al menos un lote antes de montar."
+        )
+    return lotes_alimento, lotes_huevo
+
+
 @router.post("/pallet/montar")
 def montar_pallet(data: PalletMontadoIn):
     conn = get_connection()
@@ -427,56 +533,69 @@ def montar_pallet(data: PalletMontadoIn):
         if row[1] != "vacio":
             raise HTTPException(400, "El pallet no está vacío")
 
-        id_pallet = row[0]
+        # Todos los lotes activos ahora mismo
+        lotes_alimento, lotes_huevo = _lotes_para_montar(cur)
 
-        # Obtener TODOS los lotes activos ahora mismo
-        cur.execute(
-            "SELECT id_lote_alimento FROM Lote_Alimento WHERE activo = TRUE"
-        )
-        lotes_alimento = [r[0] for r in cur.fetchall()]
+        _montar_pallets(cur, [row[0]], lotes_alimento, lotes_huevo)
+        conn.commit()
 
-        cur.execute(
-            "SELECT id_lote_huevo FROM Lote_Huevo WHERE activo = TRUE"
-        )
-        lotes_huevo = [r[0] for r in cur.fetchall()]
+        return {
+            "message": "Pallet montado",
+            "lotes_alimento_asignados": len(lotes_alimento),
+            "lotes_huevo_asignados": len(lotes_huevo)
+        }
+    finally:
+        cur.close()
+        conn.close()
 
-        if not lotes_alimento and not lotes_huevo:
-            raise HTTPException(
-                400,
-                "No hay lotes activos. Activa al menos un lote antes de montar."
-            )
 
-        # Registrar en pallet_lotes
-        for id_la in lotes_alimento:
-            cur.execute("""
-                INSERT INTO pallet_lotes (id_pallet, tipo, id_lote_alimento)
-                VALUES (%s, 'alimento', %s)
-            """, [id_pallet, id_la])
+MAX_PALLETS_LOTE = 200
 
-        for id_lh in lotes_huevo:
-            cur.execute("""
-                INSERT INTO pallet_lotes (id_pallet, tipo, id_lote_huevo)
-                VALUES (%s, 'huevo', %s)
-            """, [id_pallet, id_lh])
 
-        # Log engorde (guardamos el primero como referencia rápida)
-        log_engorde_event(
-            cur, id_pallet, "MONTADO",
-            estado_anterior="vacio", estado_nuevo="preparado",
-            id_lote_alimento=lotes_alimento[0] if lotes_alimento else None,
-            id_lote_huevo=lotes_huevo[0] if lotes_huevo else None
-        )
+@router.post("/pallet/montar/lote")
+def montar_pallets_lote(data: PalletsMontadosIn):
+    """
+    Monta varios pallets de una vez (preparación de primera hora) en una sola
+    transacción. Los pallets no encontrados o que no están vacíos no impiden
+    montar el resto; se devuelve el resultado de cada uno.
+    """
+    if len(data.codigos_qr_pallet) > MAX_PALLETS_LOTE:
+        raise HTTPException(400, f"Máximo {MAX_PALLETS_LOTE} pallets por petición")
 
-        cur.execute(
-            "UPDATE Pallet SET estado = 'preparado' WHERE id_pallet = %s",
-            [id_pallet]
-        )
+    codigos = list(dict.fromkeys(c.strip().upper() for c in data.codigos_qr_pallet))
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        lotes_alimento, lotes_huevo = _lotes_para_montar(cur)
+
+        cur.execute("""
+            SELECT codigo_qr, id_pallet, estado FROM Pallet
+            WHERE codigo_qr = ANY(%s)
+            FOR UPDATE
+        """, [codigos])
+        pallets = {r[0]: (r[1], r[2]) for r in cur.fetchall()}
+
+        resultados = []
+        ids_montar = []
+        for codigo in codigos:
+            if codigo not in pallets:
+                resultados.append({"codigo_qr": codigo, "ok": False, "error": "Pallet no encontrado"})
+            elif pallets[codigo][1] != "vacio":
+                resultados.append({"codigo_qr": codigo, "ok": False, "error": "El pallet no está vacío"})
+            else:
+                ids_montar.append(pallets[codigo][0])
+                resultados.append({"codigo_qr": codigo, "ok": True})
+
+        if ids_montar:
+            _montar_pallets(cur, ids_montar, lotes_alimento, lotes_huevo)
         conn.commit()
 
         return {
-            "message": "Pallet montado",
+            "message": f"{len(ids_montar)} pallets montados",
             "lotes_alimento_asignados": len(lotes_alimento),
-            "lotes_huevo_asignados": len(lotes_huevo)
+            "lotes_huevo_asignados": len(lotes_huevo),
+            "resultados": resultados
         }
     finally:
         cur.close()
@@ -492,7 +611,8 @@ def entrada_camara(data: EntradaCamaraIn):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id_camara, capacidad_max FROM Camara WHERE codigo_qr = %s", [data.codigo_qr_camara])
+        # FOR UPDATE: dos entradas simultáneas no pueden pasarse de capacidad
+        cur.execute("SELECT id_camara, capacidad_max FROM Camara WHERE codigo_qr = %s FOR UPDATE", [data.codigo_qr_camara])
         camara = cur.fetchone()
         if not camara:
             raise HTTPException(404, "Cámara no encontrada")
@@ -522,6 +642,7 @@ def entrada_camara(data: EntradaCamaraIn):
         )
         cur.execute("UPDATE Pallet SET estado = 'en_camara', id_camara = %s WHERE id_pallet = %s", [id_camara, pallet[0]])
         conn.commit()
+        camaras_publisher.notificar()
 
         return {
             "message": "Entrada a cámara OK",
@@ -568,32 +689,22 @@ def salida_camara(data: SalidaCamaraIn):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        pallet, _ = _get_pallet_y_engorde(cur, data.codigo_qr_pallet)
+        pallet, estado = _get_pallet_y_estado(cur, data.codigo_qr_pallet)
         if not pallet:
             raise HTTPException(404, "Pallet no encontrado")
         if pallet["estado"] != "en_camara":
             raise HTTPException(400, "No está en cámara")
 
-        cur.execute("""
-            SELECT metadata FROM engorde
-            WHERE id_pallet = %s AND tipo_evento = 'ENTRADA_CAMARA'
-            ORDER BY timestamp DESC LIMIT 1
-        """, [pallet["id_pallet"]])
-        row = cur.fetchone()
-        metadata = {}
-        if row and row[0]:
-            metadata = row[0] if not isinstance(row[0], str) else json.loads(row[0])
-
-        fecha_entrada = metadata.get("fecha_entrada")
-        fecha_salida = metadata.get("fecha_salida_prevista")
+        fecha_entrada = estado["fecha_entrada"] if estado else None
+        fecha_salida = estado["fecha_salida_prevista"] if estado else None
         hoy = date.today()
         dias = 0
         cumplido = False
 
         if fecha_entrada:
-            dias = (hoy - date.fromisoformat(fecha_entrada)).days
+            dias = (hoy - fecha_entrada).days
         if fecha_salida:
-            cumplido = hoy >= date.fromisoformat(fecha_salida)
+            cumplido = hoy >= fecha_salida
 
         if data.confirmar:
             # Estado: en_camara → fuera_camara (listo para cribar)
@@ -608,11 +719,12 @@ def salida_camara(data: SalidaCamaraIn):
                 metadata={"fecha_salida_real": str(hoy)}
             )
             conn.commit()
+            camaras_publisher.notificar()
 
         return {
             "message": "Salida procesada",
-            "fecha_entrada_camara": metadata.get("fecha_entrada"),
-            "fecha_salida_prevista": metadata.get("fecha_salida_prevista"),
+            "fecha_entrada_camara": str(fecha_entrada) if fecha_entrada else None,
+            "fecha_salida_prevista": str(fecha_salida) if fecha_salida else None,
             "dias_en_camara": dias,
             "cumplido_plazo": cumplido
         }
@@ -621,6 +733,186 @@ def salida_camara(data: SalidaCamaraIn):
         conn.close()
 
 
+# ============================================================
+# ENTRADA / SALIDA DE CÁMARA EN BLOQUE
+# ============================================================
+
+MAX_PALLETS_CAMARA_LOTE = 200
+
+
+def _normalizar_codigos(codigos):
+    codigos = list(dict.fromkeys(c.strip().upper() for c in codigos))
+    if len(codigos) > MAX_PALLETS_CAMARA_LOTE:
+        raise HTTPException(400, f"Máximo {MAX_PALLETS_CAMARA_LOTE} pallets por petición")
+    return codigos
+
+
+@router.post("/camara/entrada/lote")
+def entrada_camara_lote(data: EntradaCamaraLoteIn):
+    """
+    Carga varios pallets en una cámara en una sola transacción. La capacidad
+    se comprueba una vez con la cámara bloqueada; los pallets que no caben,
+    no existen o no están 'preparado' se devuelven con su error y el resto
+    entra igualmente.
+    """
+    codigos = _normalizar_codigos(data.codigos_qr_pallet)
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT id_camara, capacidad_max FROM Camara
+            WHERE codigo_qr = %s
+            FOR UPDATE
+        """, [data.codigo_qr_camara])
+        camara = cur.fetchone()
+        if not camara:
+            raise HTTPException(404, "Cámara no encontrada")
+        id_camara, capacidad = camara
+
+        cur.execute("SELECT COUNT(*) FROM Pallet WHERE id_camara = %s AND estado = 'en_camara'", [id_camara])
+        huecos = capacidad - cur.fetchone()[0]
+
+        cur.execute("""
+            SELECT codigo_qr, id_pallet, estado FROM Pallet
+            WHERE codigo_qr = ANY(%s)
+            FOR UPDATE
+        """, [codigos])
+        pallets = {r[0]: (r[1], r[2]) for r in cur.fetchall()}
+
+        hoy = date.today()
+        salida = hoy + timedelta(days=7)
+        resultados = []
+        ids_entrada = []
+        for codigo in codigos:
+            if codigo not in pallets:
+                resultados.append({"codigo_qr": codigo, "ok": False, "error": "Pallet no encontrado"})
+                continue
+            id_pallet, estado = pallets[codigo]
+            if estado != "preparado":
+                resultados.append({"codigo_qr": codigo, "ok": False, "error": "Pallet no preparado"})
+                continue
+            if len(ids_entrada) >= huecos:
+                resultados.append({"codigo_qr": codigo, "ok": False, "error": "Cámara llena"})
+                continue
+
+            log_engorde_event(
+                cur, id_pallet, "ENTRADA_CAMARA",
+                estado_anterior="preparado", estado_nuevo="en_camara",
+                id_camara=id_camara,
+                metadata={"fecha_entrada": str(hoy), "fecha_salida_prevista": str(salida)}
+            )
+            ids_entrada.append(id_pallet)
+            resultados.append({"codigo_qr": codigo, "ok": True})
+
+        if ids_entrada:
+            cur.execute("""
+                UPDATE Pallet SET estado = 'en_camara', id_camara = %s
+                WHERE id_pallet = ANY(%s)
+            """, [id_camara, ids_entrada])
+
+        lote_alimento = _get_lote_alimento_activo(cur)
+        lote_huevo = _get_lote_huevo_activo(cur)
+        conn.commit()
+        if ids_entrada:
+            camaras_publisher.notificar()
+
+        return {
+            "message": f"{len(ids_entrada)} pallets entrados en cámara",
+            "fecha_entrada_camara": hoy.strftime("%Y-%m-%d"),
+            "fecha_salida_prevista": salida.strftime("%Y-%m-%d"),
+            "huecos_libres": huecos - len(ids_entrada),
+            "lote_alimento": lote_alimento,
+            "lote_huevo": lote_huevo,
+            "resultados": resultados
+        }
+    finally:
+        cur.close()
+        conn.close()
+
+
+@router.post("/camara/salida/lote")
+def salida_camara_lote(data: SalidaCamaraLoteIn):
+    """
+    Salida de varios pallets. Sin 'confirmar' solo devuelve, por pallet, los
+    días en cámara y si ha cumplido plazo (igual que /camara/salida); con
+    'confirmar' los pasa a fuera_camara en una sola transacción.
+    """
+    codigos = _normalizar_codigos(data.codigos_qr_pallet)
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        id_camara_filtro = None
+        if data.codigo_qr_camara:
+            cur.execute("SELECT id_camara FROM Camara WHERE codigo_qr = %s", [data.codigo_qr_camara])
+            row = cur.fetchone()
+            if not row:
+                raise HTTPException(404, "Cámara no encontrada")
+            id_camara_filtro = row[0]
+
+        cur.execute(f"""
+            SELECT p.codigo_qr, p.id_pallet, p.estado, p.id_camara,
+                   pe.fecha_entrada, pe.fecha_salida_prevista
+            FROM Pallet p
+            LEFT JOIN pallet_estado_actual pe ON pe.id_pallet = p.id_pallet
+            WHERE p.codigo_qr = ANY(%s)
+            {"FOR UPDATE OF p" if data.confirmar else ""}
+        """, [codigos])
+        pallets = {r[0]: r[1:] for r in cur.fetchall()}
+
+        hoy = date.today()
+        resultados = []
+        ids_salida = []
+        for codigo in codigos:
+            if codigo not in pallets:
+                resultados.append({"codigo_qr": codigo, "ok": False, "error": "Pallet no encontrado"})
+                continue
+            id_pallet, estado, id_camara, fecha_entrada, fecha_salida = pallets[codigo]
+            if estado != "en_camara":
+                resultados.append({"codigo_qr": codigo, "ok": False, "error": "No está en cámara"})
+                continue
+            if id_camara_filtro is not None and id_camara != id_camara_filtro:
+                resultados.append({"codigo_qr": codigo, "ok": False, "error": "No está en esta cámara"})
+                continue
+
+            if data.confirmar:
+                log_engorde_event(
+                    cur, id_pallet, "SALIDA_CAMARA",
+                    estado_anterior="en_camara", estado_nuevo="fuera_camara",
+                    id_camara=id_camara,
+                    metadata={"fecha_salida_real": str(hoy)}
+                )
+                ids_salida.append(id_pallet)
+
+            resultados.append({
+                "codigo_qr": codigo,
+                "ok": True,
+                "fecha_entrada_camara": str(fecha_entrada) if fecha_entrada else None,
+                "fecha_salida_prevista": str(fecha_salida) if fecha_salida else None,
+                "dias_en_camara": (hoy - fecha_entrada).days if fecha_entrada else 0,
+                "cumplido_plazo": hoy >= fecha_salida if fecha_salida else False
+            })
+
+        if ids_salida:
+            # Estado: en_camara → fuera_camara (listo para cribar)
+            cur.execute("""
+                UPDATE Pallet SET estado = 'fuera_camara', id_camara = NULL
+                WHERE id_pallet = ANY(%s)
+            """, [ids_salida])
+            conn.commit()
+            camaras_publisher.notificar()
+
+        return {
+            "message": "Salida procesada",
+            "pallets_salida": len(ids_salida),
+            "resultados": resultados
+        }
+    finally:
+        cur.close()
+        conn.close()
+
+
 # ============================================================
 # ESTADO GENERAL DE CÁMARAS
 # ============================================================
@@ -645,10 +937,61 @@ def estado_camaras():
 # REGISTRAR QR AUTOMÁTICO
 # ============================================================
 
+# INSERT multi-fila por tipo de QR: (sql, plantilla de cada fila).
+# Un código que otra petición registra a la vez se salta (ON CONFLICT) en
+# lugar de abortar toda la hoja; RETURNING dice cuáles entraron.
+SQL_INSERT_QR = {
+    "camara": (
+        "INSERT INTO Camara (porcentaje_uso, codigo_qr, nombre, capacidad_max) VALUES %s "
+        "ON CONFLICT DO NOTHING RETURNING codigo_qr",
+        "(0, %s, %s, 40)"
+    ),
+    "pallet": (
+        "INSERT INTO Pallet (codigo_qr, estado) VALUES %s "
+        "ON CONFLICT DO NOTHING RETURNING codigo_qr",
+        "(%s, 'vacio')"
+    ),
+    "lote_alimento": (
+        "INSERT INTO Lote_Alimento (codigo_qr, descripcion, fecha_llegada, activo) VALUES %s "
+        "ON CONFLICT DO NOTHING RETURNING codigo_qr",
+        "(%s, %s, %s, FALSE)"
+    ),
+    "lote_huevo": (
+        "INSERT INTO Lote_Huevo (codigo_qr, origen, fecha_registro, activo) VALUES %s "
+        "ON CONFLICT DO NOTHING RETURNING codigo_qr",
+        "(%s, %s, %s, FALSE)"
+    ),
+}
+
+
+def _valores_qr(tipo, numero, codigo):
+    """Fila a insertar para un QR ya parseado (ver SQL_INSERT_QR)."""
+    if tipo == "camara":
+        return (codigo, f"Cámara {numero}" if numero else "Cámara")
+    if tipo == "pallet":
+        return (codigo,)
+    if tipo == "lote_alimento":
+        # Salvado-Trigo-0001 → descripción "Salvado Trigo"
+        partes = codigo.rsplit("-", 1)[0]  # quita el número final
+        return (codigo, partes.replace("-", " ").title(), date.today())
+    # BFS-00001 → origen "BFS"
+    return (codigo, codigo.split("-")[0], date.today())
+
+
+def _insertar_qrs(cur, filas_por_tipo):
+    """Inserta los QR y devuelve el conjunto de códigos que se han insertado."""
+    insertados = set()
+    for tipo, filas in filas_por_tipo.items():
+        if filas:
+            sql, plantilla = SQL_INSERT_QR[tipo]
+            insertados.update(r[0] for r in execute_values(
+                cur, sql, filas, template=plantilla, page_size=len(filas), fetch=True
+            ))
+    return insertados
+
+
 @router.post("/registrar_qr_auto")
 def registrar_qr_auto(data: RegistrarQRIn):
-    logger.info("🔥 ENTRANDO A registrar_qr_auto")
-
     conn = get_connection()
     cur = conn.cursor()
     codigo = data.codigo_qr.strip().upper().replace(" ", "")
@@ -660,45 +1003,75 @@ def registrar_qr_auto(data: RegistrarQRIn):
             raise HTTPException(400, "El QR ya está registrado")
 
         tipo, numero = parse_qr(codigo)
+        if tipo is None:
+            raise HTTPException(400, "Formato QR no válido")
 
-        if tipo == "camara":
-            nombre = f"Cámara {numero}" if numero else "Cámara"
-            cur.execute(
-                "INSERT INTO Camara (porcentaje_uso, codigo_qr, nombre, capacidad_max) VALUES (%s, %s, %s, %s)",
-                [0, codigo, nombre, 40]
-            )
+        if not _insertar_qrs(cur, {tipo: [_valores_qr(tipo, numero, codigo)]}):
+            # Registrado por otra petición entre la comprobación y el INSERT
+            raise HTTPException(400, "El QR ya está registrado")
+        conn.commit()
+        return {"message": "QR registrado", "tipo": tipo}
 
-        elif tipo == "pallet":
-            cur.execute(
-                "INSERT INTO Pallet (codigo_qr, estado) VALUES (%s, 'vacio')",
-                [codigo]
-            )
+    finally:
+        cur.close()
+        conn.close()
 
-        elif tipo == "lote_alimento":
-            # Salvado-Trigo-0001 → descripción "Salvado Trigo"
-            partes = codigo.rsplit("-", 1)[0]  # quita el número final
-            descripcion = partes.replace("-", " ").title()
-            cur.execute(
-                "INSERT INTO Lote_Alimento (codigo_qr, descripcion, fecha_llegada, activo) "
-                "VALUES (%s, %s, %s, FALSE)",
-                [codigo, descripcion, date.today()]
-            )
 
-        elif tipo == "lote_huevo":
-            # BFS-00001 → origen "BFS"
-            origen = codigo.split("-")[0]
-            cur.execute(
-                "INSERT INTO Lote_Huevo (codigo_qr, origen, fecha_registro, activo) "
-                "VALUES (%s, %s, %s, FALSE)",
-                [codigo, origen, date.today()]
-            )
+MAX_QR_LOTE = 1000
 
-        else:
-            raise HTTPException(400, "Formato QR no válido")
 
+@router.post("/registrar_qr_auto/lote")
+def registrar_qr_auto_lote(data: RegistrarQRLoteIn):
+    """
+    Registra de una vez todos los QR de una hoja recién impresa, en una sola
+    transacción. Los códigos ya registrados o con formato no válido no
+    abortan el resto: se devuelven en 'duplicados' e 'invalidos'.
+    """
+    if len(data.codigos_qr) > MAX_QR_LOTE:
+        raise HTTPException(400, f"Máximo {MAX_QR_LOTE} códigos por petición")
+
+    # Normalizamos y quitamos repetidos conservando el orden
+    codigos = list(dict.fromkeys(
+        c.strip().upper().replace(" ", "") for c in data.codigos_qr
+    ))
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT codigo_qr FROM qr_registro WHERE codigo_qr = ANY(%s)",
+            [codigos]
+        )
+        existentes = {r[0] for r in cur.fetchall()}
+
+        filas_por_tipo = {}
+        registrados = []
+        duplicados = []
+        invalidos = []
+        for codigo in codigos:
+            if codigo in existentes:
+                duplicados.append(codigo)
+                continue
+            tipo, numero = parse_qr(codigo)
+            if tipo is None:
+                invalidos.append(codigo)
+                continue
+            filas_por_tipo.setdefault(tipo, []).append(_valores_qr(tipo, numero, codigo))
+            registrados.append({"codigo_qr": codigo, "tipo": tipo})
+
+        insertados = _insertar_qrs(cur, filas_por_tipo)
         conn.commit()
-        return {"message": "QR registrado", "tipo": tipo}
 
+        # Los que otra petición registró mientras tanto también son duplicados
+        duplicados += [r["codigo_qr"] for r in registrados if r["codigo_qr"] not in insertados]
+        registrados = [r for r in registrados if r["codigo_qr"] in insertados]
+
+        return {
+            "message": f"{len(registrados)} QR registrados",
+            "registrados": registrados,
+            "duplicados": duplicados,
+            "invalidos": invalidos,
+        }
     finally:
         cur.close()
         conn.close()
@@ -715,7 +1088,10 @@ def registrar_qr_auto(data: RegistrarQRIn):
 #     fecha_fin TIMESTAMP,
 #     id_operario INTEGER,
 #     observaciones TEXT,
-#     estado VARCHAR(20) DEFAULT 'activa'  -- activa | finalizada
+#     estado VARCHAR(20) DEFAULT 'activa',  -- activa | finalizada
+#     pallets_cribados INTEGER NOT NULL DEFAULT 0,  -- contadores mantenidos
+#     big_bags INTEGER NOT NULL DEFAULT 0,          -- por los endpoints
+#     kg_total NUMERIC(12,2) NOT NULL DEFAULT 0     -- (procesado_sesion_contadores_migration.sql)
 # );
 #
 # CREATE TABLE IF NOT EXISTS lote_final (
@@ -787,12 +1163,11 @@ def registrar_pallet_cribado(data: PalletCribadoIn):
         if pallet[1] != "fuera_camara":
             raise HTTPException(400, f"El pallet está en estado '{pallet[1]}', debe estar 'fuera_camara'")
 
-        # Obtener lotes activos en el último evento de entrada_camara de este pallet
+        # Lotes con los que se montó y entró a cámara este pallet
         cur.execute("""
             SELECT id_lote_alimento, id_lote_huevo
-            FROM engorde
-            WHERE id_pallet = %s AND tipo_evento = 'ENTRADA_CAMARA'
-            ORDER BY timestamp DESC LIMIT 1
+            FROM pallet_estado_actual
+            WHERE id_pallet = %s
         """, [pallet[0]])
         lote_row = cur.fetchone()
         id_lote_alimento = lote_row[0] if lote_row else None
@@ -810,16 +1185,15 @@ def registrar_pallet_cribado(data: PalletCribadoIn):
         # Pallet vuelve a vacio
         cur.execute("UPDATE Pallet SET estado = 'vacio' WHERE id_pallet = %s", [pallet[0]])
 
-        conn.commit()
-
-        # Contar pallets ya cribados en esta sesión
         cur.execute("""
-            SELECT COUNT(*) FROM engorde
-            WHERE tipo_evento = 'CRIBADO'
-              AND metadata::jsonb->>'id_sesion_procesado' = %s::text
-        """, [str(data.id_sesion)])
+            UPDATE procesado_sesion SET pallets_cribados = pallets_cribados + 1
+            WHERE id = %s
+            RETURNING pallets_cribados
+        """, [data.id_sesion])
         total_cribados = cur.fetchone()[0]
 
+        conn.commit()
+
         return {
             "message": "Pallet cribado correctamente",
             "id_pallet": pallet[0],
@@ -850,30 +1224,44 @@ def registrar_big_bag_lleno(data: BigBagLlenoIn):
             SELECT DISTINCT id_lote_alimento, id_lote_huevo
             FROM engorde
             WHERE tipo_evento = 'CRIBADO'
-              AND metadata::jsonb->>'id_sesion_procesado' = %s::text
+              AND id_sesion_procesado = %s
               AND id_lote_alimento IS NOT NULL
             LIMIT 1
-        """, [str(data.id_sesion)])
+        """, [data.id_sesion])
         lotes = cur.fetchone()
         id_lote_alimento = lotes[0] if lotes else None
         id_lote_huevo = lotes[1] if lotes else None
 
-        codigo_lote = _generar_codigo_lote(cur, "03")
+        if data.codigo_lote:
+            codigo_lote = _validar_codigo_reservado(cur, data.codigo_lote)
+        else:
+            codigo_lote = _generar_codigo_lote(cur, "03")
 
-        cur.execute("""
-            INSERT INTO lote_final (
-                codigo_lote, tipo_producto, fecha_produccion,
-                peso, id_sesion_procesado,
-                id_lote_alimento, id_lote_huevo,
-                destino, etiquetado_ok
-            )
-            VALUES (%s, '03', %s, %s, %s, %s, %s, 'AGRICOLA', TRUE)
-            RETURNING id
-        """, [
-            codigo_lote, date.today(), data.peso,
-            data.id_sesion, id_lote_alimento, id_lote_huevo
-        ])
+        try:
+            cur.execute("""
+                INSERT INTO lote_final (
+                    codigo_lote, tipo_producto, fecha_produccion,
+                    peso, id_sesion_procesado,
+                    id_lote_alimento, id_lote_huevo,
+                    destino, etiquetado_ok
+                )
+                VALUES (%s, '03', %s, %s, %s, %s, %s, 'AGRICOLA', TRUE)
+                RETURNING id
+            """, [
+                codigo_lote, date.today(), data.peso,
+                data.id_sesion, id_lote_alimento, id_lote_huevo
+            ])
+        except UniqueViolation:
+            # Otra tablet ha usado el mismo código preimpreso a la vez
+            conn.rollback()
+            raise HTTPException(409, "El código de lote ya está usado")
         id_lote = cur.fetchone()[0]
+
+        cur.execute("""
+            UPDATE procesado_sesion
+            SET big_bags = big_bags + 1, kg_total = kg_total + COALESCE(%s, 0)
+            WHERE id = %s
+        """, [data.peso, data.id_sesion])
         conn.commit()
 
         return {
@@ -899,25 +1287,20 @@ def terminar_sesion_procesado(data: TerminarSesionIn):
     conn = get_connection()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id FROM procesado_sesion WHERE id = %s AND estado = 'activa'", [data.id_sesion])
-        if not cur.fetchone():
+        cur.execute("""
+            SELECT pallets_cribados, big_bags FROM procesado_sesion
+            WHERE id = %s AND estado = 'activa'
+            FOR UPDATE
+        """, [data.id_sesion])
+        sesion = cur.fetchone()
+        if not sesion:
             raise HTTPException(404, "Sesión no encontrada o ya finalizada")
 
         lote_final_creado = None
 
         # Verificar si hay pallets cribados sin lote final asociado en esta sesión
         # (es decir, si hay cribados pero no se pulsó big_bag_lleno)
-        cur.execute("""
-            SELECT COUNT(*) FROM engorde
-            WHERE tipo_evento = 'CRIBADO'
-              AND metadata::jsonb->>'id_sesion_procesado' = %s::text
-        """, [str(data.id_sesion)])
-        total_cribados = cur.fetchone()[0]
-
-        cur.execute("""
-            SELECT COUNT(*) FROM lote_final WHERE id_sesion_procesado = %s
-        """, [data.id_sesion])
-        lotes_ya_creados = cur.fetchone()[0]
+        total_cribados, lotes_ya_creados = sesion
 
         if total_cribados > 0 and lotes_ya_creados == 0:
             # Big bag parcial — crear lote final igualmente
@@ -925,10 +1308,10 @@ def terminar_sesion_procesado(data: TerminarSesionIn):
                 SELECT DISTINCT id_lote_alimento, id_lote_huevo
                 FROM engorde
                 WHERE tipo_evento = 'CRIBADO'
-                  AND metadata::jsonb->>'id_sesion_procesado' = %s::text
+                  AND id_sesion_procesado = %s
                   AND id_lote_alimento IS NOT NULL
                 LIMIT 1
-            """, [str(data.id_sesion)])
+            """, [data.id_sesion])
             lotes = cur.fetchone()
             id_lote_alimento = lotes[0] if lotes else None
             id_lote_huevo = lotes[1] if lotes else None
@@ -950,6 +1333,12 @@ def terminar_sesion_procesado(data: TerminarSesionIn):
             id_lote = cur.fetchone()[0]
             lote_final_creado = {"id": id_lote, "codigo_lote": codigo_lote, "parcial": True}
 
+            cur.execute("""
+                UPDATE procesado_sesion
+                SET big_bags = big_bags + 1, kg_total = kg_total + COALESCE(%s, 0)
+                WHERE id = %s
+            """, [data.peso_total, data.id_sesion])
+
         # Cerrar sesión
         cur.execute("""
             UPDATE procesado_sesion
@@ -1013,7 +1402,7 @@ def get_sesion_activa():
     cur = conn.cursor()
     try:
         cur.execute("""
-            SELECT id, fecha_inicio, id_operario
+            SELECT id, fecha_inicio, id_operario, pallets_cribados, big_bags, kg_total
             FROM procesado_sesion WHERE estado = 'activa' LIMIT 1
         """)
         row = cur.fetchone()
@@ -1022,16 +1411,16 @@ def get_sesion_activa():
 
         id_sesion = row[0]
 
-        # Pallets ya cribados en esta sesión
+        # Pallets ya cribados en esta sesión (índice idx_engorde_sesion_procesado)
         cur.execute("""
-            SELECT e.metadata, p.codigo_qr
+            SELECT p.codigo_qr
             FROM engorde e
             JOIN Pallet p ON p.id_pallet = e.id_pallet
             WHERE e.tipo_evento = 'CRIBADO'
-              AND e.metadata::jsonb->>'id_sesion_procesado' = %s::text
+              AND e.id_sesion_procesado = %s
             ORDER BY e.timestamp
-        """, [str(id_sesion)])
-        pallets_cribados = [{"codigo_qr": r[1]} for r in cur.fetchall()]
+        """, [id_sesion])
+        pallets_cribados = [{"codigo_qr": r[0]} for r in cur.fetchall()]
 
         return {
             "sesion_activa": {
@@ -1039,7 +1428,9 @@ def get_sesion_activa():
                 "fecha_inicio": row[1].strftime("%Y-%m-%d %H:%M"),
                 "id_operario": row[2],
                 "pallets_cribados": pallets_cribados,
-                "total_cribados": len(pallets_cribados)
+                "total_cribados": row[3],
+                "total_big_bags": row[4],
+                "kg_total": float(row[5])
             }
         }
     finally:
@@ -1047,6 +1438,26 @@ def get_sesion_activa():
         conn.close()
 
 
+@router.post("/lote_final/reservar_codigos")
+def reservar_codigos_lote(data: ReservarCodigosIn):
+    """
+    Reserva un bloque de códigos de lote de hoy para imprimir las etiquetas
+    por adelantado. Luego se pasan en 'codigo_lote' a /procesado/big_bag_lleno.
+    """
+    if not 1 <= data.cantidad <= MAX_CODIGOS_RESERVA:
+        raise HTTPException(400, f"cantidad debe estar entre 1 y {MAX_CODIGOS_RESERVA}")
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        codigos = _reservar_codigos_lote(cur, data.cantidad)
+        conn.commit()
+        return {"codigos": codigos}
+    finally:
+        cur.close()
+        conn.close()
+
+
 @router.get("/lote_final/{codigo_lote}")
 def get_lote_final(codigo_lote: str):
     """Devuelve los datos completos de un lote final para imprimir etiqueta."""
@@ -1234,6 +1645,7 @@ def toggle_lote(data: ToggleLoteIn):
             raise HTTPException(400, "Tipo inválido. Usa 'alimento' o 'huevo'")
 
         conn.commit()
+        lotes_activos.invalidate()
         return {"message": "Lote actualizado", "nuevo_estado": nuevo_estado}
 
     finally:
@@ -1,7 +1,7 @@
 import React, { useEffect, useRef, useState } from "react";
 import { IonPage, IonContent, IonSpinner } from "@ionic/react";
 
-import api from "../../services/api";
+import api, { API_URL } from "../../services/api";
 import { useAuth } from "../../context/AuthContext";
 import { getOperarios, type Operario } from "../../api/operarios.api";
 import type { CamaraResumen } from "./types";
@@ -12,6 +12,13 @@ import DistributionModal from "./components/DistributionModal";
 import PhotosModal from "./components/PhotosModal";
 import "./DashboardPage.css";
 
+type CamaraEvento = CamaraResumen & { grupo: "propias" | "franquiciados" };
+
+// Sustituye (o añade) la cámara en la lista, conservando el orden por nombre
+const aplicarCamara = (lista: CamaraResumen[], camara: CamaraResumen) =>
+  [...lista.filter(c => c.id_camara !== camara.id_camara), camara]
+    .sort((a, b) => a.nombre.localeCompare(b.nombre));
+
 const DashboardPage: React.FC = () => {
   const { user } = useAuth();
   const [vista, setVista] = useState<"propias" | "franquiciados">("propias");
@@ -36,6 +43,61 @@ const DashboardPage: React.FC = () => {
     getOperarios().then(setOperarios).catch(() => setOperarios([]));
   }, []);
 
+  // Cámaras en vivo (SSE). EventSource no admite la cabecera Authorization:
+  // se pide un token de stream de corta duración y va en la URL. Si la
+  // conexión se corta se vuelve a abrir con un token nuevo.
+  useEffect(() => {
+    let source: EventSource | null = null;
+    let reintento: ReturnType<typeof setTimeout> | undefined;
+    let cerrado = false;
+
+    const conectar = async () => {
+      let token: string;
+      try {
+        token = (await api.post("/auth/stream-token")).data.token;
+      } catch {
+        if (!cerrado) reintento = setTimeout(conectar, 10000);
+        return;
+      }
+      if (cerrado) return;
+
+      const es = new EventSource(
+        `${API_URL}/dashboard/camaras/stream?token=${encodeURIComponent(token)}`
+      );
+      source = es;
+      es.addEventListener("snapshot", (e) => {
+        const datos = JSON.parse((e as MessageEvent).data);
+        setCamarasPropias(datos.propias || []);
+        setCamarasFranquiciados(datos.franquiciados || []);
+      });
+      es.addEventListener("camara", (e) => {
+        const { grupo, ...camara }: CamaraEvento = JSON.parse((e as MessageEvent).data);
+        if (grupo === "franquiciados") {
+          setCamarasFranquiciados(lista => aplicarCamara(lista, camara));
+        } else {
+          setCamarasPropias(lista => aplicarCamara(lista, camara));
+        }
+      });
+      es.addEventListener("camara_eliminada", (e) => {
+        const { id_camara } = JSON.parse((e as MessageEvent).data);
+        setCamarasPropias(lista => lista.filter(c => c.id_camara !== id_camara));
+        setCamarasFranquiciados(lista => lista.filter(c => c.id_camara !== id_camara));
+      });
+      es.onerror = () => {
+        es.close();
+        source = null;
+        if (!cerrado) reintento = setTimeout(conectar, 5000);
+      };
+    };
+
+    conectar();
+    return () => {
+      cerrado = true;
+      clearTimeout(reintento);
+      source?.close();
+    };
+  }, []);
+
   const camaras = vista === "propias" ? camarasPropias : camarasFranquiciados;
 
   // Posiciona la flecha de la línea divisoria a la altura de la tarjeta